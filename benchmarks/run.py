@@ -0,0 +1,635 @@
+"""
+Offline benchmarks over the checked-in corpus of saved search and product pages
+
+    python benchmarks/run.py                     # compare against baseline.json
+    python benchmarks/run.py --parser lxml       # benchmark another backend
+    python benchmarks/run.py --update-baseline   # record the current numbers
+
+Results are written as JSON (--output). The exit status is 1 when a
+benchmark's best round is slower than the baseline by more than --threshold,
+measured against a calibration loop timed in the same rounds, and 2 when
+the corpus no longer parses to the expected results.
+"""
+import argparse
+import contextlib
+import gzip
+import http.server
+import json
+import logging
+import os
+import platform
+import re
+import statistics
+import sys
+import threading
+import time
+import tracemalloc
+import zlib
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+import requests
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from src.config import categories  # noqa: E402
+from src.enrichment import DetailEnricher, parse_detail_page  # noqa: E402
+from src.normalize import normalize_products  # noqa: E402
+from src.product import Product, dumps_indented, dumps_line  # noqa: E402
+from src.rate_limiter import AdaptiveRateLimiter  # noqa: E402
+from src.scraper import CastoramaScraper  # noqa: E402
+from src.structured_data import StructuredPage  # noqa: E402
+from src.transport import DECODABLE_ENCODINGS  # noqa: E402
+
+CORPUS_DIR = os.path.join(BENCH_DIR, 'corpus')
+BASELINE_FILE = os.path.join(BENCH_DIR, 'baseline.json')
+BASE_URL = "https://www.castorama.fr"
+
+# Content codings the test server can produce
+ENCODERS = {'gzip': gzip.compress, 'deflate': zlib.compress}
+try:
+    import brotli
+    ENCODERS['br'] = brotli.compress
+except ImportError:
+    pass
+try:
+    import zstandard
+    ENCODERS['zstd'] = zstandard.ZstdCompressor().compress
+except ImportError:
+    pass
+
+CALIBRATION_PRICE = re.compile(r'\d+,\d{2}')
+
+EXTRA_PRICES = ['12,99 €', '1 299,00€', '€ 45.5', 'à partir de 7,20 €', 'Prix indisponible', '']
+
+# Benchmarks that wait out the test server's 20ms of latency per response;
+# the waits don't scale with the machine, so they are compared in seconds
+LATENCY_BOUND = {'enrich', 'enrich_sequential', 'crawl_concurrent', 'crawl_sequential'}
+
+# Consecutive names whose measures must not run into each other in a batch
+ADJACENT_NAMES = ['Meuble vasque 60', "L'évier blanc", 'Carrelage 60', 'x 60 cm dalle',
+                  'Peinture 2,5', 'L murs et plafonds', 'Lot de', '3 éponges']
+
+
+def page_key(url: str) -> Tuple[str, int]:
+    query = parse_qs(urlparse(url).query)
+    return query.get('term', [''])[0], int(query.get('page', ['1'])[0])
+
+
+def split_corpus(corpus: Dict[str, Dict]) -> Tuple[Dict[str, Dict], Dict[str, bytes]]:
+    """Search pages by file name, and product detail pages by URL path"""
+    search = {name: page for name, page in corpus.items() if page['kind'] != 'detail'}
+    details = {urlparse(page['url']).path: page['content'] for page in corpus.values()
+               if page['kind'] == 'detail'}
+    return search, details
+
+
+def load_corpus() -> Dict[str, Dict]:
+    with open(os.path.join(CORPUS_DIR, 'manifest.json'), encoding='utf-8') as f:
+        manifest = json.load(f)
+    corpus = {}
+    for name, meta in manifest.items():
+        with open(os.path.join(CORPUS_DIR, name), 'rb') as f:
+            corpus[name] = dict(meta, content=f.read())
+    return corpus
+
+
+def unlimited() -> AdaptiveRateLimiter:
+    """A rate limiter that never waits, so only scraper code is timed"""
+    return AdaptiveRateLimiter(initial_rate=1e9, min_rate=1e9, max_rate=1e9, jitter=0)
+
+
+class CorpusScraper(CastoramaScraper):
+    """CastoramaScraper answering page requests from the corpus"""
+
+    def __init__(self, corpus: Dict[str, Dict], **kwargs):
+        super().__init__(BASE_URL, rate_limiter=unlimited(), **kwargs)
+        corpus, self.details = split_corpus(corpus)
+        self.pages = {page_key(page['url']): page['content'] for page in corpus.values()}
+
+    def _request(self, url: str, attempt: int, **kwargs) -> requests.Response:
+        response = requests.Response()
+        response.status_code = 200
+        response.url = url
+        response.headers['Content-Type'] = 'text/html'
+        path = urlparse(url).path
+        if path in self.details:
+            response._content = self.details[path]
+        else:
+            response._content = self.pages[page_key(url)]
+        return response
+
+
+class CorpusServer:
+    """Local HTTP server for end-to-end runs.
+
+    Unknown search pages are empty and unknown product pages are 404s.
+    Each response is held back ``latency`` seconds, as a remote site would.
+    With ``encoding`` every body is sent in that Content-Encoding whatever
+    the request accepts; a coding missing from ENCODERS is sent as gzip
+    bytes under its name, as a server using a coding the client can't
+    decode would.
+    """
+
+    def __init__(self, corpus: Dict[str, Dict], latency: float = 0.0,
+                 encoding: Optional[str] = None):
+        corpus, details = split_corpus(corpus)
+        pages = {page_key(page['url']): page['content'] for page in corpus.values()}
+        empty = corpus['search_empty.html']['content']
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # Headers and body go out as separate writes; don't let Nagle
+            # and delayed ACKs add ~40ms to every response
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                path = urlparse(self.path).path
+                if latency:
+                    time.sleep(latency)
+                if path.endswith('.prd') and path not in details:
+                    self.send_error(404)
+                    return
+                if path == '/':
+                    body = b'<html><head><title>Castorama</title></head><body></body></html>'
+                elif path in details:
+                    body = details[path]
+                else:
+                    body = pages.get(page_key(self.path), empty)
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/html')
+                if encoding:
+                    body = ENCODERS.get(encoding, gzip.compress)(body)
+                    self.send_header('Content-Encoding', encoding)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@contextlib.contextmanager
+def quiet():
+    """Silence the scraper's logging, which would otherwise be timed too"""
+    logging.disable(logging.CRITICAL)
+    try:
+        yield
+    finally:
+        logging.disable(logging.NOTSET)
+
+
+def measure(fn: Callable[[], int], rounds: int) -> Dict:
+    """Time fn (which returns its number of operations) over several rounds,
+    with the calibration loop timed between them"""
+    with quiet():
+        fn()  # Warm-up
+        timings = []
+        calibrations = []
+        for _ in range(rounds):
+            start = time.perf_counter()
+            ops = fn()
+            timings.append((time.perf_counter() - start) / max(ops, 1))
+            start = time.perf_counter()
+            calibration_loop()
+            calibrations.append(time.perf_counter() - start)
+    return {
+        'median_s': statistics.median(timings),
+        'min_s': min(timings),
+        'calibration_s': min(calibrations),
+        'ops': ops,
+        'rounds': rounds,
+    }
+
+
+def calibration_loop() -> int:
+    """A fixed mix of the interpreter work the benchmarks do (str methods,
+    dicts, a regex, json), to tell how fast the machine runs them right now"""
+    total = 0
+    for index in range(500):
+        text = f"Produit {index} - {index % 97},{index % 100:02d} € / m²"
+        fields = {'name': text.lower().strip(), 'price': CALIBRATION_PRICE.search(text).group()}
+        total += len(json.dumps(fields, ensure_ascii=False))
+    return total
+
+
+def record_bytes(make: Callable[[int], object], count: int = 20000) -> float:
+    """Memory held per object by a list of count objects built by make"""
+    tracemalloc.start()
+    try:
+        records = [make(index) for index in range(count)]
+        size = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    del records
+    return size / count
+
+
+def check_corpus(scraper: CorpusScraper, corpus: Dict[str, Dict]) -> List[str]:
+    """Problems with how the corpus parses; benchmarks of broken code mean nothing"""
+    problems = []
+    with quiet():
+        for name, page in corpus.items():
+            if page['kind'] == 'detail':
+                fields = parse_detail_page(page['content'])
+                if fields != page['fields']:
+                    problems.append(f"{name}: expected detail fields {page['fields']}, "
+                                    f"got {fields}")
+                continue
+            soup = scraper.get_page_content(BASE_URL + page['url'])
+            products = []
+            if soup is not None:
+                products = scraper.extract_page_products(soup, 'bench', 100) or []
+            expected_none = page['kind'] in ('anti-bot', 'garbled')
+            if (soup is None) != expected_none or len(products) != page['products']:
+                problems.append(f"{name}: expected {page['kind']} with {page['products']} "
+                                f"products, got {len(products)}")
+
+            search_page = scraper.get_search_page(BASE_URL + page['url'])
+            source = search_page.source if isinstance(search_page, StructuredPage) else 'dom'
+            structured = []
+            if search_page is not None:
+                structured = scraper.extract_page_products(search_page, 'bench', 100) or []
+            if source != page.get('source', 'dom') or len(structured) != len(products):
+                problems.append(f"{name}: expected {page.get('source', 'dom')} extraction, "
+                                f"got {len(structured)} products from {source}")
+    return problems
+
+
+def check_parity(corpus: Dict[str, Dict]) -> List[str]:
+    """Field-by-field differences between the products the bs4 and lxml
+    backends extract from each search page of the corpus"""
+    problems = []
+    scrapers = {parser: CorpusScraper(corpus, parser=parser) for parser in ('bs4', 'lxml')}
+    with quiet():
+        for name, page in corpus.items():
+            if page['kind'] == 'detail':
+                continue
+            extracted = {}
+            for parser, scraper in scrapers.items():
+                soup = scraper.get_page_content(BASE_URL + page['url'])
+                products = (scraper.extract_page_products(soup, 'bench', 100)
+                            if soup is not None else None)
+                extracted[parser] = [dict(product) for product in products or []]
+            bs4_products, lxml_products = extracted['bs4'], extracted['lxml']
+            if len(bs4_products) != len(lxml_products):
+                problems.append(f"{name}: bs4 extracted {len(bs4_products)} products, "
+                                f"lxml {len(lxml_products)}")
+                continue
+            for index, (expected, actual) in enumerate(zip(bs4_products, lxml_products)):
+                for field in sorted(set(expected) | set(actual)):
+                    if expected.get(field) != actual.get(field):
+                        problems.append(f"{name} product {index} {field}: bs4 "
+                                        f"{expected.get(field)!r}, lxml {actual.get(field)!r}")
+    return problems
+
+
+def check_streaming(corpus: Dict[str, Dict], parser: str) -> List[str]:
+    """Every category crawled from the test server must give the same
+    products streamed (iter_product_list) as read page by page"""
+    problems = []
+    with quiet(), CorpusServer(corpus) as server:
+        scraper = CastoramaScraper(server.url, parser=parser, rate_limiter=unlimited())
+        for category in categories:
+            streamed = [dict(product) for product in scraper.iter_product_list(category, 100)]
+            buffered = [dict(product) for product in scraper.scrape_product_list(category, 100)]
+            if streamed != buffered:
+                problems.append(f"streaming {category}: {len(streamed)} products streamed, "
+                                f"{len(buffered)} buffered")
+    return problems
+
+
+def check_normalize(products: List[Dict]) -> List[str]:
+    """Products normalized as one batch must come out as when normalized
+    one at a time, whatever their neighbours"""
+    records = [dict(product) for product in products]
+    records += [{'name': name, 'category': 'bench', 'price': 100.0, 'unit': ''}
+                for name in ADJACENT_NAMES]
+    batch = normalize_products([dict(record) for record in records])
+    problems = []
+    for record, batched in zip(records, batch):
+        alone = normalize_products([dict(record)])[0]
+        if batched != alone:
+            problems.append(f"normalize {record['name']!r}: {batched} in a batch, "
+                            f"{alone} alone")
+    return problems
+
+
+def check_transport(corpus: Dict[str, Dict], parser: str) -> Tuple[Dict, List[str]]:
+    """Crawl a category from the test server in every coding both sides
+    support: each must give the identity products, counting its wire
+    bytes. A coding the client can't decode must fail in one request."""
+    report = {}
+    problems = []
+    expected = None
+    codings = ['identity'] + [coding for coding in ENCODERS if coding in DECODABLE_ENCODINGS]
+    with quiet():
+        for coding in codings:
+            with CorpusServer(corpus, encoding=None if coding == 'identity' else coding) as server:
+                scraper = CastoramaScraper(server.url, parser=parser, rate_limiter=unlimited())
+                names = [product['name'] for product in scraper.scrape_product_list('evier', 100)]
+            run = scraper.metrics.to_dict()['run']
+            report[coding] = {'bytes': run['counters'].get('bytes', 0),
+                              'wire_bytes': run['counters'].get('wire_bytes', 0),
+                              'wire_ratio': run['wire_ratio']}
+            expected = names if expected is None else expected
+            if names != expected or run['retries']:
+                problems.append(f"transport {coding}: {len(names)} products "
+                                f"(expected {len(expected)}), retries {run['retries']}")
+
+        # Only ever sent by a misconfigured server, as it isn't advertised
+        coding = next(coding for coding in ('br', 'zstd', 'compress')
+                      if coding not in DECODABLE_ENCODINGS)
+        with CorpusServer(corpus, encoding=coding) as server:
+            scraper = CastoramaScraper(server.url, parser=parser, rate_limiter=unlimited())
+            page = scraper.get_search_page(f"{server.url}/search?term=evier&page=1")
+        requests_sent = scraper.metrics.to_dict()['run']['counters'].get('requests', 0)
+        if page is not None or requests_sent != 1:
+            problems.append(f"transport {coding} (undecodable): expected one failed request, "
+                            f"got {requests_sent} requests")
+    return report, problems
+
+
+def run_benchmarks(parser: str, rounds: int) -> Dict:
+    corpus = load_corpus()
+    scraper = CorpusScraper(corpus, parser=parser)
+
+    problems = check_corpus(scraper, corpus) + check_parity(corpus)
+    transport, transport_problems = check_transport(corpus, parser)
+    problems += transport_problems
+    problems += check_streaming(corpus, parser)
+
+    # Pages with embedded product JSON only take part in the structured/dom pair
+    dom_pages = [page for page in corpus.values()
+                 if page['kind'] != 'detail' and 'source' not in page]
+    urls = [BASE_URL + page['url'] for page in dom_pages]
+    product_pages = [BASE_URL + page['url'] for page in dom_pages
+                     if page['kind'] == 'products']
+    with quiet():
+        docs = [scraper.get_page_content(url) for url in product_pages]
+        containers = [container for doc in docs
+                      for container in scraper.find_product_containers(doc)]
+    prices = [scraper.parser.plan.raw_fields(container).get('price_text', '')
+              for container in containers] + EXTRA_PRICES
+
+    def get_page_content():
+        for url in urls:
+            scraper.get_page_content(url)
+        return len(urls)
+
+    def selector_probe():
+        for doc in docs:
+            scraper.find_product_containers(doc)
+        return len(docs)
+
+    def extract_product_data():
+        for container in containers:
+            scraper.extract_product_data(container, 'bench')
+        return len(containers)
+
+    def extract_price():
+        for text in prices:
+            scraper.extract_price(text)
+        return len(prices)
+
+    products = [product for product in
+                (scraper.extract_product_data(container, 'bench') for container in containers)
+                if product]
+    # The plain dicts and stdlib json calls products used to go through
+    dict_products = [product.to_dict() for product in products]
+    problems += check_normalize(dict_products)
+
+    def encode_ndjson():
+        for product in products:
+            dumps_line(product)
+        return len(products)
+
+    def encode_ndjson_dict():
+        for product in dict_products:
+            (json.dumps(product, ensure_ascii=False, separators=(',', ':')) + '\n').encode('utf-8')
+        return len(dict_products)
+
+    def encode_indented():
+        for product in products:
+            dumps_indented(product)
+        return len(products)
+
+    def encode_indented_dict():
+        for product in dict_products:
+            json.dumps(product, ensure_ascii=False, indent=2)
+        return len(dict_products)
+
+    detail_pages = [page['content'] for page in corpus.values() if page['kind'] == 'detail']
+
+    # Normalization runs on batches; time it over a run's worth of records
+    records = [dict(product) for product in dict_products * 50]
+
+    def normalize():
+        normalize_products(records)
+        return len(records)
+
+    # Pages embedding their product list as JSON, read with and without the fast path
+    structured_urls = [BASE_URL + page['url'] for page in corpus.values()
+                       if page.get('source', 'dom') != 'dom']
+
+    def structured_page():
+        for url in structured_urls:
+            scraper.extract_page_products(scraper.get_search_page(url), 'bench', 100)
+        return len(structured_urls)
+
+    def dom_page():
+        for url in structured_urls:
+            scraper.extract_page_products(scraper.get_page_content(url), 'bench', 100)
+        return len(structured_urls)
+
+    def detail_page():
+        for content in detail_pages:
+            parse_detail_page(content)
+        return len(detail_pages)
+
+    results = {
+        'get_page_content': measure(get_page_content, rounds * 2),
+        'selector_probe': measure(selector_probe, rounds * 4),
+        'extract_product_data': measure(extract_product_data, rounds * 5),
+        'extract_price': measure(extract_price, rounds * 20),
+        'encode_ndjson': measure(encode_ndjson, rounds * 20),
+        'encode_ndjson_dict': measure(encode_ndjson_dict, rounds * 20),
+        'encode_indented': measure(encode_indented, rounds * 20),
+        'encode_indented_dict': measure(encode_indented_dict, rounds * 20),
+        'parse_detail_page': measure(detail_page, rounds * 20),
+        'normalize': measure(normalize, rounds),
+        'structured_page': measure(structured_page, rounds * 10),
+        'dom_page': measure(dom_page, rounds),
+    }
+
+    # Each product with a saved detail page, listed in two categories: the
+    # enricher fetches each page once, and several at a time
+    _, details = split_corpus(corpus)
+    listed = [product for product in products if urlparse(product['product_url']).path in details]
+    with CorpusServer(corpus, latency=0.02) as server:
+        def enrich(concurrency: int) -> Callable[[], int]:
+            fetcher = CastoramaScraper(server.url, parser=parser, rate_limiter=unlimited())
+            enricher = DetailEnricher(fetcher, concurrency=concurrency)
+
+            def run():
+                batch = [Product.from_dict(dict(product, product_url=server.url +
+                                                urlparse(product['product_url']).path,
+                                                category=category))
+                         for product in listed for category in ('evier', 'cuisine')]
+                enricher.enrich(batch)
+                return len(batch)
+            return run
+        results['enrich'] = measure(enrich(4), rounds)
+        results['enrich_sequential'] = measure(enrich(1), rounds)
+
+    with CorpusServer(corpus) as server:
+        def crawl():
+            crawler = CastoramaScraper(server.url, parser=parser, rate_limiter=unlimited())
+            crawler.scrape_all_categories()
+            return 1
+        results['crawl'] = measure(crawl, rounds)
+
+    # The same crawl with every response held back 20ms, as a remote site
+    # would: the asyncio engine overlaps the waits the sequential path adds up
+    with CorpusServer(corpus, latency=0.02) as server:
+        def crawl_at(concurrency: int) -> Callable[[], int]:
+            def run():
+                crawler = CastoramaScraper(server.url, parser=parser, rate_limiter=unlimited())
+                crawler.scrape_all_categories(concurrency=concurrency)
+                return 1
+            return run
+        with quiet():
+            crawled = {
+                concurrency: sorted(product['product_url'] for product in CastoramaScraper(
+                    server.url, parser=parser, rate_limiter=unlimited()
+                ).scrape_all_categories(concurrency=concurrency))
+                for concurrency in (1, 8)}
+        if crawled[8] != crawled[1]:
+            problems.append(f"concurrent crawl: {len(crawled[8])} products, "
+                            f"sequential {len(crawled[1])}")
+        results['crawl_concurrent'] = measure(crawl_at(8), max(rounds // 2, 1))
+        results['crawl_sequential'] = measure(crawl_at(1), max(rounds // 2, 1))
+
+    for name, result in results.items():
+        if name not in LATENCY_BOUND:
+            result['relative'] = result['min_s'] / result['calibration_s']
+
+    return {
+        'meta': {
+            'parser': parser,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'timestamp': time.strftime("%Y-%m-%d %H:%M:%S"),
+            'corpus_pages': len(corpus),
+            'categories': len(categories),
+        },
+        'problems': problems,
+        'benchmarks': results,
+        'transport': transport,
+        'memory': {
+            'product_bytes': record_bytes(
+                lambda index: Product.from_dict(dict_products[index % len(dict_products)])),
+            'dict_bytes': record_bytes(
+                lambda index: dict(dict_products[index % len(dict_products)])),
+        },
+    }
+
+
+def compare(results: Dict, baseline: Dict, threshold: float) -> List[str]:
+    """Benchmarks slower than baseline * (1 + threshold).
+
+    The best round is compared, as it is the least affected by other load
+    on the machine. It is compared in units of the calibration loop when
+    both sides have it, so a baseline recorded on a faster or slower
+    machine still holds.
+    """
+    regressions = []
+    for name, result in results['benchmarks'].items():
+        reference = baseline.get(name)
+        if not reference:
+            continue
+        if 'relative' in result and 'relative' in reference:
+            ratio = result['relative'] / reference['relative']
+            detail = (f"{result['relative']:.4g} vs {reference['relative']:.4g} "
+                      f"calibration loops per op")
+        else:
+            ratio = result['min_s'] / reference['min_s']
+            detail = (f"{result['min_s'] * 1e6:.1f}us vs "
+                      f"{reference['min_s'] * 1e6:.1f}us per op")
+        result['vs_baseline'] = round(ratio, 3)
+        if ratio > 1 + threshold:
+            regressions.append(f"{name}: {ratio:.2f}x baseline ({detail})")
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Offline scraper benchmarks")
+    parser.add_argument('--parser', default='bs4', help="parsing backend (bs4 or lxml)")
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help="allowed slowdown vs the baseline (0.25 = 25%%)")
+    parser.add_argument('--output', default='bench_results.json')
+    parser.add_argument('--baseline', default=BASELINE_FILE)
+    parser.add_argument('--update-baseline', action='store_true')
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.parser, args.rounds)
+
+    baselines = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding='utf-8') as f:
+            baselines = json.load(f)
+    regressions = compare(results, baselines.get(args.parser, {}), args.threshold)
+
+    for name, result in results['benchmarks'].items():
+        ratio = f"  {result['vs_baseline']:.2f}x" if 'vs_baseline' in result else ''
+        print(f"{name:22} {result['median_s'] * 1e6:12.1f}us/op  "
+              f"(min {result['min_s'] * 1e6:.1f}us, {result['ops']} ops){ratio}")
+
+    memory = results['memory']
+    print(f"{'record memory':22} {memory['product_bytes']:12.0f}B/Product  "
+          f"({memory['dict_bytes']:.0f}B/dict)")
+    for coding, transfer in results['transport'].items():
+        print(f"{'transport ' + coding:22} {transfer['wire_bytes']:12d}B on the wire  "
+              f"({transfer['bytes']}B decoded, ratio {transfer['wire_ratio']})")
+
+    results['regressions'] = regressions
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.update_baseline:
+        baselines[args.parser] = {
+            name: {key: result[key] for key in ('min_s', 'median_s', 'relative')
+                   if key in result}
+            for name, result in results['benchmarks'].items()
+        }
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(baselines, f, indent=2)
+        print(f"Baseline for {args.parser} updated in {args.baseline}")
+
+    if results['problems']:
+        for problem in results['problems']:
+            print(f"CORPUS MISMATCH {problem}")
+        return 2
+    if regressions and not args.update_baseline:
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
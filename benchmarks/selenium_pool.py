@@ -0,0 +1,122 @@
+"""
+Driver pool benchmark: the Selenium scraper against the local corpus server,
+with fake WebDrivers that load pages over HTTP instead of starting Chrome
+
+    python benchmarks/selenium_pool.py                 # pool sizes 1 and 3
+    python benchmarks/selenium_pool.py --sizes 1 2 4 --latency 0.1
+
+Every pool size crawls every category. In pools of more than one driver,
+one driver crashes on its first load of a page 2, so the restart path
+runs too. The exit status is 2 when a pool finds other products than a
+single driver, or starts more drivers than its size plus the restart.
+"""
+import argparse
+import sys
+import threading
+import time
+from typing import Dict, List, Optional
+
+import requests
+
+from run import CorpusServer, load_corpus, quiet, unlimited
+
+try:
+    from selenium.common.exceptions import NoSuchElementException, WebDriverException
+    from src.selenium_scraper import CastoramaSeleniumScraper
+except ImportError as e:
+    sys.exit(f"Selenium not available ({e}). Install with: pip install selenium")
+
+
+class FakeDriver:
+    """The parts of a WebDriver the scraper uses, over plain HTTP"""
+
+    def __init__(self, crash: Optional[threading.Event]):
+        self._crash = crash
+        self._session = requests.Session()
+        self.page_source = ''
+        self.title = ''
+
+    def get(self, url: str):
+        if self._crash is not None and 'page=2' in url and not self._crash.is_set():
+            self._crash.set()
+            raise WebDriverException("chrome not reachable")
+        self.page_source = self._session.get(url, timeout=10).text
+        start = self.page_source.find('<title>')
+        end = self.page_source.find('</title>', start)
+        self.title = self.page_source[start + 7:end] if start != -1 and end != -1 else ''
+
+    def find_element(self, by: str, selector: str):
+        if 'data-testid="product"' not in self.page_source:
+            raise NoSuchElementException(selector)
+        return object()
+
+    def get_cookies(self) -> List[Dict]:
+        return [dict(name=name, value=value) for name, value in self._session.cookies.items()]
+
+    def add_cookie(self, cookie: Dict):
+        self._session.cookies.set(cookie['name'], cookie['value'])
+
+    def quit(self):
+        self._session.close()
+
+
+def crawl(base_url: str, size: int, max_pages: int, crash: bool) -> Dict:
+    """Crawl every category with a pool of size fake drivers, one of them
+    crashing once when crash is set"""
+    created = []
+    crashed = threading.Event() if crash else None
+
+    def create_driver() -> FakeDriver:
+        driver = FakeDriver(crashed)
+        created.append(driver)
+        return driver
+
+    scraper = CastoramaSeleniumScraper(base_url=base_url, pool_size=size,
+                                       rate_limiter=unlimited(), render_timeout=0.05)
+    scraper._create_driver = create_driver
+    start = time.perf_counter()
+    with quiet():
+        products = scraper.scrape_all_categories(max_pages=max_pages)
+    elapsed = time.perf_counter() - start
+    scraper.close()
+    run = scraper.metrics.to_dict()['run']
+    return {
+        'seconds': elapsed,
+        'products': sorted(product['product_url'] for product in products),
+        'drivers': len(created),
+        'requests': run['counters'].get('requests', 0),
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Selenium driver pool benchmark")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1, 3])
+    parser.add_argument('--latency', type=float, default=0.05,
+                        help="seconds the server holds back every response")
+    parser.add_argument('--max-pages', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    problems = []
+    with CorpusServer(load_corpus(), latency=args.latency) as server:
+        expected = None
+        for size in sorted(set([1] + args.sizes)):
+            # Only pools restart a crashed driver; a single one ends its category
+            result = crawl(server.url, size, args.max_pages, crash=size > 1)
+            if expected is None:
+                expected = result['products']
+            print(f"pool size {size}: {len(result['products'])} products in "
+                  f"{result['seconds']:.2f}s, {result['requests']} requests, "
+                  f"{result['drivers']} drivers started")
+            if result['products'] != expected:
+                problems.append(f"pool size {size}: {len(result['products'])} products, "
+                                f"a single driver found {len(expected)}")
+            if result['drivers'] > size + (size > 1):
+                problems.append(f"pool size {size}: {result['drivers']} drivers started")
+
+    for problem in problems:
+        print(f"POOL MISMATCH {problem}")
+    return 2 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
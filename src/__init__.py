@@ -1,7 +1,13 @@
-from .scraper import CastoramaScraper
+# Scrapers are imported on first use, so a requests-only run never loads
+# selenium and webdriver_manager
+__all__ = ['CastoramaScraper', 'CastoramaSeleniumScraper']
 
-try:
-    from .selenium_scraper import CastoramaSeleniumScraper
-    __all__ = ['CastoramaScraper', 'CastoramaSeleniumScraper']
-except ImportError:
-    __all__ = ['CastoramaScraper']
+
+def __getattr__(name):
+    if name == 'CastoramaScraper':
+        from .scraper import CastoramaScraper
+        return CastoramaScraper
+    if name == 'CastoramaSeleniumScraper':
+        from .selenium_scraper import CastoramaSeleniumScraper
+        return CastoramaSeleniumScraper
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
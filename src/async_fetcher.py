@@ -0,0 +1,116 @@
+"""
+Asyncio fetch engine that runs many (category, page) search requests at once
+"""
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncFetchEngine:
+    """Fetch search pages concurrently on top of a CastoramaScraper.
+
+    Each request still goes through ``scraper.get_search_page`` so the
+    retry, 403/429 and anti-bot handling are unchanged; the engine only
+    decides how many of those run at the same time. Blocking requests run
+    on a thread pool and share the scraper's keep-alive connection pool.
+    """
+
+    def __init__(self, scraper, max_concurrency: int = 8, per_host_limit: int = 4,
+                 page_window: int = 3, max_pages: int = 10):
+        self.scraper = scraper
+        self.max_concurrency = max_concurrency
+        self.per_host_limit = per_host_limit
+        # Number of pages of one category requested speculatively at once
+        self.page_window = page_window
+        self.max_pages = max_pages
+
+        self._executor = None
+        self._global_limit = None
+        self._host_limits = {}
+
+    def _host_limit(self, url: str) -> asyncio.Semaphore:
+        host = urlparse(url).netloc
+        if host not in self._host_limits:
+            self._host_limits[host] = asyncio.Semaphore(self.per_host_limit)
+        return self._host_limits[host]
+
+    async def fetch(self, url: str):
+        """Fetch and parse a single page without blocking the event loop"""
+        loop = asyncio.get_running_loop()
+        async with self._global_limit, self._host_limit(url):
+            return await loop.run_in_executor(
+                self._executor, self.scraper.get_search_page, url)
+
+    async def scrape_category(self, category: str, max_products: int = 30,
+                              sink: Optional[Callable[[Dict], None]] = None) -> List[Dict]:
+        """Scrape one category, fetching a window of pages at a time.
+
+        With a sink, each page's products are passed to it as soon as the
+        page is consumed and are not collected.
+        """
+        products = []
+        count = 0
+        page = 1
+
+        while count < max_products and page <= self.max_pages:
+            pages = list(range(page, min(page + self.page_window, self.max_pages + 1)))
+            urls = [f"{self.scraper.base_url}/search?term={category}&page={p}"
+                    for p in pages]
+            for url in urls:
+                logger.info("Scraping %s: %s", category, url)
+
+            soups = await asyncio.gather(*(self.fetch(url) for url in urls))
+
+            # Pages are consumed in order so the output matches the
+            # sequential path; the first failed or empty page ends the category
+            for current, soup in zip(pages, soups):
+                if soup is None:
+                    logger.warning("Failed to get content for %s page %d", category, current)
+                    return products
+
+                page_products = self.scraper.extract_page_products(
+                    soup, category, max_products - count, current)
+                if not page_products:
+                    return products
+
+                count += len(page_products)
+                if sink:
+                    for product in page_products:
+                        sink(product)
+                else:
+                    products.extend(page_products)
+                logger.info("Extracted %d products from %s page %d",
+                            len(page_products), category, current)
+                if count >= max_products:
+                    return products
+
+            page = pages[-1] + 1
+
+        return products
+
+    async def scrape_categories(self, categories: List[str], max_products: int = 30,
+                                sink: Optional[Callable[[Dict], None]] = None
+                                ) -> Dict[str, List[Dict]]:
+        """Scrape all categories concurrently, keyed by category"""
+        self._global_limit = asyncio.Semaphore(self.max_concurrency)
+        self._host_limits = {}
+
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            self._executor = executor
+            try:
+                results = await asyncio.gather(
+                    *(self.scrape_category(category, max_products, sink)
+                      for category in categories))
+            finally:
+                self._executor = None
+
+        return dict(zip(categories, results))
+
+    def run(self, categories: List[str], max_products: int = 30,
+            sink: Optional[Callable[[Dict], None]] = None) -> Dict[str, List[Dict]]:
+        """Blocking entry point for synchronous callers"""
+        return asyncio.run(self.scrape_categories(categories, max_products, sink))
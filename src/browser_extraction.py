@@ -0,0 +1,118 @@
+"""
+Product card extraction that runs inside the browser via execute_script
+"""
+from typing import Dict, List
+from .extraction import ProductExtractionPlan
+
+# Mirrors ProductExtractionPlan.raw_fields: one walk per card collects the
+# first candidate of every lookup rule, and only the raw text/attribute
+# values travel back. Price parsing, URL joining and the unit fallback
+# stay in Python (build_product) so both paths share them.
+EXTRACT_PRODUCTS_JS = r"""
+const SKIP_TEXT = new Set(['script', 'style', 'template', 'rt', 'rp']);
+const NAME_TAGS = new Set(['h3', 'h2', 'h4', 'span', 'a']);
+const PRICE_TAGS = new Set(['span', 'div']);
+const BRAND_TAGS = new Set(['span', 'div', 'p']);
+const NAME_CLASS = /title|name|product/i;
+const PRICE_CLASS = /price/i;
+const BRAND_CLASS = /brand|marque|seller/i;
+const UNIT = /(?<![\p{L}\p{N}_])(m²|m2|pièce|unité|l|kg|kit|lot)(?![\p{L}\p{N}_]|\.\d)/iu;
+const PRIMARY = ['name_testid', 'price_testid', 'link_testid',
+                 'seller_testid', 'img_testid', 'unit_text'];
+const TESTIDS = {
+  'p:product-name': 'name_testid', 'span:product-price': 'price_testid',
+  'a:product-link': 'link_testid', 'p:seller-info': 'seller_testid',
+  'img:product-image': 'img_testid'
+};
+
+function text(element) {
+  let out = '';
+  const walk = (node) => {
+    for (const child of node.childNodes) {
+      if (child.nodeType === Node.TEXT_NODE || child.nodeType === Node.CDATA_SECTION_NODE) {
+        out += child.data.trim();
+      } else if (child.nodeType === Node.ELEMENT_NODE && !SKIP_TEXT.has(child.localName)) {
+        walk(child);
+      }
+    }
+  };
+  walk(element);
+  return out;
+}
+
+function scan(card) {
+  const found = {};
+  const walker = document.createTreeWalker(
+    card, NodeFilter.SHOW_ELEMENT | NodeFilter.SHOW_TEXT | NodeFilter.SHOW_COMMENT);
+  let node;
+  while ((node = walker.nextNode())) {
+    if (node.nodeType === Node.ELEMENT_NODE) {
+      const name = node.localName;
+      const testid = node.getAttribute('data-testid');
+      if (testid !== null) {
+        const slot = TESTIDS[name + ':' + testid];
+        if (slot && !(slot in found)) found[slot] = node;
+      }
+      if (name === 'a' && !('first_a' in found)) found.first_a = node;
+      else if (name === 'img' && !('first_img' in found)) found.first_img = node;
+
+      const raw = node.getAttribute('class');
+      const classes = raw ? raw.trim().split(/\s+/).join(' ') : '';
+      if (classes) {
+        if (NAME_TAGS.has(name) && !('name_class' in found) && NAME_CLASS.test(classes)) found.name_class = node;
+        if (PRICE_TAGS.has(name) && !('price_class' in found) && PRICE_CLASS.test(classes)) found.price_class = node;
+        if (BRAND_TAGS.has(name) && !('brand_class' in found) && BRAND_CLASS.test(classes)) found.brand_class = node;
+      }
+    } else {
+      const data = node.data;
+      if (!('euro_parent' in found) && data.includes('€')) found.euro_parent = node.parentNode;
+      if (!('unit_text' in found)) {
+        const match = data.match(UNIT);
+        if (match) found.unit_text = match[1];
+      }
+    }
+    if (PRIMARY.every((slot) => slot in found)) break;
+  }
+  return found;
+}
+
+function rawFields(card) {
+  const found = scan(card);
+  const raw = {};
+  const name = found.name_testid || found.name_class || found.first_a;
+  if (!name) return raw;
+  raw.name = text(name);
+
+  const price = found.price_testid || found.price_class || found.euro_parent;
+  raw.price_text = price ? text(price) : '';
+
+  let link = found.link_testid;
+  if (!link) link = name.localName === 'a' ? name : found.first_a;
+  raw.href = link ? link.getAttribute('href') : null;
+
+  const brand = found.seller_testid || found.brand_class;
+  raw.brand = brand ? text(brand) : '';
+
+  const img = found.img_testid || found.first_img;
+  if (img) {
+    raw['src'] = img.getAttribute('src');
+    raw['data-src'] = img.getAttribute('data-src');
+    raw['srcset'] = img.getAttribute('srcset');
+  }
+
+  raw.unit = found.unit_text || '';
+  return raw;
+}
+
+return Array.from(document.querySelectorAll('[data-testid="product"]'), rawFields);
+"""
+
+
+def extract_in_browser(driver, plan: ProductExtractionPlan, category_name: str) -> List[Dict]:
+    """Extract the products of the page loaded in driver with one script call"""
+    products = []
+    for raw in driver.execute_script(EXTRACT_PRODUCTS_JS):
+        product = plan.build_product(raw, category_name)
+        if product:
+            products.append(product)
+    return products
@@ -0,0 +1,130 @@
+"""
+Persistent crawl frontier so an interrupted scrape can resume
+"""
+import logging
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+from .product import dumps, loads
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pages (
+    category   TEXT NOT NULL,
+    page       INTEGER NOT NULL,
+    status     TEXT NOT NULL,
+    products   TEXT,
+    updated_at TEXT NOT NULL,
+    PRIMARY KEY (category, page)
+);
+CREATE TABLE IF NOT EXISTS categories (
+    category    TEXT PRIMARY KEY,
+    stop_reason TEXT NOT NULL
+);
+"""
+
+PENDING = 'pending'
+IN_FLIGHT = 'in-flight'
+DONE = 'done'
+
+
+class CategoryProgress:
+    def __init__(self, next_page: int, products: List[Dict], stop_reason: Optional[str]):
+        self.next_page = next_page
+        self.products = products
+        # Set once the category's pagination ended; None means keep going
+        self.stop_reason = stop_reason
+
+
+class CrawlFrontier:
+    """Record every (category, page) of a crawl as pending, in-flight or
+    done, with the products extracted from done pages.
+
+    State is committed to SQLite after each page. Without ``resume`` any
+    previous state is cleared. With it, pages left in flight by a crash
+    go back to pending and scrapers continue each category after its
+    last done page. A category ended by 'exhausted', 'limit' or
+    'stopped' is not fetched again. A 'failed' one is retried from its
+    failed page.
+    """
+
+    def __init__(self, path: str = "crawl_frontier.db", resume: bool = False):
+        self.path = path
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+
+        with self._lock, self.conn:
+            if resume:
+                self.conn.execute("UPDATE pages SET status = ? WHERE status = ?",
+                                  (PENDING, IN_FLIGHT))
+                self.conn.execute("DELETE FROM categories WHERE stop_reason = 'failed'")
+            else:
+                self.conn.execute("DELETE FROM pages")
+                self.conn.execute("DELETE FROM categories")
+
+    def _set_page(self, category: str, page: int, status: str,
+                  products: Optional[List[Dict]] = None):
+        encoded = None if products is None else dumps(products)
+        with self._lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO pages (category, page, status, products, updated_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (category, page, status, encoded, time.strftime("%Y-%m-%d %H:%M:%S")))
+
+    def begin_page(self, category: str, page: int):
+        self._set_page(category, page, IN_FLIGHT)
+
+    def complete_page(self, category: str, page: int, products: List[Dict]):
+        self._set_page(category, page, DONE, products)
+
+    def release_page(self, category: str, page: int):
+        """Put a page that could not be scraped back to pending"""
+        self._set_page(category, page, PENDING)
+
+    def finish_category(self, category: str, stop_reason: str):
+        with self._lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO categories (category, stop_reason) VALUES (?, ?)",
+                (category, stop_reason))
+
+    def progress(self, category: str) -> CategoryProgress:
+        """Where a category stands: the done pages' products and the page to fetch next"""
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT page, products FROM pages WHERE category = ? AND status = ? "
+                "ORDER BY page", (category, DONE)).fetchall()
+            finished = self.conn.execute(
+                "SELECT stop_reason FROM categories WHERE category = ?",
+                (category,)).fetchone()
+
+        products = []
+        next_page = 1
+        # Only a contiguous run of done pages counts; later ones get refetched
+        for page, encoded in rows:
+            if page != next_page:
+                break
+            products.extend(loads(encoded))
+            next_page += 1
+        return CategoryProgress(next_page, products, finished[0] if finished else None)
+
+    def replay(self, category: str, emit: Callable[[Dict], None]) -> CategoryProgress:
+        """Pass the products already saved for a category to emit, in page order"""
+        progress = self.progress(category)
+        if progress.products:
+            logger.info("Resuming %s: %d products from %d saved pages",
+                        category, len(progress.products), progress.next_page - 1)
+        for product in progress.products:
+            emit(product)
+        return progress
+
+    def summary(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT status, COUNT(*) FROM pages GROUP BY status").fetchall()
+        return dict(rows)
+
+    def close(self):
+        self.conn.close()
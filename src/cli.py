@@ -0,0 +1,365 @@
+"""
+Command line entry point: ``python main.py <command>`` or ``python -m src.cli``
+
+Only argparse and the standard library are imported up front; each
+command imports the engine it runs, so a requests crawl never loads
+selenium, and an lxml crawl never loads bs4.
+"""
+import argparse
+import contextlib
+import logging
+import sys
+from typing import Dict, List, Optional
+
+ENGINES = ('hybrid', 'requests', 'selenium', 'distributed')
+FORMATS = ('json', 'ndjson', 'ndjson.gz')
+COMMANDS = ('scrape', 'worker', 'normalize')
+
+
+def save_metrics(metrics):
+    """Write the run's stage timings and counters as JSON and Prometheus text"""
+    metrics.save("scrape_metrics.json")
+    metrics.write_prometheus("scrape_metrics.prom")
+    run = metrics.to_dict()['run']
+    print(f"Metrics: {run['counters'].get('products', 0)} products in "
+          f"{run['elapsed_seconds']:.1f}s ({run['products_per_second']} products/s), "
+          f"written to scrape_metrics.json and scrape_metrics.prom")
+    if run['wire_ratio'] is not None:
+        print(f"Transfer: {run['counters'].get('wire_bytes', 0)} bytes on the wire for "
+              f"{run['counters'].get('bytes', 0)} decoded (ratio {run['wire_ratio']})")
+
+
+def enriching(fetcher, sink, enrich: bool):
+    """sink itself, or sink behind a detail-page enrichment stage"""
+    if not enrich:
+        return contextlib.nullcontext(sink)
+    from .enrichment import DetailCache, DetailEnricher, EnrichingSink
+    return EnrichingSink(DetailEnricher(fetcher, DetailCache("detail_cache.db")), sink.write)
+
+
+def ndjson_path(output: str, output_format: str) -> str:
+    return f"{output}.ndjson.gz" if output_format == 'ndjson.gz' else f"{output}.ndjson"
+
+
+def finish(sink, args, scraper_type: Optional[str] = None, dedup=None) -> Optional[str]:
+    """Normalize the run's NDJSON, write the other outputs and return its path.
+
+    Records streamed before a later category saw them again get the
+    dedup index's merged categories here.
+    """
+    if not sink.count:
+        return None
+    from .normalize import normalize_ndjson
+    from .sinks import read_ndjson
+    from .storage import ProductStore
+
+    # Canonical units, quantities and price per unit, over the whole run at once
+    normalize_ndjson(sink.path, prepare=dedup.merge_categories if dedup else None)
+    if args.format == 'json':
+        fields = {'scraper_type': scraper_type} if scraper_type else {}
+        sink.finalize(f"{args.output}.json", **fields)
+    with ProductStore("products.db") as store:
+        store.save(read_ndjson(sink.path))
+    return sink.path
+
+
+def run_hybrid_scraper(args) -> Optional[str]:
+    """Scrape over HTTP and escalate only the pages it can't get to Selenium"""
+    from .scraper import CastoramaScraper
+    from .checkpoint import CrawlFrontier
+    from .dedup import DedupIndex
+    from .hybrid import HybridScraper
+    from .sinks import NDJSONSink
+
+    print("Starting Castorama scraper using requests, with Selenium as fallback...")
+    # Which tier worked for each category is kept for the next run
+    scraper = HybridScraper(CastoramaScraper(parser=args.parser),
+                            state_file="hybrid_tiers.json")
+    frontier = CrawlFrontier("crawl_frontier_hybrid.db", resume=args.resume)
+    dedup = DedupIndex()
+    with NDJSONSink(ndjson_path(args.output, args.format), append=False) as sink:
+        with enriching(scraper.scraper, sink, args.enrich) as stage:
+            scraper.scrape_all_categories(
+                categories=args.categories, max_products=args.max_products,
+                max_pages=args.max_pages or 10, sink=stage.write, frontier=frontier,
+                dedup=dedup)
+    scraper.close()
+    frontier.close()
+    save_metrics(scraper.metrics)
+    print_tiers(scraper.tier_report())
+    return finish(sink, args, scraper_type="hybrid", dedup=dedup)
+
+
+def run_requests_scraper(args) -> Optional[str]:
+    """Scrape with requests; concurrency > 1 fetches through the asyncio engine"""
+    from .scraper import CastoramaScraper
+    from .checkpoint import CrawlFrontier
+    from .dedup import DedupIndex
+    from .sinks import NDJSONSink
+
+    print("Starting Castorama scraper using requests...")
+    scraper = CastoramaScraper(parser=args.parser)
+    # Checkpointing and dedup only exist on the sequential path
+    sequential = args.concurrency <= 1 and not args.parse_workers
+    # Pages done by an interrupted run are replayed from the frontier
+    frontier = CrawlFrontier("crawl_frontier.db", resume=args.resume) if sequential else None
+    dedup = DedupIndex() if sequential else None
+    # Products are appended as they are extracted, so a crash keeps them
+    with NDJSONSink(ndjson_path(args.output, args.format), append=False) as sink:
+        with enriching(scraper, sink, args.enrich) as stage:
+            scraper.scrape_all_categories(
+                concurrency=args.concurrency, parse_workers=args.parse_workers,
+                sink=stage.write, frontier=frontier,
+                dedup=dedup,
+                categories=args.categories, max_products=args.max_products,
+                max_pages=args.max_pages or 10)
+    if frontier:
+        frontier.close()
+    save_metrics(scraper.metrics)
+    return finish(sink, args, dedup=dedup)
+
+
+def run_distributed_scraper(args) -> Optional[str]:
+    """Spread the crawl over worker processes sharing a work queue and rate budget"""
+    from concurrent.futures import ProcessPoolExecutor
+    from functools import partial
+    from . import config
+    from .scraper import CastoramaScraper
+    from .dedup import DedupIndex
+    from .sinks import NDJSONSink
+    from .work_queue import WorkQueue, merge_results, worker_main
+
+    workers = max(args.concurrency, 1)
+    print(f"Starting Castorama scraper with {workers} worker processes...")
+    queue = WorkQueue(args.queue)
+    queue.seed(args.categories or config.categories, max_products=args.max_products,
+               max_pages=args.max_pages or 10)
+    # More workers can join from elsewhere with `worker` while this runs
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pages = sum(pool.map(partial(worker_main, parser=args.parser), [args.queue] * workers))
+    print(f"Workers scraped {pages} pages: {queue.summary()}")
+
+    dedup = DedupIndex()
+    with NDJSONSink(ndjson_path(args.output, args.format), append=False) as sink:
+        with enriching(CastoramaScraper(parser=args.parser), sink, args.enrich) as stage:
+            merge_results(queue, stage.write, dedup)
+    queue.close()
+    return finish(sink, args, scraper_type="distributed", dedup=dedup)
+
+
+def run_selenium_scraper(args) -> Optional[str]:
+    """Scrape with a headless Chrome; concurrency is the number of pooled drivers"""
+    try:
+        from .selenium_scraper import CastoramaSeleniumScraper
+    except ImportError:
+        print("Selenium not available. Install with: pip install selenium")
+        print("Also need to install ChromeDriver")
+        return None
+    from .checkpoint import CrawlFrontier
+    from .dedup import DedupIndex
+    from .sinks import NDJSONSink
+
+    try:
+        print("Starting Castorama scraper using Selenium...")
+        scraper = CastoramaSeleniumScraper(headless=True, parser=args.parser,
+                                           pool_size=max(args.concurrency, 1))
+        frontier = CrawlFrontier("crawl_frontier_selenium.db", resume=args.resume)
+        dedup = DedupIndex()
+        with NDJSONSink(ndjson_path(args.output, args.format), append=False) as sink:
+            # Detail pages are plain HTML, so they go through the extractor's session
+            with enriching(scraper.extractor, sink, args.enrich) as stage:
+                scraper.scrape_all_categories(
+                    max_pages=args.max_pages or 3, sink=stage.write, frontier=frontier,
+                    dedup=dedup, categories=args.categories)
+        scraper.close()
+        frontier.close()
+        save_metrics(scraper.metrics)
+        return finish(sink, args, scraper_type="selenium", dedup=dedup)
+    except Exception as e:
+        print(f"Selenium scraping failed: {e}")
+
+    return None
+
+
+RUNNERS = {
+    'hybrid': run_hybrid_scraper,
+    'requests': run_requests_scraper,
+    'selenium': run_selenium_scraper,
+    'distributed': run_distributed_scraper,
+}
+
+
+def print_tiers(report: Dict):
+    for tier in ('http', 'browser'):
+        values = report[tier]
+        if not values['pages']:
+            continue
+        print(f"Tier {tier}: {values['pages']} pages, {values['success_rate']:.0%} ok, "
+              f"{values['products']} products, {values['ms_per_page']}ms/page")
+    print(f"Escalated {report['escalations']} pages to the browser")
+
+
+def print_summary(output: str):
+    from .sinks import read_ndjson
+
+    categories = {}
+    samples = []
+    for product in read_ndjson(output):
+        cat = product['category']
+        if cat not in categories:
+            categories[cat] = 0
+        categories[cat] += 1
+        if len(samples) < 3:
+            samples.append(product)
+
+    print("\nProducts by category:")
+    for cat, count in categories.items():
+        print(f"  {cat}: {count} products")
+
+    print(f"\nSample products:")
+    for i, product in enumerate(samples):
+        print(f"\n{i+1}. {product['name']}")
+        print(f"   Category: {product['category']}")
+        print(f"   Price: {product['price']} {product['currency']}")
+        print(f"   Brand: {product['brand'] or 'N/A'}")
+        print(f"   Unit: {product['unit'] or 'N/A'}")
+
+
+def scrape(args) -> int:
+    print("Material Scraper for Donizo")
+    print("=" * 50)
+
+    output = RUNNERS[args.engine](args)
+    if not output:
+        print("No products were successfully scraped")
+        return 1
+    print_summary(output)
+    return 0
+
+
+def worker(args) -> int:
+    from .work_queue import worker_main
+    worker_main(args.queue, parser=args.parser)
+    return 0
+
+
+def normalize(args) -> int:
+    from .normalize import normalize_ndjson
+    normalize_ndjson(args.path, args.output)
+    return 0
+
+
+def category_list(value: str) -> List[str]:
+    categories = [category.strip() for category in value.split(',') if category.strip()]
+    if not categories:
+        raise argparse.ArgumentTypeError("expected a comma separated list of categories")
+    return categories
+
+
+def build_parser() -> argparse.ArgumentParser:
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--log-level', default='INFO',
+                        choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'],
+                        help="DEBUG adds page structure dumps when no products are found")
+
+    parser = argparse.ArgumentParser(prog="main.py", description="Material Scraper for Donizo")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    crawl = commands.add_parser('scrape', parents=[common],
+                                help="crawl the configured categories")
+    crawl.add_argument('--engine', choices=ENGINES, default='hybrid',
+                       help="hybrid (default: requests, Selenium for the pages it "
+                            "can't get), requests, selenium (headless Chrome) or "
+                            "distributed (worker processes sharing --queue)")
+    crawl.add_argument('--categories', type=category_list, default=None,
+                       help="comma separated search terms (default: config.categories)")
+    crawl.add_argument('--max-products', type=int, default=100,
+                       help="products per category (all engines but selenium)")
+    crawl.add_argument('--max-pages', type=int, default=None,
+                       help="search pages per category (default: 10, 3 for selenium)")
+    crawl.add_argument('--concurrency', type=int, default=1,
+                       help="concurrent page fetches (requests), pooled drivers "
+                            "(selenium) or worker processes (distributed); "
+                            "hybrid is sequential")
+    crawl.add_argument('--parse-workers', type=int, default=0,
+                       help="parse pages in this many processes (requests engine)")
+    crawl.add_argument('--parser', choices=['bs4', 'lxml'], default='bs4',
+                       help="HTML backend; lxml never imports bs4")
+    crawl.add_argument('--format', choices=FORMATS, default='json',
+                       help="json writes OUTPUT.ndjson and OUTPUT.json, ndjson and "
+                            "ndjson.gz only the NDJSON file")
+    crawl.add_argument('--output', default=None,
+                       help="output file name without extension "
+                            "(default: products, products_selenium for selenium)")
+    crawl.add_argument('--resume', action='store_true',
+                       help="continue the previous run from its last checkpointed page")
+    crawl.add_argument('--enrich', action='store_true',
+                       help="add EAN, dimensions, stock and unit price from product pages")
+    crawl.add_argument('--queue', default="work_queue.db",
+                       help="work queue file of the distributed engine")
+    crawl.set_defaults(handler=scrape)
+
+    join = commands.add_parser('worker', parents=[common], help="add one worker to a distributed crawl, then exit")
+    join.add_argument('--queue', default="work_queue.db", help="work queue file of the crawl")
+    join.add_argument('--parser', choices=['bs4', 'lxml'], default='bs4')
+    join.set_defaults(handler=worker)
+
+    norm = commands.add_parser(
+        'normalize', parents=[common], help="normalize units, quantities and price per unit of an NDJSON file")
+    norm.add_argument('path', help="NDJSON file, e.g. products.ndjson")
+    norm.add_argument('output', nargs='?', help="output file (default: rewrite path)")
+    norm.set_defaults(handler=normalize)
+    return parser
+
+
+def legacy_argv(argv: List[str]) -> List[str]:
+    """Translate the flags of the former single-command interface
+    (``--workers N``, ``--join``) to a command"""
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument('--resume', action='store_true')
+    parser.add_argument('--log-level')
+    parser.add_argument('--workers', type=int, default=0)
+    parser.add_argument('--join', action='store_true')
+    parser.add_argument('--queue')
+    parser.add_argument('--enrich', action='store_true')
+    known, rest = parser.parse_known_args(argv)
+
+    if known.join:
+        translated = ['worker']
+    elif known.workers:
+        translated = ['scrape', '--engine', 'distributed', '--concurrency', str(known.workers)]
+    else:
+        translated = ['scrape']
+    if known.log_level:
+        translated += ['--log-level', known.log_level]
+    if known.queue:
+        translated += ['--queue', known.queue]
+    if known.resume and not known.join:
+        translated.append('--resume')
+    if known.enrich and not known.join:
+        translated.append('--enrich')
+    return translated + rest
+
+
+def main(argv=None) -> int:
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if not any(arg in COMMANDS or arg in ('-h', '--help') for arg in argv):
+        argv = legacy_argv(argv)
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    if args.command == 'scrape':
+        if args.output is None:
+            args.output = 'products_selenium' if args.engine == 'selenium' else 'products'
+        if args.resume and args.engine == 'requests' and (args.concurrency > 1 or args.parse_workers):
+            parser.error("--resume needs --concurrency 1 and no --parse-workers")
+        if args.resume and args.engine == 'distributed':
+            parser.error("--resume is not supported by the distributed engine")
+
+    logging.basicConfig(level=args.log_level,
+                        format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -6,3 +6,14 @@ categories = [
     'meuble vasque',  # vanities in French
     'showers'
 ]
+
+# Page title fragments of Cloudflare, captcha and bot detection pages
+anti_bot_indicators = [
+    'checking your browser',
+    'cloudflare',
+    'captcha',
+    'bot detection',
+    'access denied',
+    'blocked',
+    'security check'
+]
@@ -0,0 +1,63 @@
+"""
+In-run deduplication of products that show up under several search terms
+"""
+import threading
+from typing import Dict, List
+from .incremental import product_key
+
+
+class DedupIndex:
+    """Keep one record per product id across all categories of a run.
+
+    The first time a product is seen it is kept and gets a ``categories``
+    list. Later sightings from other categories only add their tag to that
+    list. Collected output therefore ends up with every tag. A sink sees
+    the record once, when first seen, with the tags known at that point;
+    merge_categories brings a written record up to date at the end of the
+    run.
+
+    ``min_new_fraction`` drives the early pagination stop: a page whose
+    share of new products falls below it ends its category.
+    """
+
+    def __init__(self, min_new_fraction: float = 0.2):
+        self.min_new_fraction = min_new_fraction
+        self._records = {}
+        self._lock = threading.Lock()
+        self.duplicates = 0
+
+    def add(self, product: Dict, category: str) -> bool:
+        """Index a product; True if it had not been seen in this run"""
+        key = product_key(product)
+        with self._lock:
+            record = self._records.get(key)
+            if record is None:
+                product.setdefault('categories', [category])
+                self._records[key] = product
+                return True
+
+            if category not in record['categories']:
+                record['categories'].append(category)
+            self.duplicates += 1
+            return False
+
+    def filter_page(self, category: str, page_products: List[Dict]) -> List[Dict]:
+        """The products of a page that are new to this run"""
+        return [product for product in page_products if self.add(product, category)]
+
+    def low_yield(self, new: int, total: int) -> bool:
+        """True when a page brought too few new products to keep paginating"""
+        return total > 0 and new / total < self.min_new_fraction
+
+    def categories(self, product: Dict) -> List[str]:
+        """Every category a product was seen under so far"""
+        record = self._records.get(product_key(product))
+        return list(record['categories']) if record else []
+
+    def merge_categories(self, product: Dict) -> Dict:
+        """Set the categories of a product read back from a sink to every
+        category it was seen under in this run"""
+        categories = self.categories(product)
+        if categories:
+            product['categories'] = categories
+        return product
@@ -0,0 +1,104 @@
+"""
+Bounded pool of warm WebDriver instances with lease/return semantics
+"""
+import logging
+import queue
+import threading
+from contextlib import contextmanager
+from typing import Callable, Optional
+from selenium.common.exceptions import TimeoutException, WebDriverException
+
+logger = logging.getLogger(__name__)
+
+
+class DriverPool:
+    """Hand out at most ``size`` WebDriver instances, creating them lazily.
+
+    ``factory`` builds a new driver and ``warm_up`` (optional) prepares it
+    once, e.g. by visiting the homepage, before its first lease. A driver
+    that raises WebDriverException while leased is treated as crashed: it
+    is quit and a fresh one is built on the next lease. A TimeoutException
+    is the page's doing, so that driver goes back to the pool.
+    """
+
+    def __init__(self, factory: Callable, size: int = 2,
+                 warm_up: Optional[Callable] = None):
+        self.factory = factory
+        self.size = size
+        self.warm_up = warm_up
+
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._closed = False
+        self.restarts = 0
+
+    def _new_driver(self):
+        driver = self.factory()
+        if driver is None:
+            raise WebDriverException("Driver factory returned no driver")
+        if self.warm_up:
+            try:
+                self.warm_up(driver)
+            except Exception:
+                self._quit(driver)
+                raise
+        return driver
+
+    @staticmethod
+    def _quit(driver):
+        try:
+            driver.quit()
+        except Exception:
+            pass
+
+    def _acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            return self._new_driver()
+
+    @contextmanager
+    def lease(self):
+        """Borrow a driver for the duration of a with block"""
+        if self._closed:
+            raise RuntimeError("Driver pool is closed")
+
+        # One slot per driver, so at most `size` drivers exist at once
+        self._slots.acquire()
+        try:
+            driver = self._acquire()
+        except BaseException:
+            self._slots.release()
+            raise
+
+        try:
+            yield driver
+        except TimeoutException:
+            self._idle.put(driver)
+            raise
+        except WebDriverException:
+            logger.warning("WebDriver crashed, it will be restarted")
+            self._quit(driver)
+            self.restarts += 1
+            raise
+        except BaseException:
+            self._idle.put(driver)
+            raise
+        else:
+            if self._closed:
+                self._quit(driver)
+            else:
+                self._idle.put(driver)
+        finally:
+            self._slots.release()
+
+    def close(self):
+        """Quit every idle driver; leased ones are quit when returned"""
+        self._closed = True
+        while True:
+            try:
+                driver = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._quit(driver)
+        logger.info("Driver pool closed")
@@ -0,0 +1,304 @@
+"""
+Optional detail-page enrichment: EAN, dimensions, stock and unit pricing
+"""
+import json
+import logging
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, Iterable, List, Mapping, Optional
+import lxml.html
+from .extraction import parse_price
+from .incremental import fingerprint, product_key
+from .parsers import preclassify, sniff_encoding
+from .structured_data import json_scripts
+
+logger = logging.getLogger(__name__)
+
+# Fields a detail page can add to a product
+DETAIL_FIELDS = ('ean', 'dimensions', 'stock', 'unit_price', 'unit_price_unit')
+
+UNIT_PRICE_RE = re.compile(
+    r'(\d+(?:\s\d{3})*(?:[,.]\d+)?)\s*€\s*(?:/|le|la|par)\s*'
+    r'(m²|m2|m³|m3|ml|m|kg|g|l|unité|pièce)(?!\w)', re.I)
+
+# Spec table labels, lowercased and without accents or trailing colon
+EAN_LABELS = ('ean', 'code ean', 'gtin', 'ean13')
+DIMENSION_LABELS = ('largeur', 'hauteur', 'profondeur', 'longueur', 'epaisseur',
+                    'diametre', 'dimensions', 'poids')
+ACCENTS = str.maketrans('éèêëàâîïôöûüç', 'eeeeaaiioouuc')
+
+# schema.org availability -> stock value
+AVAILABILITY = {
+    'instock': 'in_stock',
+    'instoreonly': 'in_store_only',
+    'limitedavailability': 'limited',
+    'onlineonly': 'online_only',
+    'outofstock': 'out_of_stock',
+    'soldout': 'out_of_stock',
+    'discontinued': 'discontinued',
+    'preorder': 'preorder',
+    'backorder': 'backorder',
+}
+STOCK_TEXT = (
+    ('rupture', 'out_of_stock'),
+    ('indisponible', 'out_of_stock'),
+    ('en stock', 'in_stock'),
+    ('disponible', 'in_stock'),
+)
+
+
+def _label(text: str) -> str:
+    return text.strip().rstrip(':').strip().lower().translate(ACCENTS)
+
+
+def _json_ld_products(content: bytes) -> Iterable[Dict]:
+    """The schema.org Product objects of a page's JSON-LD blocks"""
+    for source, data in json_scripts(content):
+        if source != 'json-ld':
+            continue
+        if isinstance(data, dict):
+            data = data.get('@graph', [data])
+        if not isinstance(data, list):
+            continue
+        for item in data:
+            if isinstance(item, dict) and 'Product' in str(item.get('@type')):
+                yield item
+
+
+def _from_json_ld(item: Dict, fields: Dict):
+    for key in ('gtin13', 'gtin', 'gtin14', 'gtin12', 'gtin8'):
+        if item.get(key):
+            fields.setdefault('ean', str(item[key]))
+            break
+
+    for key in ('width', 'height', 'depth', 'weight'):
+        value = item.get(key)
+        if isinstance(value, dict):
+            value = ' '.join(str(value[part]) for part in ('value', 'unitText', 'unitCode')
+                             if value.get(part) is not None)
+        if value:
+            fields.setdefault('dimensions', {})[key] = str(value)
+
+    offers = item.get('offers')
+    if isinstance(offers, list):
+        offers = offers[0] if offers else None
+    if isinstance(offers, dict) and offers.get('availability'):
+        availability = str(offers['availability']).rsplit('/', 1)[-1].lower()
+        fields.setdefault('stock', AVAILABILITY.get(availability, availability))
+
+
+def _spec_rows(doc) -> Iterable:
+    """(label, value) pairs of spec tables and definition lists"""
+    for row in doc.xpath('//tr[th and td]'):
+        yield row.xpath('string(th[1])'), row.xpath('string(td[1])')
+    for term in doc.xpath('//dl/dt'):
+        value = term.xpath('following-sibling::dd[1]')
+        if value:
+            yield term.text_content(), value[0].text_content()
+
+
+def parse_detail_page(content: bytes) -> Dict:
+    """Extract the DETAIL_FIELDS found on a product page.
+
+    JSON-LD is read first; spec tables, stock labels and unit price
+    texts fill in what it lacks. Fields that can't be found are left out.
+    """
+    fields = {}
+    for item in _json_ld_products(content):
+        _from_json_ld(item, fields)
+
+    doc = lxml.html.document_fromstring(
+        content, parser=lxml.html.HTMLParser(encoding=sniff_encoding(content)))
+
+    json_dimensions = 'dimensions' in fields
+    for label, value in _spec_rows(doc):
+        label, value = _label(label), ' '.join(value.split())
+        if not value:
+            continue
+        if label in EAN_LABELS:
+            fields.setdefault('ean', value)
+        elif not json_dimensions and label.split(' ')[0] in DIMENSION_LABELS:
+            fields.setdefault('dimensions', {})[label] = value
+
+    if 'stock' not in fields:
+        for element in doc.xpath('//*[contains(@data-testid, "stock") or '
+                                 'contains(@class, "stock") or contains(@class, "availability")]'):
+            text = element.text_content().lower()
+            stock = next((value for marker, value in STOCK_TEXT if marker in text), None)
+            if stock:
+                fields['stock'] = stock
+                break
+
+    for element in doc.xpath('//*[contains(@data-testid, "price") or contains(@class, "price")]'):
+        match = UNIT_PRICE_RE.search(element.text_content())
+        if match:
+            fields['unit_price'] = parse_price(re.sub(r'\s', '', match.group(1)))
+            fields['unit_price_unit'] = match.group(2).lower()
+            break
+
+    return fields
+
+
+class DetailCache:
+    """Detail fields per product in SQLite, reused while the listing is
+    unchanged and the entry is younger than ``ttl`` seconds.
+
+    A product counts as unchanged when its listing fingerprint (price,
+    name, brand, unit, image) matches the one stored with the entry.
+    Expired entries are evicted when the cache is opened.
+    """
+
+    def __init__(self, path: str = "detail_cache.db", ttl: float = 7 * 24 * 3600):
+        self.path = path
+        self.ttl = ttl
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS details ("
+            "product_id TEXT PRIMARY KEY, fingerprint TEXT NOT NULL, "
+            "fields TEXT NOT NULL, fetched_at REAL NOT NULL)")
+        self.stats = {'hits': 0, 'misses': 0, 'stored': 0, 'evicted': 0}
+        self._lock = threading.Lock()
+        self.evict()
+
+    def evict(self) -> int:
+        with self._lock, self.conn:
+            evicted = self.conn.execute("DELETE FROM details WHERE fetched_at < ?",
+                                        (time.time() - self.ttl,)).rowcount
+            self.stats['evicted'] += evicted
+        return evicted
+
+    def get(self, product: Mapping) -> Optional[Dict]:
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT fingerprint, fields, fetched_at FROM details WHERE product_id = ?",
+                (product_key(product),)).fetchone()
+            if (row is None or row[0] != fingerprint(product)
+                    or row[2] < time.time() - self.ttl):
+                self.stats['misses'] += 1
+                return None
+            self.stats['hits'] += 1
+        return json.loads(row[1])
+
+    def put(self, product: Mapping, fields: Dict):
+        with self._lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO details (product_id, fingerprint, fields, fetched_at) "
+                "VALUES (?, ?, ?, ?)",
+                (product_key(product), fingerprint(product),
+                 json.dumps(fields, ensure_ascii=False), time.time()))
+            self.stats['stored'] += 1
+
+    def close(self):
+        self.conn.close()
+
+
+class DetailEnricher:
+    """Fetch the product page of extracted products and merge its fields in.
+
+    At most ``concurrency`` pages are fetched at once, through the
+    scraper's session and rate limiter. A product page is fetched once
+    per batch however many records point to it, and not at all when the
+    cache has a fresh entry for an unchanged product. Failed fetches
+    leave the products as they are and are not cached.
+    """
+
+    def __init__(self, scraper, cache: Optional[DetailCache] = None, concurrency: int = 4):
+        self.scraper = scraper
+        self.cache = cache
+        self.concurrency = concurrency
+
+    def _fetch(self, url: str) -> Optional[Dict]:
+        content = self.scraper.fetch_page_bytes(url)
+        if content is None:
+            return None
+        verdict = preclassify(content)
+        if verdict != 'ok':
+            logger.warning("Skipping %s detail page: %s", verdict, url)
+            return None
+        with self.scraper.metrics.timer('extract'):
+            fields = parse_detail_page(content)
+        self.scraper.metrics.count('details')
+        return fields
+
+    def enrich(self, products: Iterable[Mapping]) -> List[Mapping]:
+        """Merge detail fields into products in place and return them as a list"""
+        products = list(products)
+        pending = {}
+        for product in products:
+            if not product.get('product_url'):
+                continue
+            cached = self.cache.get(product) if self.cache else None
+            if cached is not None:
+                product.update(cached)
+            else:
+                pending.setdefault(product_key(product), []).append(product)
+
+        if not pending:
+            return products
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            futures = {pool.submit(self._fetch, group[0]['product_url']): group
+                       for group in pending.values()}
+            for future in as_completed(futures):
+                group = futures[future]
+                try:
+                    fields = future.result()
+                except Exception as e:
+                    logger.warning("Detail page of %s failed: %s", group[0]['product_url'], e)
+                    continue
+                if fields is None:
+                    continue
+                for product in group:
+                    product.update(fields)
+                if self.cache:
+                    self.cache.put(group[0], fields)
+
+        logger.info("Enriched %d products from %d detail pages",
+                    sum(len(group) for group in pending.values()), len(pending))
+        return products
+
+
+class EnrichingSink:
+    """Sink wrapper that enriches products in batches before passing them on.
+
+    Batches of ``batch_size`` products (a search page's worth by default)
+    are enriched concurrently, so detail fetches overlap each other but
+    products still reach ``sink`` in order. ``close`` flushes the last
+    batch.
+    """
+
+    def __init__(self, enricher: DetailEnricher, sink: Callable[[Mapping], None],
+                 batch_size: int = 24):
+        self.enricher = enricher
+        self.sink = sink
+        self.batch_size = batch_size
+        self._batch = []
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def write(self, product: Mapping):
+        with self._lock:
+            self._batch.append(product)
+            if len(self._batch) >= self.batch_size:
+                self._flush()
+
+    def _flush(self):
+        batch, self._batch = self._batch, []
+        for product in self.enricher.enrich(batch):
+            self.sink(product)
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    def close(self):
+        self.flush()
@@ -0,0 +1,252 @@
+"""
+Precompiled single-pass extraction plan for product cards
+"""
+import re
+from typing import Dict, Optional
+from urllib.parse import urljoin
+from .product import Product
+
+NAME_CLASS_RE = re.compile(r'title|name|product', re.I)
+PRICE_CLASS_RE = re.compile(r'price', re.I)
+BRAND_CLASS_RE = re.compile(r'brand|marque|seller', re.I)
+# Whole words only: a bare 'l' inside a word or in "l.60 cm" (width) is no unit
+UNIT_RE = re.compile(r'(?<!\w)(m²|m2|pièce|unité|l|kg|kit|lot)(?!\w|\.\d)', re.I)
+NAME_UNIT_RE = re.compile(r'(kit|lot|pack|set)')
+PRICE_RE = re.compile(r'(\d+[,.]?\d*)')
+
+NAME_TAGS = frozenset(['h3', 'h2', 'h4', 'span', 'a'])
+PRICE_TAGS = frozenset(['span', 'div'])
+BRAND_TAGS = frozenset(['span', 'div', 'p'])
+
+# Slots filled by the primary data-testid lookups; once all of them and a
+# unit string are seen, no fallback can change the result. The unit has
+# to be part of it: a label after the testid tags ("/ m²" next to the
+# price) is the card's unit whatever the DOM order
+PRIMARY_SLOTS = ('name_testid', 'price_testid', 'link_testid',
+                 'seller_testid', 'img_testid', 'unit_text')
+
+
+def parse_price(price_text: str) -> Optional[float]:
+    """Parse the first number of a price label, e.g. '129,99 €' -> 129.99"""
+    if not price_text:
+        return None
+    price_match = PRICE_RE.search(price_text.replace(' ', ''))
+    if price_match:
+        return float(price_match.group(1).replace(',', '.'))
+    return None
+
+
+class ProductExtractionPlan:
+    """Resolve every product field of a card in one walk over its subtree.
+
+    The priority of each field is the one of the original chain of
+    ``container.find`` calls: data-testid first, then class based
+    fallbacks, then the first matching tag or text. This implementation
+    walks BeautifulSoup trees; subclasses override the node accessors for
+    other tree types.
+    """
+
+    def __init__(self, base_url: str):
+        self.base_url = base_url
+
+    def _walk(self, container):
+        """Yield (tag, None) and (string, parent) pairs in document order"""
+        # Imported here so the lxml backend never loads bs4
+        from bs4 import NavigableString, Tag
+        for node in container.descendants:
+            if isinstance(node, Tag):
+                yield node, None
+            elif isinstance(node, NavigableString):
+                yield node, node.parent
+
+    def tag_name(self, node) -> str:
+        return node.name
+
+    def attr(self, node, key: str):
+        return node.get(key)
+
+    def text(self, node) -> str:
+        return node.get_text(strip=True)
+
+    def scan(self, container) -> Dict:
+        """Collect the first candidate node for every lookup rule"""
+        found = {}
+
+        for node, parent in self._walk(container):
+            if parent is None:
+                name = self.tag_name(node)
+                testid = self.attr(node, 'data-testid')
+
+                if testid is not None:
+                    if name == 'p' and testid == 'product-name':
+                        found.setdefault('name_testid', node)
+                    elif name == 'span' and testid == 'product-price':
+                        found.setdefault('price_testid', node)
+                    elif name == 'a' and testid == 'product-link':
+                        found.setdefault('link_testid', node)
+                    elif name == 'p' and testid == 'seller-info':
+                        found.setdefault('seller_testid', node)
+                    elif name == 'img' and testid == 'product-image':
+                        found.setdefault('img_testid', node)
+
+                if name == 'a':
+                    found.setdefault('first_a', node)
+                elif name == 'img':
+                    found.setdefault('first_img', node)
+
+                classes = self.attr(node, 'class')
+                if classes:
+                    if isinstance(classes, str):
+                        classes = classes.split()
+                    classes = ' '.join(classes)
+                    if name in NAME_TAGS and 'name_class' not in found and NAME_CLASS_RE.search(classes):
+                        found['name_class'] = node
+                    if name in PRICE_TAGS and 'price_class' not in found and PRICE_CLASS_RE.search(classes):
+                        found['price_class'] = node
+                    if name in BRAND_TAGS and 'brand_class' not in found and BRAND_CLASS_RE.search(classes):
+                        found['brand_class'] = node
+
+            else:
+                if 'euro_parent' not in found and '€' in node:
+                    found['euro_parent'] = parent
+                if 'unit_text' not in found:
+                    unit_match = UNIT_RE.search(node)
+                    if unit_match:
+                        found['unit_text'] = unit_match.group(1)
+
+            if all(slot in found for slot in PRIMARY_SLOTS):
+                break
+
+        return found
+
+    def raw_fields(self, container) -> Dict:
+        """Resolve the text and attribute values a product is built from"""
+        found = self.scan(container)
+        raw = {}
+
+        name_elem = found.get('name_testid')
+        if name_elem is None:
+            name_elem = found.get('name_class')
+        if name_elem is None:
+            name_elem = found.get('first_a')
+        if name_elem is None:
+            return raw
+        raw['name'] = self.text(name_elem)
+
+        price_elem = found.get('price_testid')
+        if price_elem is None:
+            price_elem = found.get('price_class')
+        if price_elem is None:
+            price_elem = found.get('euro_parent')
+        raw['price_text'] = self.text(price_elem) if price_elem is not None else ""
+
+        url_elem = found.get('link_testid')
+        if url_elem is None:
+            url_elem = name_elem if self.tag_name(name_elem) == 'a' else found.get(
+                'first_a')
+        raw['href'] = self.attr(url_elem, 'href') if url_elem is not None else None
+
+        brand_elem = found.get('seller_testid')
+        if brand_elem is None:
+            brand_elem = found.get('brand_class')
+        raw['brand'] = self.text(brand_elem) if brand_elem is not None else ""
+
+        img_elem = found.get('img_testid')
+        if img_elem is None:
+            img_elem = found.get('first_img')
+        if img_elem is not None:
+            for key in ('src', 'data-src', 'srcset'):
+                raw[key] = self.attr(img_elem, key)
+
+        raw['unit'] = found.get('unit_text', "")
+        return raw
+
+    def build_product(self, raw: Dict, category_name: str) -> Optional[Product]:
+        """Turn raw field values into a Product, or None if unusable"""
+        name = raw.get('name')
+        if not name:
+            return None
+
+        price = parse_price(raw.get('price_text'))
+        if not price:
+            return None
+
+        product_url = ""
+        if raw.get('href'):
+            product_url = urljoin(self.base_url, raw['href'])
+
+        image_url = ""
+        if raw.get('src'):
+            image_url = urljoin(self.base_url, raw['src'])
+        elif raw.get('data-src'):
+            image_url = urljoin(self.base_url, raw['data-src'])
+        # Also check srcset for higher quality images
+        elif raw.get('srcset'):
+            # Extract the first URL from srcset
+            first_url = raw['srcset'].split(',')[0].split(' ')[0]
+            if first_url:
+                image_url = urljoin(self.base_url, first_url)
+
+        unit = raw.get('unit', "")
+
+        # If no unit found, try to extract from product name
+        if not unit:
+            unit_match = NAME_UNIT_RE.search(name.lower())
+            if unit_match:
+                unit = unit_match.group(1)
+
+        return Product(
+            name=name,
+            category=category_name,
+            price=price,
+            currency="EUR",
+            product_url=product_url,
+            brand=raw.get('brand', ""),
+            unit=unit,
+            image_url=image_url,
+        )
+
+    def extract(self, container, category_name: str) -> Optional[Product]:
+        return self.build_product(self.raw_fields(container), category_name)
+
+
+# Tags whose strings BeautifulSoup leaves out of get_text()
+SKIP_TEXT_TAGS = frozenset(['script', 'style', 'template', 'rt', 'rp'])
+
+
+def lxml_strings(element):
+    """Yield the strings get_text() would join for an lxml element"""
+    if element.text:
+        yield element.text
+    for child in element:
+        if isinstance(child.tag, str) and child.tag not in SKIP_TEXT_TAGS:
+            yield from lxml_strings(child)
+        if child.tail:
+            yield child.tail
+
+
+class LxmlExtractionPlan(ProductExtractionPlan):
+    """Same extraction plan over lxml.html elements"""
+
+    def _walk(self, container):
+        # lxml keeps text as .text/.tail and comments as pseudo-elements;
+        # replay them in the order BeautifulSoup's descendants would
+        for child in container:
+            if isinstance(child.tag, str):
+                yield child, None
+                if child.text:
+                    yield child.text, child
+                yield from self._walk(child)
+            elif child.text:
+                yield child.text, container
+            if child.tail:
+                yield child.tail, container
+
+    def tag_name(self, node) -> str:
+        return node.tag
+
+    def attr(self, node, key: str):
+        return node.get(key)
+
+    def text(self, node) -> str:
+        return ''.join(text.strip() for text in lxml_strings(node))
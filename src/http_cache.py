@@ -0,0 +1,243 @@
+"""
+Persistent on-disk HTTP response cache with conditional revalidation
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+import zlib
+from typing import Dict
+import requests
+from requests.structures import CaseInsensitiveDict
+
+# Headers that select a different representation of the same URL
+VARY_HEADERS = ('Accept', 'Accept-Language')
+
+# Headers that describe the transfer, not the stored (decoded) body
+HOP_HEADERS = frozenset(['content-encoding', 'content-length',
+                         'transfer-encoding', 'connection', 'keep-alive'])
+
+
+def _write_atomic(path: str, data: bytes):
+    """Write through a temp file and rename so readers never see a partial file"""
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+class CacheMissError(requests.RequestException):
+    """Raised in replay mode for URLs that were never recorded"""
+
+
+class ResponseCache:
+    """Cache GET responses on disk, zlib-compressed, one entry per key.
+
+    Modes:
+      normal  serve entries younger than ``ttl`` directly and revalidate
+              older ones with If-None-Match / If-Modified-Since
+      record  always hit the network and store every 200 response
+      replay  never touch the network; unknown URLs raise CacheMissError
+
+    Entries older than ``max_age`` are evicted, then the oldest entries
+    until the cache fits in ``max_bytes``.
+    """
+
+    MODES = ('normal', 'record', 'replay')
+
+    def __init__(self, directory: str = '.http_cache', mode: str = 'normal',
+                 ttl: float = 0, max_age: float = 7 * 24 * 3600,
+                 max_bytes: int = 500 * 1024 * 1024, evict_every: int = 100):
+        if mode not in self.MODES:
+            raise ValueError(
+                f"Unknown cache mode '{mode}', expected one of {self.MODES}")
+
+        self.directory = directory
+        self.mode = mode
+        self.ttl = ttl
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self.evict_every = evict_every
+
+        self.stats = {
+            'hits': 0,
+            'revalidated': 0,
+            'misses': 0,
+            'stored': 0,
+            'evicted': 0,
+            'bytes_saved': 0,
+        }
+        self._lock = threading.Lock()
+        self._stores_since_evict = 0
+
+        os.makedirs(directory, exist_ok=True)
+        self.evict()
+
+    @property
+    def offline(self) -> bool:
+        return self.mode == 'replay'
+
+    def key(self, url: str, headers) -> str:
+        parts = [url] + [f"{name}:{headers.get(name, '')}" for name in VARY_HEADERS]
+        return hashlib.sha256('\n'.join(parts).encode('utf-8')).hexdigest()
+
+    def _paths(self, key: str):
+        base = os.path.join(self.directory, key[:2], key)
+        return base + '.json', base + '.body'
+
+    def _load(self, key: str):
+        meta_path, body_path = self._paths(key)
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            with open(body_path, 'rb') as f:
+                body = zlib.decompress(f.read())
+        except (OSError, ValueError, zlib.error):
+            return None, None
+        return meta, body
+
+    def _store(self, key: str, url: str, response: requests.Response):
+        meta_path, body_path = self._paths(key)
+        os.makedirs(os.path.dirname(meta_path), exist_ok=True)
+
+        headers = {name: value for name, value in response.headers.items()
+                   if name.lower() not in HOP_HEADERS}
+        meta = {
+            'url': url,
+            'status': response.status_code,
+            'headers': headers,
+            'stored_at': time.time(),
+        }
+
+        # Body first: an entry is only visible once its metadata exists
+        _write_atomic(body_path, zlib.compress(response.content, 6))
+        _write_atomic(meta_path, json.dumps(meta).encode('utf-8'))
+
+        with self._lock:
+            self.stats['stored'] += 1
+            self._stores_since_evict += 1
+            evict = self._stores_since_evict >= self.evict_every
+            if evict:
+                self._stores_since_evict = 0
+        if evict:
+            self.evict()
+
+    def _touch(self, key: str, meta: Dict):
+        """Mark a revalidated entry as fresh again"""
+        meta_path, _ = self._paths(key)
+        meta['stored_at'] = time.time()
+        _write_atomic(meta_path, json.dumps(meta).encode('utf-8'))
+
+    @staticmethod
+    def _build_response(url: str, meta: Dict, body: bytes) -> requests.Response:
+        response = requests.Response()
+        response.status_code = meta['status']
+        response.headers = CaseInsensitiveDict(meta['headers'])
+        response._content = body
+        response.url = url
+        response.encoding = requests.utils.get_encoding_from_headers(
+            response.headers)
+        response.from_cache = True
+        return response
+
+    def _count(self, stat: str, saved: int = 0):
+        with self._lock:
+            self.stats[stat] += 1
+            self.stats['bytes_saved'] += saved
+
+    def get(self, session: requests.Session, url: str, **kwargs) -> requests.Response:
+        """Cached replacement for session.get(url, **kwargs)"""
+        key = self.key(url, session.headers)
+
+        if self.mode == 'record':
+            response = session.get(url, **kwargs)
+            self._count('misses')
+            if response.status_code == 200:
+                self._store(key, url, response)
+            return response
+
+        meta, body = self._load(key)
+
+        if self.mode == 'replay':
+            if meta is None:
+                self._count('misses')
+                raise CacheMissError(f"No recorded response for {url}")
+            self._count('hits', len(body))
+            return self._build_response(url, meta, body)
+
+        if meta is not None and time.time() - meta['stored_at'] < self.ttl:
+            self._count('hits', len(body))
+            return self._build_response(url, meta, body)
+
+        headers = dict(kwargs.pop('headers', None) or {})
+        if meta is not None:
+            validators = CaseInsensitiveDict(meta['headers'])
+            if validators.get('ETag'):
+                headers['If-None-Match'] = validators['ETag']
+            if validators.get('Last-Modified'):
+                headers['If-Modified-Since'] = validators['Last-Modified']
+
+        response = session.get(url, headers=headers, **kwargs)
+
+        if response.status_code == 304 and meta is not None:
+            self._count('revalidated', len(body))
+            self._touch(key, meta)
+            return self._build_response(url, meta, body)
+
+        self._count('misses')
+        if response.status_code == 200:
+            self._store(key, url, response)
+        return response
+
+    def discard(self, session: requests.Session, url: str):
+        """Forget an entry, e.g. a 200 that turned out to be a block page"""
+        if self.mode == 'replay':
+            return
+        for path in self._paths(self.key(url, session.headers)):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def evict(self):
+        """Drop entries older than max_age, then the oldest over max_bytes"""
+        now = time.time()
+        entries = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if not name.endswith('.json'):
+                    continue
+                meta_path = os.path.join(root, name)
+                body_path = meta_path[:-len('.json')] + '.body'
+                try:
+                    stored_at = os.path.getmtime(meta_path)
+                    size = os.path.getsize(meta_path) + os.path.getsize(body_path)
+                except OSError:
+                    continue
+                entries.append((stored_at, size, meta_path, body_path))
+
+        entries.sort()
+        total = sum(size for _, size, _, _ in entries)
+        evicted = 0
+        for stored_at, size, meta_path, body_path in entries:
+            if now - stored_at <= self.max_age and total <= self.max_bytes:
+                break
+            for path in (meta_path, body_path):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            total -= size
+            evicted += 1
+
+        with self._lock:
+            self.stats['evicted'] += evicted
+
+    def report(self) -> str:
+        stats = dict(self.stats)
+        lookups = stats['hits'] + stats['revalidated'] + stats['misses']
+        hit_rate = (stats['hits'] + stats['revalidated']) / lookups if lookups else 0
+        return (f"Cache: {stats['hits']} hits, {stats['revalidated']} revalidated, "
+                f"{stats['misses']} misses ({hit_rate:.0%} hit rate), "
+                f"{stats['bytes_saved']} bytes saved, {stats['evicted']} evicted")
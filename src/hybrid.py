@@ -0,0 +1,283 @@
+"""
+Hybrid crawl: plain HTTP for every page, headless Chrome only for the
+pages HTTP can't get
+"""
+import json
+import logging
+import os
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+from . import config
+from .checkpoint import CrawlFrontier
+from .dedup import DedupIndex
+from .scraper import CastoramaScraper
+
+logger = logging.getLogger(__name__)
+
+# Fetch tiers, cheapest first
+TIERS = ('http', 'browser')
+
+# HTTP failures the browser can get past: blocks, bot walls, bodies only
+# a browser decodes and pages it has to render
+ESCALATE_ON = frozenset({'403', 'anti-bot', 'garbled', 'empty', 'content-encoding', 'no-cards'})
+# Rate limits and server or network errors hit the browser just the same;
+# the rate limiter has slowed the host down, so HTTP is tried again
+TRANSIENT = frozenset({'429', 'error'})
+
+
+class HybridScraper:
+    """Scrape search pages over HTTP and escalate the failing ones to Selenium.
+
+    A page is escalated when HTTP can't get it (403s, anti-bot or garbled
+    pages after ``http_retries`` attempts, see ESCALATE_ON) or when it
+    has no product cards at all on a category with no HTTP page yet,
+    e.g. a shell rendered by JavaScript. No cards after pages that HTTP
+    did extract just ends the category. Rate limits and server errors are
+    not escalated: HTTP is tried up to ``transient_rounds`` more times,
+    held back by the rate limiter. The browser is only started on the
+    first escalation.
+
+    A category is moved to the browser once it gets products there, so
+    the rest of a category escalated on page 1 goes straight to it. With
+    ``state_file`` the choice is kept across runs. HTTP is probed again
+    on the first page of such a category in every run and then every
+    ``http_probe_every`` pages, and the category goes back to HTTP as
+    soon as a probe gets the page. Per-tier pages,
+    failures, products and time go to the metrics as ``<tier>_pages``,
+    ``<tier>_failures``, ``<tier>_products`` and ``<tier>_ms`` counters,
+    next to an ``escalations`` count; tier_report sums them up.
+    """
+
+    def __init__(self, scraper: Optional[CastoramaScraper] = None,
+                 browser_factory: Optional[Callable[[CastoramaScraper], object]] = None,
+                 state_file: Optional[str] = None, http_retries: int = 2,
+                 transient_rounds: int = 2, http_probe_every: int = 10):
+        self.scraper = scraper or CastoramaScraper()
+        self.metrics = self.scraper.metrics
+        self.http_retries = http_retries
+        self.transient_rounds = transient_rounds
+        self.http_probe_every = http_probe_every
+        # Browser pages per category since HTTP was last tried on it
+        self._browser_streak = {}
+        self._browser_factory = browser_factory or self._selenium
+        self.browser = None
+        self._browser_failed = False
+        self.state_file = state_file
+        self.category_tiers = {}
+        if state_file and os.path.exists(state_file):
+            with open(state_file, encoding='utf-8') as f:
+                self.category_tiers = json.load(f)
+
+    @staticmethod
+    def _selenium(scraper: CastoramaScraper):
+        # Imported here so runs that never escalate don't load selenium
+        from .selenium_scraper import CastoramaSeleniumScraper
+        return CastoramaSeleniumScraper(
+            headless=True, base_url=scraper.base_url, rate_limiter=scraper.rate_limiter,
+            metrics=scraper.metrics)
+
+    def _get_browser(self):
+        if self.browser is None and not self._browser_failed:
+            try:
+                self.browser = self._browser_factory(self.scraper)
+            except ImportError as e:
+                logger.error("Cannot escalate to the browser, Selenium not available: %s", e)
+                self._browser_failed = True
+        return self.browser
+
+    def _http_page(self, category: str, page: int, max_products: int,
+                   exhausted_if_empty: bool) -> Tuple[Optional[List[Dict]], Optional[str]]:
+        """(products, None) or (None, retry cause of the failure)"""
+        url = f"{self.scraper.base_url}/search?term={category}&page={page}"
+        soup = self.scraper.get_search_page(url, retries=self.http_retries)
+        if soup is None:
+            return None, self.scraper.last_failure or 'failed'
+        products = self.scraper.extract_page_products(soup, category, max_products, page)
+        if products is None:
+            return ([], None) if exhausted_if_empty else (None, 'no-cards')
+        return products, None
+
+    def _browser_page(self, category: str, page: int,
+                      max_products: int) -> Tuple[Optional[List[Dict]], Optional[str]]:
+        products = self.browser.load_page(category, page)
+        if products is None:
+            return None, 'failed'
+        return products[:max_products], None
+
+    def _fetch(self, tier: str, category: str, page: int, max_products: int,
+               exhausted_if_empty: bool = False) -> Tuple[Optional[List[Dict]], Optional[str]]:
+        start = time.perf_counter()
+        if tier == 'http':
+            products, reason = self._http_page(category, page, max_products, exhausted_if_empty)
+        else:
+            products, reason = self._browser_page(category, page, max_products)
+        elapsed_ms = round((time.perf_counter() - start) * 1000)
+
+        self.metrics.count(f'{tier}_pages', category=category)
+        self.metrics.count(f'{tier}_ms', elapsed_ms, category=category)
+        if products is None:
+            self.metrics.count(f'{tier}_failures', category=category)
+        else:
+            self.metrics.count(f'{tier}_products', len(products), category=category)
+        return products, reason
+
+    def _tier(self, category: str) -> str:
+        """Tier to try first for the next page of a category"""
+        if self.category_tiers.get(category, 'http') == 'http':
+            return 'http'
+        streak = self._browser_streak.get(category, self.http_probe_every)
+        if streak >= self.http_probe_every:
+            self._browser_streak[category] = 0
+            logger.info("Probing HTTP again for %s", category)
+            return 'http'
+        if self._get_browser() is None:
+            return 'http'
+        self._browser_streak[category] = streak + 1
+        return 'browser'
+
+    def scrape_page(self, category: str, page: int, max_products: int = 100,
+                    exhausted_if_empty: bool = False) -> Optional[List[Dict]]:
+        """Products of one search page from the cheapest tier that gets it,
+        None when no tier does. exhausted_if_empty treats a page without
+        cards as the end of the results instead of escalating it."""
+        tier = self._tier(category)
+        if tier == 'http':
+            # A probe of a browser category can't tell a shell from the end
+            exhausted_if_empty = (exhausted_if_empty
+                                  and self.category_tiers.get(category, 'http') == 'http')
+            products, reason = self._fetch('http', category, page, max_products,
+                                           exhausted_if_empty)
+            rounds = 0
+            while products is None and reason in TRANSIENT and rounds < self.transient_rounds:
+                rounds += 1
+                logger.warning("%s page %d failed over HTTP (%s), trying again", category,
+                               page, reason)
+                products, reason = self._fetch('http', category, page, max_products,
+                                               exhausted_if_empty)
+            if products is not None:
+                self.category_tiers[category] = 'http'
+                return products
+            if reason not in ESCALATE_ON:
+                logger.error("Failed to get %s page %d over HTTP (%s), not escalating",
+                             category, page, reason)
+                return None
+            if self._get_browser() is None:
+                logger.error("Failed to get %s page %d (%s over HTTP), no browser to escalate to",
+                             category, page, reason)
+                return None
+            logger.info("Escalating %s page %d to the browser (%s over HTTP)",
+                        category, page, reason)
+            self.metrics.count('escalations', category=category)
+
+        products, reason = self._fetch('browser', category, page, max_products)
+        if products is None:
+            logger.error("Browser could not get %s page %d either (%s)", category, page, reason)
+            return None
+        # No products from the browser either says nothing about HTTP
+        if products:
+            self.category_tiers[category] = 'browser'
+            self._browser_streak.setdefault(category, 0)
+        return products
+
+    def scrape_category(self, category: str, max_products: int = 100, max_pages: int = 10,
+                        sink: Optional[Callable[[Dict], None]] = None,
+                        frontier: Optional[CrawlFrontier] = None,
+                        dedup: Optional[DedupIndex] = None) -> List[Dict]:
+        """Scrape search result pages of a category, page by page through
+        scrape_page, with the sink, frontier and dedup semantics of
+        CastoramaScraper.scrape_product_list"""
+        products = []
+        emit = sink or products.append
+        count = 0
+        page = 1
+        stop_reason = 'limit'
+
+        if frontier:
+            replayed = []
+            progress = frontier.replay(category, replayed.append)
+            count = len(self.scraper._emit_new(category, replayed, emit, dedup))
+            page = progress.next_page
+            if progress.stop_reason:
+                return products
+
+        if not hasattr(self.scraper, '_homepage_visited'):
+            self.scraper._get_homepage_first()
+            self.scraper._homepage_visited = True
+
+        while count < max_products and page <= max_pages:
+            logger.info("Scraping %s page %d", category, page)
+            if frontier:
+                frontier.begin_page(category, page)
+            # Past a page HTTP extracted, no cards means no more results
+            page_products = self.scrape_page(category, page, max_products - count,
+                                             exhausted_if_empty=page > 1)
+            if page_products is None:
+                stop_reason = 'failed'
+                if frontier:
+                    frontier.release_page(category, page)
+                break
+            if frontier:
+                frontier.complete_page(category, page, page_products)
+
+            new_products = self.scraper._emit_new(category, page_products, emit, dedup)
+            count += len(new_products)
+            if not page_products:
+                stop_reason = 'exhausted'
+                break
+            if dedup and dedup.low_yield(len(new_products), len(page_products)):
+                logger.info("Only %d new products on page %d for %s, stopping",
+                            len(new_products), page, category)
+                stop_reason = 'stopped'
+                break
+            page += 1
+
+        self.last_stop_reason = stop_reason
+        if frontier and stop_reason != 'failed':
+            frontier.finish_category(category, stop_reason)
+        return products
+
+    def scrape_all_categories(self, categories: Optional[List[str]] = None,
+                              max_products: int = 100, max_pages: int = 10,
+                              sink: Optional[Callable[[Dict], None]] = None,
+                              frontier: Optional[CrawlFrontier] = None,
+                              dedup: Optional[DedupIndex] = None) -> List[Dict]:
+        """Scrape every category (config.categories by default)"""
+        all_products = []
+        for category in categories or config.categories:
+            logger.info("Scraping category: %s (%s first)", category,
+                        self.category_tiers.get(category, 'http'))
+            products = self.scrape_category(category, max_products, max_pages,
+                                            sink=sink, frontier=frontier, dedup=dedup)
+            all_products.extend(products)
+            if not sink:
+                logger.info("Found %d products in %s", len(products), category)
+        self.save_state()
+        return all_products
+
+    def save_state(self):
+        if self.state_file:
+            with open(self.state_file, 'w', encoding='utf-8') as f:
+                json.dump(self.category_tiers, f, ensure_ascii=False, indent=2)
+
+    def tier_report(self) -> Dict:
+        """Pages, success rate, products and time per page of each tier"""
+        counters = self.metrics.to_dict()['run']['counters']
+        report = {}
+        for tier in TIERS:
+            pages = counters.get(f'{tier}_pages', 0)
+            failures = counters.get(f'{tier}_failures', 0)
+            report[tier] = {
+                'pages': pages,
+                'failures': failures,
+                'success_rate': round((pages - failures) / pages, 3) if pages else None,
+                'products': counters.get(f'{tier}_products', 0),
+                'ms_per_page': round(counters.get(f'{tier}_ms', 0) / pages, 1) if pages else None,
+            }
+        report['escalations'] = counters.get('escalations', 0)
+        report['categories'] = dict(self.category_tiers)
+        return report
+
+    def close(self):
+        self.save_state()
+        if self.browser is not None:
+            self.browser.close()
@@ -0,0 +1,139 @@
+"""
+Per-product fingerprints and delta output for incremental runs
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+from typing import Dict, List, Optional
+from .product import dumps_indented
+
+logger = logging.getLogger(__name__)
+
+PRODUCT_ID_RE = re.compile(r'/([^/?#]+)\.prd\b')
+
+# Fields whose change makes a product show up as "changed" in the delta
+FINGERPRINT_FIELDS = ('price', 'name', 'brand', 'unit', 'image_url')
+
+
+def product_id(product_url: str) -> Optional[str]:
+    """EAN-style id of a product page, e.g. '5905683156820_CAFR'"""
+    match = PRODUCT_ID_RE.search(product_url or '')
+    return match.group(1) if match else None
+
+
+def product_key(product: Dict) -> str:
+    """Stable key of a product: its id, else its URL, else its name"""
+    return product_id(product.get('product_url')) or product.get('product_url') or product['name']
+
+
+def fingerprint(product: Dict) -> str:
+    values = json.dumps([product.get(field) for field in FINGERPRINT_FIELDS],
+                        ensure_ascii=False)
+    return hashlib.sha1(values.encode('utf-8')).hexdigest()
+
+
+class IncrementalTracker:
+    """Compare a run against the fingerprints of the previous one.
+
+    The state file maps product keys to their fingerprint, category and
+    URL. Products of a category are only reported as removed when that
+    category was paginated to the end, since an early stop or a page limit
+    leaves later products unseen.
+    """
+
+    def __init__(self, state_file: str = "products_state.json", unchanged_pages_to_stop: int = 1):
+        self.state_file = state_file
+        self.unchanged_pages_to_stop = unchanged_pages_to_stop
+
+        self.previous = {}
+        if os.path.exists(state_file):
+            with open(state_file, 'r', encoding='utf-8') as f:
+                self.previous = json.load(f).get('products', {})
+
+        self.seen = {}
+        self.added = []
+        self.changed = []
+        self.unchanged = 0
+        self.complete_categories = set()
+        self._unchanged_pages = {}
+
+    def _status(self, key: str, product: Dict) -> str:
+        known = self.previous.get(key)
+        if known is None:
+            return 'added'
+        if known['fingerprint'] != fingerprint(product):
+            return 'changed'
+        return 'unchanged'
+
+    def page_unchanged(self, category: str, page_products: List[Dict]) -> bool:
+        """Stop condition: True once enough pages in a row had nothing new"""
+        if page_products and all(self._status(product_key(product), product) == 'unchanged'
+                                 for product in page_products):
+            self._unchanged_pages[category] = self._unchanged_pages.get(category, 0) + 1
+        else:
+            self._unchanged_pages[category] = 0
+        return self._unchanged_pages[category] >= self.unchanged_pages_to_stop
+
+    def observe(self, category: str, products: List[Dict], complete: bool):
+        """Record the products scraped for a category"""
+        for product in products:
+            key = product_key(product)
+            if key in self.seen:
+                continue
+
+            status = self._status(key, product)
+            if status == 'added':
+                self.added.append(product)
+            elif status == 'changed':
+                self.changed.append(product)
+            else:
+                self.unchanged += 1
+
+            self.seen[key] = {
+                'fingerprint': fingerprint(product),
+                'category': category,
+                'product_url': product.get('product_url', ''),
+            }
+
+        if complete:
+            self.complete_categories.add(category)
+
+    def removed(self) -> List[Dict]:
+        return [
+            {'product_id': key, 'category': known['category'],
+             'product_url': known['product_url']}
+            for key, known in self.previous.items()
+            if key not in self.seen and known['category'] in self.complete_categories
+        ]
+
+    def save(self, delta_file: str = "products_delta.json") -> Dict:
+        """Write the delta file and the updated fingerprint state"""
+        removed = self.removed()
+        removed_keys = {entry['product_id'] for entry in removed}
+
+        state = {key: known for key, known in self.previous.items()
+                 if key not in removed_keys}
+        state.update(self.seen)
+
+        delta = {
+            "scrape_timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "added": self.added,
+            "changed": self.changed,
+            "removed": removed,
+            "unchanged": self.unchanged,
+        }
+        # added/changed hold Product records, which stdlib json can't encode
+        with open(delta_file, 'w', encoding='utf-8') as f:
+            f.write(dumps_indented(delta))
+
+        with open(self.state_file, 'w', encoding='utf-8') as f:
+            json.dump({"scrape_timestamp": delta["scrape_timestamp"],
+                       "products": state}, f, ensure_ascii=False)
+
+        logger.info("Delta: %d added, %d changed, %d removed, %d unchanged -> %s",
+                    len(self.added), len(self.changed), len(removed), self.unchanged,
+                    delta_file)
+        return delta
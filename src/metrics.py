@@ -0,0 +1,178 @@
+"""
+Per-stage timings and counters for a scrape, exportable as JSON or in
+the Prometheus text format
+"""
+import json
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+from urllib.parse import parse_qs, urlparse
+
+# Timed stages, in pipeline order
+STAGES = (
+    'wait',        # rate limiter sleeps before a request
+    'fetch',       # request and download of a page
+    'classify',    # byte-level sniffing of the raw body for block/garbled pages
+    'structured',  # scanning the raw body for embedded product JSON
+    'parse',       # building the document tree
+    'decode',      # turning the tree into text for the anti-bot/garbled checks
+    'select',      # probing the product card selectors
+    'extract',     # extracting fields from the cards
+)
+
+
+def category_of(url: str) -> Optional[str]:
+    """The search term of a search page URL, None for other pages"""
+    terms = parse_qs(urlparse(url).query).get('term')
+    return terms[0] if terms else None
+
+
+class _Totals:
+    def __init__(self):
+        self.seconds = dict.fromkeys(STAGES, 0.0)
+        self.calls = dict.fromkeys(STAGES, 0)
+        self.counters = {}
+        self.retries = {}
+        self.first = None
+        self.last = None
+
+    def touch(self, now: float):
+        if self.first is None:
+            self.first = now
+        self.last = now
+
+    def as_dict(self, elapsed: float) -> Dict:
+        products = self.counters.get('products', 0)
+        pages = self.counters.get('pages', 0)
+        structured = self.counters.get('structured_pages', 0)
+        decoded = self.counters.get('bytes', 0)
+        wire = self.counters.get('wire_bytes')
+        return {
+            'stages': {
+                stage: {'seconds': round(self.seconds[stage], 6), 'calls': self.calls[stage]}
+                for stage in STAGES
+            },
+            'counters': dict(self.counters),
+            'retries': dict(self.retries),
+            'elapsed_seconds': round(elapsed, 6),
+            'products_per_second': round(products / elapsed, 3) if elapsed > 0 else 0.0,
+            # Share of pages read from embedded JSON instead of the DOM
+            'structured_hit_rate': round(structured / pages, 3) if pages else 0.0,
+            # Bytes on the wire per decoded byte, None when nothing was fetched
+            'wire_ratio': round(wire / decoded, 3) if wire is not None and decoded else None,
+        }
+
+
+class ScrapeMetrics:
+    """Collect timings and counters per category and for the whole run.
+
+    Stage times go through ``timer`` or ``observe``; counters such as
+    requests, bytes, pages and products through ``count``; retries by
+    cause (403, 429, anti-bot, garbled, error...) through ``retry``.
+    The category is passed explicitly or derived from a search URL.
+    """
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self._run = _Totals()
+        self._categories = {}
+        self._lock = threading.Lock()
+
+    def _targets(self, category: Optional[str]):
+        now = time.monotonic()
+        targets = [self._run]
+        if category is not None:
+            if category not in self._categories:
+                self._categories[category] = _Totals()
+            targets.append(self._categories[category])
+        for totals in targets:
+            totals.touch(now)
+        return targets
+
+    def observe(self, stage: str, seconds: float, category: Optional[str] = None):
+        with self._lock:
+            for totals in self._targets(category):
+                totals.seconds[stage] += seconds
+                totals.calls[stage] += 1
+
+    @contextmanager
+    def timer(self, stage: str, category: Optional[str] = None):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start, category)
+
+    def count(self, name: str, value: int = 1, category: Optional[str] = None):
+        with self._lock:
+            for totals in self._targets(category):
+                totals.counters[name] = totals.counters.get(name, 0) + value
+
+    def retry(self, cause: str, category: Optional[str] = None):
+        with self._lock:
+            for totals in self._targets(category):
+                totals.retries[cause] = totals.retries.get(cause, 0) + 1
+
+    def to_dict(self) -> Dict:
+        with self._lock:
+            run = self._run.as_dict(time.monotonic() - self.started)
+            categories = {
+                category: totals.as_dict(totals.last - totals.first)
+                for category, totals in self._categories.items()
+            }
+        return {'run': run, 'categories': categories}
+
+    def save(self, filename: str = "scrape_metrics.json"):
+        with open(filename, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+
+    def to_prometheus(self, prefix: str = 'scraper') -> str:
+        """Render the metrics in the Prometheus text exposition format"""
+        report = self.to_dict()
+        scopes = [({}, report['run'])] + [
+            ({'category': category}, values)
+            for category, values in report['categories'].items()
+        ]
+
+        families = {}
+
+        def add(name: str, kind: str, help_text: str, labels: Dict, value):
+            family = families.setdefault(name, (kind, help_text, []))
+            family[2].append((labels, value))
+
+        for scope, values in scopes:
+            for stage, stage_values in values['stages'].items():
+                labels = dict(scope, stage=stage)
+                add('stage_seconds_total', 'counter', 'Time spent per scrape stage',
+                    labels, stage_values['seconds'])
+                add('stage_calls_total', 'counter', 'Calls per scrape stage',
+                    labels, stage_values['calls'])
+            for name, value in values['counters'].items():
+                add(f'{name}_total', 'counter', f'Total {name}', scope, value)
+            for cause, value in values['retries'].items():
+                add('retries_total', 'counter', 'Retries by cause',
+                    dict(scope, cause=cause), value)
+            add('products_per_second', 'gauge', 'Products extracted per second',
+                scope, values['products_per_second'])
+            add('structured_hit_rate', 'gauge', 'Share of pages read from embedded JSON',
+                scope, values['structured_hit_rate'])
+            if values['wire_ratio'] is not None:
+                add('wire_ratio', 'gauge', 'Bytes on the wire per decoded byte',
+                    scope, values['wire_ratio'])
+
+        lines = []
+        for name, (kind, help_text, samples) in families.items():
+            metric = f'{prefix}_{name}'
+            lines.append(f'# HELP {metric} {help_text}')
+            lines.append(f'# TYPE {metric} {kind}')
+            for labels, value in samples:
+                rendered = ','.join(
+                    '{}="{}"'.format(key, str(label).replace('\\', '\\\\').replace('"', '\\"'))
+                    for key, label in labels.items())
+                lines.append(f'{metric}{{{rendered}}} {value}' if rendered else f'{metric} {value}')
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, filename: str = "scrape_metrics.prom"):
+        with open(filename, 'w', encoding='utf-8') as f:
+            f.write(self.to_prometheus())
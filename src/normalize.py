@@ -0,0 +1,185 @@
+"""
+Batched normalization of extracted products: canonical units, quantities
+parsed from names and price per unit
+"""
+import argparse
+import logging
+import os
+import re
+from bisect import bisect_right
+from collections.abc import MutableMapping
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from .sinks import NDJSONSink, read_ndjson
+
+logger = logging.getLogger(__name__)
+
+# Fields set on every normalized product
+NORMALIZED_FIELDS = ('unit', 'quantity', 'quantity_unit', 'price_per_unit', 'size_cm')
+
+# Card unit texts -> canonical unit
+CANONICAL_UNITS = {
+    'm²': 'm2', 'm2': 'm2',
+    'pièce': 'piece', 'piece': 'piece', 'unité': 'piece', 'unite': 'piece',
+    'l': 'l', 'kg': 'kg',
+    'kit': 'kit', 'lot': 'lot', 'pack': 'pack', 'set': 'set',
+}
+
+# Measures in names -> (canonical unit, factor to it)
+MEASURES = {
+    'm²': ('m2', 1.0), 'm2': ('m2', 1.0),
+    'm³': ('m3', 1.0), 'm3': ('m3', 1.0),
+    'l': ('l', 1.0), 'litre': ('l', 1.0), 'litres': ('l', 1.0),
+    'cl': ('l', 0.01), 'ml': ('l', 0.001),
+    'kg': ('kg', 1.0), 'g': ('kg', 0.001),
+}
+LENGTHS = {'mm': 0.1, 'cm': 1.0, 'm': 100.0}
+
+# Patterns run over lowercased names
+NUMBER = r'(\d+(?:[.,]\d+)?)'
+# "2.5L", "1,44 m²", "500 ml"; not "l.60 cm" or "3 lames"
+MEASURE_RE = re.compile(NUMBER + r'\s*(m²|m2|m³|m3|kg|g|cl|ml|litres?|l)(?![\w²³])')
+# "90x50cm", "45 x 45 cm", "120x60x2 cm", "60 cm x 60 cm"
+SIZE_RE = re.compile(
+    NUMBER + r'\s*(?:cm|mm)?\s*[x×]\s*' + NUMBER
+    + r'(?:\s*(?:cm|mm)?\s*[x×]\s*' + NUMBER + r')?\s*(mm|cm|m)(?!\w)')
+# Pack words, with their size when given: "kit", "lot de 3", "boîte de 50"
+PACK_RE = re.compile(
+    r'(?<!\w)(kit|lot|pack|set|boîte|boite|carton)(?!\w)(?:\s+de\s+(\d+)(?!\w))?')
+# Pack words that are also a selling unit
+NAME_UNITS = frozenset(['kit', 'lot', 'pack', 'set'])
+# Between the rows of a joined column: neither \s nor \w, so no pattern
+# match runs from one product's name into the next
+ROW_SEPARATOR = '\x00'
+
+
+def _number(text: str) -> float:
+    return float(text.replace(',', '.'))
+
+
+def _column(values: Iterable[Optional[str]]) -> Tuple[str, List[int]]:
+    """Join a string column into one lowercased text, with the offset of
+    each row, so a pattern scans the whole batch in one call"""
+    # Lowercased row by row: lowering can change a string's length
+    rows = [(value or '').replace(ROW_SEPARATOR, ' ').lower() for value in values]
+    starts = []
+    offset = 0
+    for row in rows:
+        starts.append(offset)
+        offset += len(row) + 1
+    return ROW_SEPARATOR.join(rows), starts
+
+
+def _row_matches(pattern: re.Pattern, text: str,
+                 starts: List[int]) -> Iterator[Tuple[int, re.Match]]:
+    """(row, match) for every match of pattern in a joined column"""
+    for match in pattern.finditer(text):
+        yield bisect_right(starts, match.start()) - 1, match
+
+
+def _first_matches(pattern: re.Pattern, text: str, starts: List[int]) -> Dict[int, re.Match]:
+    """First match of pattern per row of a joined column"""
+    matches = {}
+    for row, match in _row_matches(pattern, text, starts):
+        matches.setdefault(row, match)
+    return matches
+
+
+def normalize_products(products: List[MutableMapping]) -> List[MutableMapping]:
+    """Set NORMALIZED_FIELDS on a batch of products, in place.
+
+    ``unit`` becomes a canonical unit ('m2', 'piece', 'l', 'kg', 'kit',
+    'lot', ...) or ''. A bare 'l' from the card is only kept when the name
+    holds a volume, since it is usually a width ("l.60 cm").
+    ``quantity``/``quantity_unit`` come from a measure in the name ("2.5L",
+    "1,44 m²", in l, kg, m2 or m3) or else a pack size ("lot de 3", in
+    pieces); ``price_per_unit`` is the price per quantity_unit.
+    ``size_cm`` holds the dimensions of an "AxB[xC] cm" name. Normalized
+    products normalize to themselves, so stored snapshots can be re-run.
+    """
+    names, starts = _column(product.get('name') for product in products)
+    measures = _first_matches(MEASURE_RE, names, starts)
+    sizes = _first_matches(SIZE_RE, names, starts)
+    counts = {}
+    name_units = {}
+    for row, match in _row_matches(PACK_RE, names, starts):
+        if match.group(1) in NAME_UNITS:
+            name_units.setdefault(row, match.group(1))
+        if match.group(2):
+            counts.setdefault(row, float(match.group(2)))
+
+    for row, product in enumerate(products):
+        quantity = quantity_unit = None
+        measure = measures.get(row)
+        if measure:
+            quantity_unit, factor = MEASURES[measure.group(2)]
+            quantity = round(_number(measure.group(1)) * factor, 6)
+        elif row in counts:
+            quantity, quantity_unit = counts[row], 'piece'
+
+        size = sizes.get(row)
+        size_cm = None
+        if size:
+            scale = LENGTHS[size.group(4)]
+            size_cm = [round(_number(value) * scale, 3)
+                       for value in size.group(1, 2, 3) if value is not None]
+
+        unit = CANONICAL_UNITS.get((product.get('unit') or '').strip().lower(), '')
+        if unit == 'l' and quantity_unit != 'l':
+            unit = ''
+        if not unit:
+            unit = name_units.get(row, '')
+
+        price = product.get('price')
+        price_per_unit = None
+        if quantity and isinstance(price, (int, float)):
+            price_per_unit = round(price / quantity, 2)
+
+        product['unit'] = unit
+        product['quantity'] = quantity
+        product['quantity_unit'] = quantity_unit
+        product['price_per_unit'] = price_per_unit
+        product['size_cm'] = size_cm
+
+    return products
+
+
+def normalize_ndjson(path: str, output: Optional[str] = None, batch_size: int = 10000,
+                     prepare: Optional[Callable[[Dict], Any]] = None) -> int:
+    """Normalize an NDJSON file of products batch by batch.
+
+    Writes to output, or replaces path when output is None. prepare is
+    called on each product read before it is normalized. Returns the
+    number of products written.
+    """
+    target = output or path
+    temp = f"{target}.tmp.gz" if target.endswith('.gz') else f"{target}.tmp"
+    batch = []
+    with NDJSONSink(temp, append=False, fsync_every=batch_size) as sink:
+        for product in read_ndjson(path):
+            if prepare:
+                prepare(product)
+            batch.append(product)
+            if len(batch) >= batch_size:
+                for normalized in normalize_products(batch):
+                    sink.write(normalized)
+                batch = []
+        for normalized in normalize_products(batch):
+            sink.write(normalized)
+    os.replace(temp, target)
+    logger.info("Normalized %d products into %s", sink.count, target)
+    return sink.count
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Normalize units, quantities and price per unit of an NDJSON product file")
+    parser.add_argument('path', help="NDJSON file, e.g. products.ndjson")
+    parser.add_argument('output', nargs='?', help="output file (default: rewrite path)")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level='INFO', format="%(levelname)s %(name)s: %(message)s")
+    normalize_ndjson(args.path, args.output)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
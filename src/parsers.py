@@ -0,0 +1,245 @@
+"""
+Pluggable HTML parsing backends for search pages
+"""
+import html
+import math
+import re
+from collections import Counter
+from typing import Iterable, List, Optional, Tuple
+import lxml.html
+from .extraction import ProductExtractionPlan, LxmlExtractionPlan, lxml_strings
+from .config import anti_bot_indicators
+
+# Product container selectors, tried in order until one matches
+PRODUCT_SELECTORS = [
+    {'tag': 'div', 'attrs': {'data-testid': 'product'}},
+    {'tag': 'article', 'attrs': {
+        'class': re.compile(r'product', re.I)}},
+    {'tag': 'div', 'attrs': {'class': re.compile(
+        r'product.*card|item.*product', re.I)}},
+    {'tag': 'div', 'attrs': {'class': re.compile(
+        r'tile.*product|product.*tile', re.I)}},
+    {'tag': 'li', 'attrs': {
+        'class': re.compile(r'product', re.I)}},
+]
+
+REGEXP_NS = {'re': 'http://exslt.org/regular-expressions'}
+CHARSET_RE = re.compile(rb'<meta[^>]+charset=["\']?([\w-]+)', re.I)
+
+
+def sniff_encoding(content: bytes) -> str:
+    """Pick the encoding of an HTML document the way BeautifulSoup would:
+    declared charset if it decodes, else UTF-8, else Windows-1252"""
+    candidates = []
+    declared = CHARSET_RE.search(content[:4096])
+    if declared:
+        candidates.append(declared.group(1).decode('ascii').lower())
+    candidates.append('utf-8')
+
+    for encoding in candidates:
+        try:
+            content.decode(encoding)
+            return encoding
+        except (UnicodeDecodeError, LookupError):
+            continue
+    return 'windows-1252'
+
+
+def is_anti_bot_title(title_text: str) -> bool:
+    """True for Cloudflare, captcha or bot detection page titles"""
+    title_text = title_text.lower()
+    return any(indicator in title_text for indicator in anti_bot_indicators)
+
+
+def looks_garbled(page_text: str) -> bool:
+    """True when the start of a page's text is mojibake or nearly empty"""
+    page_text = page_text[:500]
+    return any(char in page_text for char in ['Ž', 'äo', 'MûÓ']) or len(page_text.strip()) < 100
+
+
+TITLE_RE = re.compile(rb'<title[^>]*>(.*?)</title', re.I | re.S)
+# Magic numbers of gzip and zstd bodies that were never decompressed
+COMPRESSED_MAGIC = (b'\x1f\x8b', b'\x28\xb5\x2f\xfd')
+# How much of a body the byte checks look at
+SNIFF_BYTES = 64 * 1024
+SAMPLE_BYTES = 2048
+# Markup and text sit well below this; compressed or encrypted bytes near 8
+MAX_ENTROPY = 7.0
+# Share of control bytes (other than whitespace) that marks a binary body
+MAX_CONTROL_SHARE = 0.05
+CONTROL_BYTES = bytes(sorted(set(range(0x20)) - set(b'\t\n\r\x0c') | {0x7f}))
+
+
+def sniff_title(content: bytes) -> str:
+    """The <title> of a raw HTML document, found without parsing it"""
+    match = TITLE_RE.search(content[:SNIFF_BYTES])
+    if not match:
+        return ""
+    declared = CHARSET_RE.search(content[:4096])
+    encoding = declared.group(1).decode('ascii') if declared else 'utf-8'
+    try:
+        title = match.group(1).decode(encoding, 'replace')
+    except LookupError:
+        title = match.group(1).decode('utf-8', 'replace')
+    return html.unescape(title).strip()
+
+
+def byte_entropy(sample: bytes) -> float:
+    """Shannon entropy of sample in bits per byte"""
+    total = len(sample)
+    return -sum(count / total * math.log2(count / total)
+                for count in Counter(sample).values())
+
+
+def preclassify(content: bytes) -> str:
+    """Classify a raw response body before any tree is built.
+
+    Returns 'empty' for a blank body, 'garbled' for compressed or binary
+    bytes, 'anti-bot' when the title is a bot detection one and 'ok'
+    otherwise. Only the start of the body is looked at, so 'ok' is not a
+    guarantee: callers still check the parsed page.
+    """
+    head = content[:SAMPLE_BYTES]
+    if not head.strip():
+        return 'empty'
+    if head.startswith(COMPRESSED_MAGIC):
+        return 'garbled'
+    control = len(head) - len(head.translate(None, CONTROL_BYTES))
+    if control > len(head) * MAX_CONTROL_SHARE:
+        return 'garbled'
+    if len(head) >= 256 and byte_entropy(head) > MAX_ENTROPY:
+        return 'garbled'
+    if is_anti_bot_title(sniff_title(content)):
+        return 'anti-bot'
+    return 'ok'
+
+
+def text_prefix(strings: Iterable[str], limit: int) -> str:
+    """Join strings until limit characters are reached"""
+    parts = []
+    length = 0
+    for string in strings:
+        parts.append(string)
+        length += len(string)
+        if length >= limit:
+            break
+    return ''.join(parts)[:limit]
+
+
+def _selector_xpath(selector: dict) -> str:
+    """Translate one PRODUCT_SELECTORS entry to an XPath expression"""
+    conditions = []
+    for key, value in selector['attrs'].items():
+        if isinstance(value, re.Pattern):
+            # BeautifulSoup matches class regexes against the
+            # whitespace-normalised class list
+            conditions.append(
+                f"re:test(normalize-space(@{key}), '{value.pattern}', 'i')")
+        else:
+            conditions.append(f"@{key}='{value}'")
+    return f"//{selector['tag']}[{' and '.join(conditions)}]"
+
+
+class BeautifulSoupBackend:
+    """Parse pages with BeautifulSoup (the default backend)"""
+    name = 'bs4'
+
+    def __init__(self, base_url: str, features: str = 'lxml'):
+        self.features = features
+        self.plan = ProductExtractionPlan(base_url)
+
+    def parse(self, content):
+        from bs4 import BeautifulSoup
+        return BeautifulSoup(content, self.features)
+
+    def title(self, doc) -> str:
+        title = doc.find('title')
+        return title.text if title else ""
+
+    def text(self, doc, limit: Optional[int] = None) -> str:
+        if limit is not None:
+            return text_prefix(doc.strings, limit)
+        return doc.get_text()
+
+    def find_product_containers(self, doc) -> Tuple[list, dict]:
+        """Return the cards of the first matching selector and the selector"""
+        for selector in PRODUCT_SELECTORS:
+            containers = doc.find_all(selector['tag'], selector['attrs'])
+            if containers:
+                return containers, selector
+        return [], None
+
+    def find_by_testid(self, doc, testid: str) -> list:
+        return doc.find_all(attrs={"data-testid": testid})
+
+    def div_classes(self, doc, limit: int = 10) -> List[str]:
+        return [' '.join(div.get('class', []))
+                for div in doc.find_all('div', class_=True)[:limit]]
+
+    def extract(self, container, category_name: str):
+        return self.plan.extract(container, category_name)
+
+
+class LxmlBackend:
+    """Parse pages with lxml.html and locate cards with XPath"""
+    name = 'lxml'
+
+    def __init__(self, base_url: str):
+        self.plan = LxmlExtractionPlan(base_url)
+        self._html_parsers = {}
+        self._selectors = [
+            (selector, lxml.html.etree.XPath(
+                _selector_xpath(selector), namespaces=REGEXP_NS))
+            for selector in PRODUCT_SELECTORS
+        ]
+
+    def parse(self, content):
+        if isinstance(content, bytes):
+            encoding = sniff_encoding(content)
+            if encoding not in self._html_parsers:
+                self._html_parsers[encoding] = lxml.html.HTMLParser(
+                    encoding=encoding)
+            return lxml.html.document_fromstring(
+                content, parser=self._html_parsers[encoding])
+        return lxml.html.document_fromstring(content)
+
+    def title(self, doc) -> str:
+        titles = doc.xpath('//title')
+        return ''.join(lxml_strings(titles[0])) if titles else ""
+
+    def text(self, doc, limit: Optional[int] = None) -> str:
+        if limit is not None:
+            return text_prefix(lxml_strings(doc), limit)
+        return ''.join(lxml_strings(doc))
+
+    def find_product_containers(self, doc) -> Tuple[list, dict]:
+        """Return the cards of the first matching selector and the selector"""
+        for selector, xpath in self._selectors:
+            containers = xpath(doc)
+            if containers:
+                return containers, selector
+        return [], None
+
+    def find_by_testid(self, doc, testid: str) -> list:
+        return doc.xpath('//*[@data-testid=$testid]', testid=testid)
+
+    def div_classes(self, doc, limit: int = 10) -> List[str]:
+        return [' '.join(div.get('class').split())
+                for div in doc.xpath('//div[@class]')[:limit]]
+
+    def extract(self, container, category_name: str):
+        return self.plan.extract(container, category_name)
+
+
+PARSERS = {
+    BeautifulSoupBackend.name: BeautifulSoupBackend,
+    LxmlBackend.name: LxmlBackend,
+}
+
+
+def get_parser(name: str, base_url: str, **kwargs):
+    """Build the parsing backend registered under name"""
+    if name not in PARSERS:
+        raise ValueError(
+            f"Unknown parser '{name}', expected one of {sorted(PARSERS)}")
+    return PARSERS[name](base_url, **kwargs)
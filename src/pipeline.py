@@ -0,0 +1,281 @@
+"""
+Decoupled fetch/parse pipeline: fetcher threads feed raw pages to a
+process pool that parses and extracts them
+"""
+import logging
+import queue
+import threading
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Callable, Dict, List, Optional, Tuple
+from .parsers import get_parser, is_anti_bot_title, looks_garbled, preclassify
+from .structured_data import find_structured_products
+
+logger = logging.getLogger(__name__)
+
+# Parser backends built once per worker process
+_worker_parsers = {}
+
+
+def parse_page(content: bytes, category: str, base_url: str,
+               parser_spec: Tuple[str, Dict],
+               structured: bool = False) -> Tuple[str, List[Dict]]:
+    """Parse one search page in a worker process.
+
+    Returns a status ('ok', 'structured', 'empty', 'anti-bot', 'garbled',
+    'error') and the extracted products. 'structured' is an 'ok' page
+    read from its embedded product JSON, without building a tree.
+    """
+    name, options = parser_spec
+    key = (name, base_url, tuple(sorted(options.items())))
+    if key not in _worker_parsers:
+        _worker_parsers[key] = get_parser(name, base_url, **options)
+    parser = _worker_parsers[key]
+
+    try:
+        page = find_structured_products(content) if structured else None
+        if page is not None:
+            products = [parser.plan.build_product(raw, category) for raw in page.products]
+            return 'structured', [product for product in products if product]
+
+        doc = parser.parse(content)
+        if is_anti_bot_title(parser.title(doc)):
+            return 'anti-bot', []
+        if looks_garbled(parser.text(doc, limit=500)):
+            return 'garbled', []
+
+        containers, _ = parser.find_product_containers(doc)
+        if not containers:
+            return 'empty', []
+
+        products = []
+        for container in containers:
+            try:
+                product = parser.extract(container, category)
+            except Exception as e:
+                logger.warning("Error extracting product data: %s", e)
+                continue
+            if product:
+                products.append(product)
+        return 'ok', products
+    except Exception as e:
+        logger.warning("Error parsing HTML: %s", e)
+        return 'error', []
+
+
+class _CategoryState:
+    def __init__(self):
+        self.next_page = 1
+        self.next_emit = 1
+        self.results = {}
+        self.products = []
+        self.count = 0
+        self.done = False
+
+
+class ScrapePipeline:
+    """Run fetching and parsing as separate, overlapping stages.
+
+    Fetcher threads download pages through ``scraper.fetch_page_bytes``
+    and push the raw bytes onto a bounded queue. The main thread hands
+    them to a ProcessPoolExecutor, never keeping more than
+    ``max_in_flight`` parses pending, so a slow parse stage stalls the
+    fetchers instead of growing memory. Each category keeps
+    ``page_window`` pages in flight and stops at its first empty or failed
+    page, like the sequential path.
+
+    With ``ordered=True`` products reach the sink in the same order as
+    scrape_all_categories would return them; with ``ordered=False`` they
+    are emitted as soon as their page is parsed.
+    """
+
+    def __init__(self, scraper, parse_workers: Optional[int] = None, fetch_workers: int = 4,
+                 queue_size: int = 8, max_in_flight: Optional[int] = None,
+                 page_window: int = 2, max_pages: int = 10, ordered: bool = True,
+                 retries: int = 3):
+        self.scraper = scraper
+        self.parse_workers = parse_workers
+        self.fetch_workers = fetch_workers
+        self.queue_size = queue_size
+        self.max_in_flight = max_in_flight or queue_size
+        self.page_window = page_window
+        self.max_pages = max_pages
+        self.ordered = ordered
+        self.retries = retries
+
+    def _fetch_loop(self):
+        while True:
+            task = self._tasks.get()
+            if task is None:
+                return
+
+            category, page, attempt = task
+            content = None
+            if not self._states[category].done:
+                url = self._page_url(category, page)
+                logger.info("Fetching %s page %d: %s", category, page, url)
+                content = self.scraper.fetch_page_bytes(url)
+
+            # Blocks while the parse stage is behind
+            self._raw.put((category, page, attempt, content))
+
+    def _page_url(self, category: str, page: int) -> str:
+        return f"{self.scraper.base_url}/search?term={category}&page={page}"
+
+    def _schedule(self, category: str):
+        state = self._states[category]
+        while (not state.done and state.next_page <= self.max_pages
+               and state.next_page < state.next_emit + self.page_window):
+            self._tasks.put((category, state.next_page, 0))
+            state.next_page += 1
+            self._outstanding += 1
+
+    def _emit(self, category: str, products: List[Dict]):
+        state = self._states[category]
+        products = products[:self._max_products - state.count]
+        state.count += len(products)
+        if self.ordered:
+            state.products.extend(products)
+        else:
+            for product in products:
+                self._sink(product)
+        if state.count >= self._max_products:
+            state.done = True
+
+    def _flush_ordered(self):
+        """Emit finished categories in category order"""
+        while self._emit_index < len(self._categories):
+            state = self._states[self._categories[self._emit_index]]
+            if not state.done:
+                break
+            for product in state.products:
+                self._sink(product)
+            state.products = []
+            self._emit_index += 1
+
+    def _handle(self, category: str, page: int, attempt: int, status: str, products: List[Dict]):
+        self._outstanding -= 1
+        state = self._states[category]
+
+        if status in ('anti-bot', 'garbled') and not state.done and attempt < self.retries - 1:
+            logger.info("%s page for %s page %d, retrying", status, category, page)
+            self.scraper.metrics.retry(status, category)
+            if status == 'anti-bot':
+                # The rate limiter holds the retry back, like get_page_content
+                self.scraper._record(self._page_url(category, page), 'blocked')
+            self._tasks.put((category, page, attempt + 1))
+            self._outstanding += 1
+            return
+
+        if status != 'skipped':
+            logger.info("Parsed %s page %d: %s, %d products", category, page, status, len(products))
+        if status == 'structured':
+            self.scraper.metrics.count('structured_pages', 1, category)
+            status = 'ok'
+        if status == 'ok':
+            self.scraper.metrics.count('pages', 1, category)
+            self.scraper.metrics.count('products', len(products), category)
+        state.results[page] = products if status == 'ok' else None
+
+        if not self.ordered and products and not state.done:
+            self._emit(category, products)
+
+        # Walk the pages that are now contiguous from the last one handled
+        while state.next_emit in state.results:
+            page_products = state.results.pop(state.next_emit)
+            state.next_emit += 1
+            if state.done:
+                continue
+            if not page_products:
+                state.done = True
+                continue
+            if self.ordered:
+                self._emit(category, page_products)
+
+        if state.next_emit > self.max_pages:
+            state.done = True
+        self._schedule(category)
+
+        if self.ordered:
+            self._flush_ordered()
+
+    def run(self, categories: List[str], max_products: int = 100,
+            sink: Optional[Callable[[Dict], None]] = None) -> List[Dict]:
+        """Scrape categories through the pipeline.
+
+        Products go to sink as they are released; without a sink they are
+        collected and returned.
+        """
+        collected = []
+        self._sink = sink or collected.append
+        self._categories = list(categories)
+        self._max_products = max_products
+        self._states = {category: _CategoryState() for category in self._categories}
+        self._emit_index = 0
+        self._outstanding = 0
+
+        self._tasks = queue.Queue()
+        self._raw = queue.Queue(maxsize=self.queue_size)
+
+        if not hasattr(self.scraper, '_homepage_visited'):
+            self.scraper._get_homepage_first()
+            self.scraper._homepage_visited = True
+
+        fetchers = [threading.Thread(target=self._fetch_loop, daemon=True)
+                    for _ in range(self.fetch_workers)]
+        for fetcher in fetchers:
+            fetcher.start()
+
+        for category in self._categories:
+            self._schedule(category)
+
+        parser_spec = self.scraper.parser_spec
+        futures = {}
+        try:
+            with ProcessPoolExecutor(max_workers=self.parse_workers) as pool:
+                while self._outstanding:
+                    # Feed the pool, blocking only when nothing else can progress
+                    while len(futures) < self.max_in_flight:
+                        try:
+                            item = self._raw.get(block=not futures)
+                        except queue.Empty:
+                            break
+                        category, page, attempt, content = item
+                        if content is None:
+                            status = 'skipped' if self._states[category].done else 'failed'
+                            self._handle(category, page, attempt, status, [])
+                            if not self._outstanding:
+                                break
+                            continue
+                        with self.scraper.metrics.timer('classify', category):
+                            verdict = preclassify(content)
+                        if verdict != 'ok':
+                            # Block pages and undecoded bodies never reach a
+                            # worker; a blank body is retried, not taken as
+                            # the end of the category
+                            self._handle(category, page, attempt,
+                                         'garbled' if verdict == 'empty' else verdict, [])
+                            if not self._outstanding:
+                                break
+                            continue
+                        future = pool.submit(parse_page, content, category,
+                                             self.scraper.base_url, parser_spec,
+                                             self.scraper.structured_data)
+                        futures[future] = (category, page, attempt)
+
+                    if futures:
+                        done, _ = wait(futures, timeout=0.05,
+                                       return_when=FIRST_COMPLETED)
+                        for future in done:
+                            category, page, attempt = futures.pop(future)
+                            status, products = future.result()
+                            self._handle(category, page, attempt, status, products)
+        finally:
+            for _ in fetchers:
+                self._tasks.put(None)
+
+        if self.ordered:
+            for state in self._states.values():
+                state.done = True
+            self._flush_ordered()
+
+        return collected
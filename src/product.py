@@ -0,0 +1,188 @@
+"""
+Compact product record and fast JSON encoding of products
+"""
+import json
+import math
+from collections.abc import Mapping, MutableMapping
+from operator import attrgetter
+from typing import Any, Dict, Iterator, Optional
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Fields of every extracted product, in output order
+PRODUCT_FIELDS = ('name', 'category', 'price', 'currency', 'product_url',
+                  'brand', 'unit', 'image_url')
+_FIELDS = frozenset(PRODUCT_FIELDS)
+
+
+class Product(MutableMapping):
+    """A product stored in slots instead of a per-record dict.
+
+    Behaves as a mutable mapping with the keys of the product dicts it
+    replaces, so ``product['price']``, ``.get``, ``.setdefault`` and
+    comparison with a dict keep working. Keys outside PRODUCT_FIELDS
+    (e.g. the dedup ``categories`` list) go to a dict that is only
+    created when one is set.
+    """
+
+    __slots__ = PRODUCT_FIELDS + ('_extra',)
+
+    def __init__(self, name: str, category: str, price: float, currency: str = "EUR",
+                 product_url: str = "", brand: str = "", unit: str = "",
+                 image_url: str = "", **extra):
+        self.name = name
+        self.category = category
+        self.price = price
+        self.currency = currency
+        self.product_url = product_url
+        self.brand = brand
+        self.unit = unit
+        self.image_url = image_url
+        self._extra = extra or None
+
+    @classmethod
+    def from_dict(cls, data: Mapping) -> 'Product':
+        return cls(**data)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return dict(self.items())
+
+    def __getitem__(self, key: str):
+        if key in _FIELDS:
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+        if self._extra is None:
+            raise KeyError(key)
+        return self._extra[key]
+
+    def __setitem__(self, key: str, value):
+        if key in _FIELDS:
+            setattr(self, key, value)
+        elif self._extra is None:
+            self._extra = {key: value}
+        else:
+            self._extra[key] = value
+
+    def __delitem__(self, key: str):
+        if key in _FIELDS:
+            try:
+                delattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+        elif self._extra is None:
+            raise KeyError(key)
+        else:
+            del self._extra[key]
+
+    def __iter__(self) -> Iterator[str]:
+        for key in PRODUCT_FIELDS:
+            if hasattr(self, key):
+                yield key
+        if self._extra:
+            yield from self._extra
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def __contains__(self, key) -> bool:
+        if key in _FIELDS:
+            return hasattr(self, key)
+        return self._extra is not None and key in self._extra
+
+    def __repr__(self) -> str:
+        return f"Product({self.to_dict()!r})"
+
+
+def _default(obj):
+    if isinstance(obj, Mapping):
+        return dict(obj.items())
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+# Built once: json.dumps with options constructs a new encoder per call
+_COMPACT = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'), default=_default)
+_INDENTED = json.JSONEncoder(ensure_ascii=False, indent=2, default=_default)
+_encode_string = json.encoder.encode_basestring
+_get_fields = attrgetter(*PRODUCT_FIELDS)
+
+
+def _scalar(value) -> str:
+    if type(value) is str:
+        return _encode_string(value)
+    if type(value) is float and math.isfinite(value):
+        return float.__repr__(value)
+    return _COMPACT.encode(value)
+
+
+def _encode_product(product: Product, indented: bool) -> Optional[str]:
+    """Encode a Product field by field, exactly as json encodes its dict;
+    None when a field was deleted"""
+    try:
+        name, category, price, currency, product_url, brand, unit, image_url = \
+            _get_fields(product)
+    except AttributeError:
+        return None
+
+    if indented:
+        encoded = (
+            f'{{\n  "name": {_scalar(name)},\n  "category": {_scalar(category)},'
+            f'\n  "price": {_scalar(price)},\n  "currency": {_scalar(currency)},'
+            f'\n  "product_url": {_scalar(product_url)},\n  "brand": {_scalar(brand)},'
+            f'\n  "unit": {_scalar(unit)},\n  "image_url": {_scalar(image_url)}')
+    else:
+        encoded = (
+            f'{{"name":{_scalar(name)},"category":{_scalar(category)},'
+            f'"price":{_scalar(price)},"currency":{_scalar(currency)},'
+            f'"product_url":{_scalar(product_url)},"brand":{_scalar(brand)},'
+            f'"unit":{_scalar(unit)},"image_url":{_scalar(image_url)}')
+    if not product._extra:
+        return encoded + ('\n}' if indented else '}')
+
+    parts = [encoded]
+    for key, value in product._extra.items():
+        if not indented:
+            parts.append(f',{_encode_string(key)}:{_COMPACT.encode(value)}')
+            continue
+        if isinstance(value, (Mapping, list, tuple)) and value:
+            value = _INDENTED.encode(value).replace('\n', '\n  ')
+        else:
+            value = _COMPACT.encode(value)
+        parts.append(f',\n  {_encode_string(key)}: {value}')
+    parts.append('\n}' if indented else '}')
+    return ''.join(parts)
+
+
+def loads(data):
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(obj) -> str:
+    """Compact JSON of products (or lists/dicts of them), non-ASCII kept"""
+    if orjson is not None:
+        return orjson.dumps(obj, default=_default).decode('utf-8')
+    return _COMPACT.encode(obj)
+
+
+def dumps_line(product: Mapping) -> bytes:
+    """One NDJSON line, UTF-8 encoded"""
+    if orjson is not None:
+        return orjson.dumps(product, default=_default, option=orjson.OPT_APPEND_NEWLINE)
+    encoded = _encode_product(product, False) if type(product) is Product else None
+    if encoded is None:
+        encoded = _COMPACT.encode(product)
+    return (encoded + '\n').encode('utf-8')
+
+
+def dumps_indented(record: Mapping) -> str:
+    """A record as json.dumps(record, ensure_ascii=False, indent=2) writes it"""
+    encoded = _encode_product(record, True) if type(record) is Product else None
+    if encoded is None:
+        encoded = _INDENTED.encode(record)
+    return encoded
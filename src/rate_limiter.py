@@ -0,0 +1,152 @@
+"""
+Adaptive per-host rate limiting: token buckets tuned by AIMD
+"""
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from typing import Dict, Iterator, Optional
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP date)"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+class _HostState:
+    def __init__(self, rate: float, burst: float, now: float):
+        self.rate = rate
+        self.tokens = burst
+        self.updated = now
+        self.paused_until = 0.0
+        self.latency = None
+        self.baseline_latency = None
+
+
+class AdaptiveRateLimiter:
+    """Shared request pacing for every scraper talking to the same hosts.
+
+    Each host gets a token bucket refilled at ``rate`` requests/second.
+    Successful responses raise the rate additively; 429s, 403s, anti-bot
+    pages and errors cut it multiplicatively and pause the host, for the
+    Retry-After duration when the server gives one. Responses much slower
+    than the fastest seen so far also ease the rate down a little.
+    """
+
+    # Time source for buckets and pauses; shared limiters need wall clock
+    clock = staticmethod(time.monotonic)
+
+    def __init__(self, initial_rate: float = 0.3, min_rate: float = 0.02,
+                 max_rate: float = 2.0, increase: float = 0.02,
+                 decrease: float = 0.5, burst: float = 1.0, jitter: float = 0.2,
+                 slow_factor: float = 3.0):
+        self.initial_rate = initial_rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.burst = burst
+        # Random +/- fraction added to every wait so requests don't tick
+        self.jitter = jitter
+        self.slow_factor = slow_factor
+
+        self._hosts = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def host_of(url: str) -> str:
+        return urlparse(url).netloc or url
+
+    def _state(self, host: str) -> _HostState:
+        if host not in self._hosts:
+            self._hosts[host] = _HostState(self.initial_rate, self.burst, self.clock())
+        return self._hosts[host]
+
+    @contextmanager
+    def _host(self, host: str) -> Iterator[_HostState]:
+        """Hold a host's state for reading and updating"""
+        with self._lock:
+            yield self._state(host)
+
+    def acquire(self, url: str) -> float:
+        """Block until a request to url's host is allowed; return time waited"""
+        host = self.host_of(url)
+        waited = 0.0
+        while True:
+            with self._host(host) as state:
+                now = self.clock()
+                state.tokens = min(self.burst,
+                                   state.tokens + (now - state.updated) * state.rate)
+                state.updated = now
+
+                if now < state.paused_until:
+                    wait = state.paused_until - now
+                elif state.tokens >= 1:
+                    state.tokens -= 1
+                    return waited
+                else:
+                    wait = (1 - state.tokens) / state.rate
+
+            wait *= 1 + random.uniform(-self.jitter, self.jitter)
+            time.sleep(wait)
+            waited += wait
+
+    def record(self, url: str, outcome: str, latency: Optional[float] = None,
+               retry_after: Optional[float] = None):
+        """Feed back the result of a request.
+
+        outcome is 'ok', 'throttled' (429), 'blocked' (403 / anti-bot page)
+        or 'error' (network failure).
+        """
+        host = self.host_of(url)
+        with self._host(host) as state:
+            if outcome == 'ok':
+                state.rate = min(self.max_rate, state.rate + self.increase)
+                if latency is not None:
+                    state.latency = latency if state.latency is None else (
+                        0.8 * state.latency + 0.2 * latency)
+                    if state.baseline_latency is None or state.latency < state.baseline_latency:
+                        state.baseline_latency = state.latency
+                    elif state.latency > self.slow_factor * state.baseline_latency:
+                        # Server is struggling; back off gently
+                        state.rate = max(self.min_rate, state.rate * 0.9)
+                return
+
+            state.rate = max(self.min_rate, state.rate * self.decrease)
+            pause = retry_after if retry_after is not None else 1 / state.rate
+            state.paused_until = max(state.paused_until, self.clock() + pause)
+            state.tokens = 0
+
+        logger.info("Rate limiter: %s from %s, rate now %.3f req/s, pausing %.1fs",
+                    outcome, host, self.rate(url), pause)
+
+    def rate(self, url: str) -> float:
+        """Current allowed requests/second for url's host"""
+        with self._host(self.host_of(url)) as state:
+            return state.rate
+
+    def snapshot(self) -> Dict[str, Dict]:
+        """Current rate and latency estimate of every host seen so far"""
+        with self._lock:
+            return {
+                host: {
+                    'rate': state.rate,
+                    'latency': state.latency,
+                    'paused_for': max(0.0, state.paused_until - self.clock()),
+                }
+                for host, state in self._hosts.items()
+            }
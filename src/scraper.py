@@ -1,19 +1,44 @@
 import requests
-from bs4 import BeautifulSoup
-import json
+from requests.adapters import HTTPAdapter
+import logging
 import time
-import re
 import random
-from urllib.parse import urljoin, urlparse
-from typing import List, Dict, Optional
-from .config import categories
+import sys
+import zlib
+from typing import Any, Callable, Iterator, List, Dict, Optional
+from . import config
+from .extraction import parse_price
+from .parsers import get_parser, is_anti_bot_title, looks_garbled, preclassify, sniff_title
+from .http_cache import ResponseCache, CacheMissError
+from .incremental import IncrementalTracker
+from .checkpoint import CrawlFrontier
+from .dedup import DedupIndex
+from .rate_limiter import AdaptiveRateLimiter, parse_retry_after
+from .metrics import ScrapeMetrics, category_of
+from .streaming import StreamingProductParser, AntiBotPageError, charset_from_content_type
+from .sinks import write_json
+from .structured_data import StructuredPage, find_structured_products
+from .transport import (ACCEPT_ENCODING, decompress_body, stream_decompressor,
+                        undecodable_coding, wire_bytes)
+
+logger = logging.getLogger(__name__)
 
 
 class CastoramaScraper:
-    def __init__(self):
-        self.base_url = "https://www.castorama.fr"
+    def __init__(self, base_url: str = "https://www.castorama.fr", pool_size: int = 10,
+                 parser: str = 'bs4', cache: Optional[ResponseCache] = None,
+                 rate_limiter: Optional[AdaptiveRateLimiter] = None,
+                 metrics: Optional[ScrapeMetrics] = None, structured_data: bool = True,
+                 **parser_options):
+        self.base_url = base_url
         self.session = requests.Session()
 
+        # Keep-alive connection pool shared by concurrent fetches
+        adapter = HTTPAdapter(pool_connections=pool_size,
+                              pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
         # Rotate User Agents
         self.user_agents = [
             'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
@@ -25,9 +50,27 @@ class CastoramaScraper:
 
         self._setup_session()
 
-        # Add delays between requests
-        self.min_delay = 2
-        self.max_delay = 5
+        # Optional on-disk response cache used by get_page_content
+        self.cache = cache
+
+        # HTML parsing backend ('bs4' or 'lxml')
+        self.parser = get_parser(parser, self.base_url, **parser_options)
+        # Picklable description of the backend for worker processes
+        self.parser_spec = (parser, parser_options)
+
+        # Paces every request instead of fixed sleeps; share one instance
+        # between scrapers that hit the same site
+        self.rate_limiter = rate_limiter or AdaptiveRateLimiter()
+
+        # Per-stage timings and counters, per category and for the run
+        self.metrics = metrics or ScrapeMetrics()
+
+        # Read search pages from their embedded product JSON when they have it
+        self.structured_data = structured_data
+
+        # Retry cause ('403', '429', 'garbled', ...) of the last page get
+        # that came back empty-handed, for sequential callers
+        self.last_failure = None
 
     def _setup_session(self):
         """Setup session with realistic headers"""
@@ -36,7 +79,8 @@ class CastoramaScraper:
             'User-Agent': user_agent,
             'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.7',
             'Accept-Language': 'fr-FR,fr;q=0.9,en-US;q=0.8,en;q=0.7',
-            'Accept-Encoding': 'gzip, deflate, br',
+            # Only codings urllib3 can decode here, so bodies never come back encoded
+            'Accept-Encoding': ACCEPT_ENCODING,
             'DNT': '1',
             'Connection': 'keep-alive',
             'Upgrade-Insecure-Requests': '1',
@@ -49,203 +93,558 @@ class CastoramaScraper:
             'Cache-Control': 'max-age=0'
         })
 
-    def _random_delay(self):
-        """Add random delay to mimic human behavior"""
-        delay = random.uniform(self.min_delay, self.max_delay)
-        time.sleep(delay)
+    @property
+    def _offline(self) -> bool:
+        """True when replaying a recorded crawl, so no pacing is needed"""
+        return bool(self.cache and self.cache.offline)
+
+    def _record(self, url: str, outcome: str, response: Optional[requests.Response] = None,
+                retry_after: Optional[float] = None):
+        """Report a request outcome to the rate limiter"""
+        if self._offline or getattr(response, 'from_cache', False):
+            return
+        latency = response.elapsed.total_seconds() if response is not None else None
+        self.rate_limiter.record(url, outcome, latency=latency,
+                                 retry_after=retry_after)
+
+    def _http_get(self, url: str, **kwargs) -> requests.Response:
+        """GET through the response cache when one is configured"""
+        if self.cache:
+            return self.cache.get(self.session, url, **kwargs)
+        return self.session.get(url, **kwargs)
+
+    def _discard_cached(self, url: str):
+        if self.cache:
+            self.cache.discard(self.session, url)
 
     def _get_homepage_first(self):
         """Visit homepage first to establish session like a real user"""
         try:
-            print("Visiting homepage first...")
-            response = self.session.get(self.base_url, timeout=15)
+            logger.info("Visiting homepage first...")
+            if not self._offline:
+                self.metrics.observe('wait', self.rate_limiter.acquire(self.base_url))
+            response = self._http_get(self.base_url, timeout=15)
             if response.status_code == 200:
-                print("Homepage visit successful")
-                self._random_delay()
+                logger.info("Homepage visit successful")
                 return True
         except Exception as e:
-            print(f"Homepage visit failed: {e}")
+            logger.warning("Homepage visit failed: %s", e)
         return False
 
-    def get_page_content(self, url: str, retries: int = 3) -> Optional[BeautifulSoup]:
+    def _request(self, url: str, attempt: int, **kwargs) -> requests.Response:
+        """Send one attempt of a page request"""
+        # Rotate user agent occasionally
+        if attempt > 0:
+            self._setup_session()
+            logger.info("Retry %d with new user agent", attempt + 1)
+
+        # Add referer for subsequent requests
+        if 'search' in url:
+            self.session.headers.update({'Referer': self.base_url})
+
+        category = category_of(url)
+        if not self._offline:
+            self.metrics.observe('wait', self.rate_limiter.acquire(url), category)
+
+        self.metrics.count('requests', category=category)
+        if kwargs.get('stream'):
+            return self.session.get(url, timeout=20, **kwargs)
+        with self.metrics.timer('fetch', category):
+            response = self._http_get(url, timeout=20, **kwargs)
+        self._count_transfer(response, len(response.content), category)
+        return response
+
+    def _count_transfer(self, response: requests.Response, decoded: int,
+                        category: Optional[str]):
+        """Count a body's decoded bytes and, when it came off the network,
+        the bytes it took on the wire"""
+        self.metrics.count('bytes', decoded, category)
+        wire = wire_bytes(response)
+        if wire is not None:
+            self.metrics.count('wire_bytes', wire, category)
+            logger.debug("%d bytes from %d on the wire (%s): %s", decoded, wire,
+                         response.headers.get('Content-Encoding', 'identity'), response.url)
+
+    def _undecodable(self, url: str, response: requests.Response) -> bool:
+        """True, after logging it, when the body was left in a coding that
+        can't be decoded here; retrying would get the same bytes back"""
+        coding = undecodable_coding(response)
+        if coding is None:
+            return False
+        logger.error("Body is %s-encoded, which can't be decoded here: %s", coding, url)
+        self._retry('content-encoding', category_of(url))
+        self._discard_cached(url)
+        return True
+
+    def _body(self, url: str, response: requests.Response) -> bytes:
+        """The response body, decompressed when it is gzip or zlib bytes
+        served without (or beyond) its Content-Encoding"""
+        decompressed = decompress_body(response.content)
+        if decompressed is None:
+            return response.content
+        logger.warning("Body was compressed beyond its Content-Encoding: %s", url)
+        self.metrics.count('decompressed_pages', category=category_of(url))
+        return decompressed
+
+    def _check_response(self, url: str, response: requests.Response,
+                        attempt: int, retries: int) -> str:
+        """Apply the 403/429/HTTP error/content-type rules to a response.
+
+        Returns 'ok', 'retry' or 'fail'. Back-off before a retry comes
+        from the rate limiter. HTTP errors are raised as
+        requests.HTTPError like before.
+        """
+        # Check for common anti-bot responses
+        if response.status_code == 403:
+            logger.warning("403 Forbidden - likely blocked. Attempt %d", attempt + 1)
+            self._retry('403', category_of(url))
+            self._record(url, 'blocked', response)
+            if attempt < retries - 1:
+                return 'retry'
+            return 'fail'
+
+        if response.status_code == 429:
+            logger.warning("429 Rate Limited. Waiting before retry...")
+            self._retry('429', category_of(url))
+            self._record(url, 'throttled', response,
+                         parse_retry_after(response.headers.get('Retry-After')))
+            return 'retry'
+
+        if response.status_code >= 500:
+            self._record(url, 'error', response)
+        response.raise_for_status()
+        self._record(url, 'ok', response)
+
+        # Check if response is actually HTML
+        content_type = response.headers.get('content-type', '').lower()
+        if 'html' not in content_type:
+            logger.warning("Expected HTML but got %s", content_type)
+            self._retry('content-type', category_of(url))
+            if attempt < retries - 1:
+                return 'retry'
+            return 'fail'
+
+        return 'ok'
+
+    def _retry(self, cause: str, category: Optional[str]):
+        self.last_failure = cause
+        self.metrics.retry(cause, category)
+
+    def _record_error(self, url: str, error: Exception, attempt: int):
+        logger.warning("Request error on attempt %d: %s", attempt + 1, error)
+        self._retry('error', category_of(url))
+        self._record(url, 'error')
+
+    def fetch_page_bytes(self, url: str, retries: int = 3) -> Optional[bytes]:
+        """Fetch a page body with the HTTP-level retry rules, without parsing.
+
+        A body compressed without its Content-Encoding comes back
+        decompressed; anti-bot and garbled page detection is left to the
+        caller.
+        """
         for attempt in range(retries):
             try:
-                # Rotate user agent occasionally
-                if attempt > 0:
-                    self._setup_session()
-                    print(f"Retry {attempt + 1} with new user agent")
+                response = self._request(url, attempt)
+                verdict = self._check_response(url, response, attempt, retries)
+                if verdict == 'retry':
+                    continue
+                if verdict == 'fail' or self._undecodable(url, response):
+                    return None
+                return self._body(url, response)
 
-                # Add referer for subsequent requests
-                if 'search' in url:
-                    self.session.headers.update({'Referer': self.base_url})
+            except CacheMissError as e:
+                logger.warning("%s", e)
+                return None
 
-                response = self.session.get(url, timeout=20)
+            except requests.RequestException as e:
+                self._record_error(url, e, attempt)
 
-                # Check for common anti-bot responses
-                if response.status_code == 403:
-                    print(
-                        f"403 Forbidden - likely blocked. Attempt {attempt + 1}")
-                    if attempt < retries - 1:
-                        time.sleep(random.uniform(10, 20))  # Longer wait
-                        continue
-                    return None
+        logger.error("Failed to get content after %d attempts", retries)
+        return None
 
-                if response.status_code == 429:
-                    print(f"429 Rate Limited. Waiting before retry...")
-                    time.sleep(random.uniform(30, 60))
-                    continue
+    def get_page_content(self, url: str, retries: int = 3) -> Optional[Any]:
+        """Fetch and parse a page, None when it can't be had"""
+        return self._get_page(url, retries, structured=False)
 
-                response.raise_for_status()
+    def get_search_page(self, url: str, retries: int = 3) -> Optional[Any]:
+        """Fetch a search page for extract_page_products.
 
-                # Debug: Print response info
-                print(f"Response status: {response.status_code}")
-                print(
-                    f"Content-Type: {response.headers.get('content-type', 'Unknown')}")
-                print(f"Response size: {len(response.content)} bytes")
+        When structured_data is on and the page embeds a complete product
+        list as JSON, that list is returned as a StructuredPage and no
+        tree is built; otherwise this is get_page_content.
+        """
+        return self._get_page(url, retries, structured=self.structured_data)
 
-                # Check if response is actually HTML
-                content_type = response.headers.get('content-type', '').lower()
-                if 'html' not in content_type:
-                    print(f"Warning: Expected HTML but got {content_type}")
-                    if attempt < retries - 1:
-                        self._random_delay()
-                        continue
+    def _get_page(self, url: str, retries: int, structured: bool) -> Optional[Any]:
+        category = category_of(url)
+        self.last_failure = None
+        for attempt in range(retries):
+            try:
+                response = self._request(url, attempt)
+                verdict = self._check_response(url, response, attempt, retries)
+                if verdict == 'retry':
+                    continue
+                if verdict == 'fail':
                     return None
 
-                # Try to detect encoding issues or anti-bot pages
+                logger.debug("Response status: %s, Content-Type: %s, size: %d bytes",
+                             response.status_code,
+                             response.headers.get('content-type', 'Unknown'),
+                             len(response.content))
+
+                # Compressed bytes are a transport problem, not a garbled
+                # page: garbled-page retries would get them back again
+                if self._undecodable(url, response):
+                    return None
+
+                # Block pages and undecoded bodies are recognised from the
+                # raw bytes, so only pages worth it get a full parse
+                content = self._body(url, response)
+                with self.metrics.timer('classify', category):
+                    verdict = preclassify(content)
+
+                if verdict == 'ok' and structured:
+                    start = time.perf_counter()
+                    page = find_structured_products(content)
+                    elapsed = time.perf_counter() - start
+                    self.metrics.observe('structured', elapsed, category)
+                    if page is not None:
+                        logger.info("Read %d products from %s JSON in %.1fms: %s",
+                                    len(page), page.source, elapsed * 1000, url)
+                        return page
+                    logger.debug("No complete product JSON (%.1fms), parsing %s",
+                                 elapsed * 1000, url)
+
                 try:
-                    soup = BeautifulSoup(response.content, 'html')
-
-                    # Check for common anti-bot indicators
-                    title = soup.find('title')
-                    title_text = title.text.lower() if title else ""
-
-                    # Check for Cloudflare, captcha, or bot detection pages
-                    anti_bot_indicators = [
-                        'checking your browser',
-                        'cloudflare',
-                        'captcha',
-                        'bot detection',
-                        'access denied',
-                        'blocked',
-                        'security check'
-                    ]
-
-                    if any(indicator in title_text for indicator in anti_bot_indicators):
-                        print(f"Anti-bot page detected: {title_text}")
+                    if verdict == 'ok':
+                        with self.metrics.timer('parse', category):
+                            soup = self.parser.parse(content)
+
+                        # The byte checks only see the start of the page
+                        with self.metrics.timer('decode', category):
+                            title_text = self.parser.title(soup).lower()
+                            if is_anti_bot_title(title_text):
+                                verdict = 'anti-bot'
+                            elif looks_garbled(self.parser.text(soup, limit=500)):
+                                verdict = 'garbled'
+
+                    if verdict == 'anti-bot':
+                        logger.warning("Anti-bot page detected: %s", sniff_title(content))
+                        self._retry('anti-bot', category)
+                        self._discard_cached(url)
+                        self._record(url, 'blocked', response)
+                        if attempt < retries - 1:
+                            logger.info("Waiting longer before retry...")
+                            continue
+                        return None
+
+                    if verdict == 'empty':
+                        logger.warning("Empty response body")
+                        self._retry('empty', category)
+                        self._discard_cached(url)
                         if attempt < retries - 1:
-                            print("Waiting longer before retry...")
-                            time.sleep(random.uniform(20, 40))
                             continue
                         return None
 
                     # Check for garbled content
-                    page_text = soup.get_text()[:500]
-                    if any(char in page_text for char in ['Ž', 'äo', 'MûÓ']) or len(page_text.strip()) < 100:
-                        print("Detected garbled content")
+                    if verdict == 'garbled':
+                        logger.warning("Detected garbled content")
+                        self._retry('garbled', category)
+                        self._discard_cached(url)
                         if attempt < retries - 1:
-                            self._random_delay()
                             continue
 
                         # Try different decoding as last resort
                         for encoding in ['utf-8', 'iso-8859-1', 'cp1252']:
                             try:
-                                decoded = response.content.decode(encoding)
+                                decoded = content.decode(encoding)
                                 if 'html' in decoded.lower()[:200] and len(decoded.strip()) > 100:
-                                    print(
-                                        f"Successfully decoded with {encoding}")
-                                    return BeautifulSoup(decoded, 'lxml')
+                                    logger.info("Successfully decoded with %s", encoding)
+                                    return self.parser.parse(decoded)
                             except UnicodeDecodeError:
                                 continue
 
-                        print("Could not properly decode response")
+                        logger.error("Could not properly decode response")
                         return None
 
-                    print(f"Page title: {title_text}")
+                    logger.debug("Page title: %s", title_text)
                     return soup
 
                 except Exception as e:
-                    print(f"Error parsing HTML: {e}")
+                    logger.warning("Error parsing HTML: %s", e)
+                    self._retry('parse-error', category)
                     if attempt < retries - 1:
-                        self._random_delay()
                         continue
                     return None
 
+            except CacheMissError as e:
+                logger.warning("%s", e)
+                self.last_failure = 'cache-miss'
+                return None
+
             except requests.RequestException as e:
-                print(f"Request error on attempt {attempt + 1}: {e}")
-                if attempt < retries - 1:
-                    wait_time = random.uniform(5, 15) * (attempt + 1)
-                    print(f"Waiting {wait_time:.1f} seconds before retry...")
-                    time.sleep(wait_time)
-                    continue
+                self._record_error(url, e, attempt)
 
-        print(f"Failed to get content after {retries} attempts")
+        logger.error("Failed to get content after %d attempts", retries)
         return None
 
     def extract_price(self, price_text: str) -> Optional[float]:
-        if not price_text:
-            return None
-        price_match = re.search(r'(\d+[,.]?\d*)', price_text.replace(' ', ''))
-        if price_match:
-            return float(price_match.group(1).replace(',', '.'))
-        return None
-
-    def scrape_product_list(self, category: str, max_products: int = 30) -> List[Dict]:
+        return parse_price(price_text)
+
+    def scrape_product_list(self, category: str, max_products: int = 30,
+                            stop_condition: Optional[Callable[[List[Dict]], bool]] = None,
+                            sink: Optional[Callable[[Dict], None]] = None,
+                            frontier: Optional[CrawlFrontier] = None,
+                            dedup: Optional[DedupIndex] = None,
+                            max_pages: int = 10) -> List[Dict]:
+        """Scrape search result pages of a category.
+
+        stop_condition is called with each page's products and ends the
+        pagination early when it returns True. Why pagination ended is left
+        in self.last_stop_reason: 'exhausted', 'limit', 'stopped' or 'failed'.
+        With a sink, products are passed to it page by page instead of
+        being collected, and an empty list is returned. With a frontier,
+        every page is checkpointed and pages done by an earlier run are
+        replayed from it instead of fetched. With a dedup index, products
+        already seen in this run are dropped (and counted neither towards
+        max_products nor as output), and a page with too few new products
+        ends the pagination as 'stopped'. At most max_pages pages are
+        visited.
+        """
         products = []
+        emit = sink or products.append
+        count = 0
         page = 1
+        self.last_stop_reason = 'limit'
+
+        if frontier:
+            replayed = []
+            progress = frontier.replay(category, replayed.append)
+            count = len(self._emit_new(category, replayed, emit, dedup))
+            page = progress.next_page
+            if progress.stop_reason:
+                self.last_stop_reason = progress.stop_reason
+                return products
 
         # Visit homepage first to establish session
         if not hasattr(self, '_homepage_visited'):
             self._get_homepage_first()
             self._homepage_visited = True
 
-        while len(products) < max_products:
+        while count < max_products and page <= max_pages:
             url = f"{self.base_url}/search?term={category}&page={page}"
 
-            print(f"Scraping {category} page {page}: {url}")
+            logger.info("Scraping %s page %d: %s", category, page, url)
 
-            soup = self.get_page_content(url)
-            if not soup:
-                print(f"Failed to get content for {category} page {page}")
+            if frontier:
+                frontier.begin_page(category, page)
+            soup = self.get_search_page(url)
+            if soup is None:
+                logger.error("Failed to get content for %s page %d", category, page)
+                self.last_stop_reason = 'failed'
+                if frontier:
+                    frontier.release_page(category, page)
                 break
 
-            # Debug: Print just the title and check for products
-            title = soup.find('title')
-            print(f"Page title: {title.text if title else 'No title'}")
-
-            # Look for various product container patterns
-            product_selectors = [
-                {'tag': 'div', 'attrs': {'data-testid': 'product'}},
-                {'tag': 'article', 'attrs': {
-                    'class': re.compile(r'product', re.I)}},
-                {'tag': 'div', 'attrs': {'class': re.compile(
-                    r'product.*card|item.*product', re.I)}},
-                {'tag': 'div', 'attrs': {'class': re.compile(
-                    r'tile.*product|product.*tile', re.I)}},
-                {'tag': 'li', 'attrs': {
-                    'class': re.compile(r'product', re.I)}},
-            ]
-
-            product_containers = []
-            for selector in product_selectors:
-                containers = soup.find_all(selector['tag'], selector['attrs'])
-                if containers:
-                    print(
-                        f"Found {len(containers)} products using selector: {selector}")
-                    product_containers = containers
-                    break
+            page_products = self.extract_page_products(
+                soup, category, max_products - count, page)
+            if frontier:
+                frontier.complete_page(category, page, page_products or [])
+            if page_products is None:
+                self.last_stop_reason = 'exhausted'
+                break
+
+            new_products = self._emit_new(category, page_products, emit, dedup)
+            count += len(new_products)
+            logger.info("Extracted %d products from page %d", len(page_products), page)
+
+            if not page_products:
+                self.last_stop_reason = 'exhausted'
+                break
 
-            if not product_containers:
-                print(f"No products found on page {page} for {category}")
-                # Print some debug info about page structure
-                print("Available div classes (first 10):")
-                divs = soup.find_all('div', class_=True)[:10]
-                for div in divs:
-                    classes = div.get('class', [])
-                    print(f"  {' '.join(classes)}")
+            if stop_condition and stop_condition(page_products):
+                logger.info("Stop condition met on page %d for %s", page, category)
+                self.last_stop_reason = 'stopped'
                 break
 
+            if dedup and dedup.low_yield(len(new_products), len(page_products)):
+                logger.info("Only %d new products on page %d for %s, stopping",
+                            len(new_products), page, category)
+                self.last_stop_reason = 'stopped'
+                break
+
+            page += 1
+
+        if frontier and self.last_stop_reason != 'failed':
+            frontier.finish_category(category, self.last_stop_reason)
+        return products
+
+    @staticmethod
+    def _emit_new(category: str, page_products: List[Dict], emit: Callable[[Dict], None],
+                  dedup: Optional[DedupIndex] = None) -> List[Dict]:
+        """Pass the products not seen before in this run to emit"""
+        new_products = dedup.filter_page(category, page_products) if dedup else page_products
+        for product in new_products:
+            emit(product)
+        return new_products
+
+    def stream_page_products(self, url: str, category: str, retries: int = 3,
+                             chunk_size: int = 16 * 1024, page: int = 1) -> Iterator[Dict]:
+        """Yield the products of a search page while it is downloading.
+
+        The response is read in chunks and fed to an incremental lxml
+        parser, so each card comes out as soon as its closing tag arrives.
+        That parser only knows the data-testid cards; a page without any
+        is kept until it has arrived and goes through the buffered
+        extraction instead. A page is only retried if nothing was yielded
+        from it yet.
+        """
+        for attempt in range(retries):
+            try:
+                response = self._request(url, attempt, stream=True)
+            except requests.RequestException as e:
+                self._record_error(url, e, attempt)
+                continue
+
+            with response:
+                try:
+                    verdict = self._check_response(url, response, attempt, retries)
+                except requests.RequestException as e:
+                    self._record_error(url, e, attempt)
+                    continue
+                if verdict == 'retry':
+                    continue
+                if verdict == 'fail' or self._undecodable(url, response):
+                    return
+
+                parser = StreamingProductParser(
+                    self.base_url, category,
+                    charset_from_content_type(response.headers.get('content-type', '')))
+                decoded = 0
+                decompressor = None
+                sniffed = False
+                # The body so far, until the first card shows the layout
+                pending = []
+                try:
+                    for chunk in response.iter_content(chunk_size):
+                        if not sniffed and chunk:
+                            sniffed = True
+                            # Compressed without (or beyond) its Content-Encoding
+                            decompressor = stream_decompressor(chunk)
+                            if decompressor is not None:
+                                logger.warning("Body was compressed beyond its "
+                                               "Content-Encoding: %s", url)
+                                self.metrics.count('decompressed_pages', category=category)
+                        if decompressor is not None:
+                            chunk = decompressor.decompress(chunk)
+                        decoded += len(chunk)
+                        if pending is not None:
+                            pending.append(chunk)
+                        yield from parser.feed(chunk)
+                        if parser.cards_seen:
+                            pending = None
+                    if decompressor is not None:
+                        chunk = decompressor.flush()
+                        decoded += len(chunk)
+                        if pending is not None:
+                            pending.append(chunk)
+                        yield from parser.feed(chunk)
+                    yield from parser.close()
+                    self._count_transfer(response, decoded, category)
+                    if not parser.cards_seen:
+                        logger.warning("No product cards streamed from %s, "
+                                       "extracting the whole page", url)
+                        yield from self._buffered_page_products(
+                            b''.join(pending), category, page)
+                except AntiBotPageError as e:
+                    logger.warning("Anti-bot page detected: %s", e)
+                    self._retry('anti-bot', category)
+                    self._record(url, 'blocked', response)
+                    if attempt < retries - 1 and parser.cards_seen == 0:
+                        logger.info("Waiting longer before retry...")
+                        continue
+                except zlib.error as e:
+                    logger.error("Could not decompress the body after %d cards: %s",
+                                 parser.cards_seen, e)
+                    self._retry('content-encoding', category)
+                except requests.RequestException as e:
+                    # Products already yielded can't be taken back
+                    logger.warning("Stream interrupted after %d cards: %s", parser.cards_seen, e)
+                return
+
+        logger.error("Failed to get content after %d attempts", retries)
+
+    def _buffered_page_products(self, content: bytes, category: str,
+                                page: int) -> List[Dict]:
+        """Products of a page read in full, from its embedded JSON or the
+        parser's extraction plan; none for a page that isn't one"""
+        if preclassify(content) != 'ok':
+            return []
+        soup = find_structured_products(content) if self.structured_data else None
+        if soup is None:
+            with self.metrics.timer('parse', category):
+                soup = self.parser.parse(content)
+        return self.extract_page_products(soup, category, sys.maxsize, page) or []
+
+    def iter_product_list(self, category: str, max_products: int = 30,
+                          max_pages: int = 10) -> Iterator[Dict]:
+        """Streaming counterpart of scrape_product_list"""
+        count = 0
+        page = 1
+
+        if not hasattr(self, '_homepage_visited'):
+            self._get_homepage_first()
+            self._homepage_visited = True
+
+        while count < max_products and page <= max_pages:
+            url = f"{self.base_url}/search?term={category}&page={page}"
+            logger.info("Streaming %s page %d: %s", category, page, url)
+
             page_products = 0
+            for product in self.stream_page_products(url, category, page=page):
+                yield product
+                count += 1
+                page_products += 1
+                if count >= max_products:
+                    return
+
+            logger.info("Extracted %d products from page %d", page_products, page)
+            if page_products == 0:
+                break
+
+            page += 1
+
+    def find_product_containers(self, soup, category: Optional[str] = None) -> list:
+        """Return product cards using the first selector that matches"""
+        with self.metrics.timer('select', category):
+            containers, selector = self.parser.find_product_containers(soup)
+        if containers:
+            logger.debug("Found %d products using selector: %s", len(containers), selector)
+        return containers
+
+    def extract_page_products(self, soup, category: str,
+                              max_products: int, page: int = 1) -> Optional[List[Dict]]:
+        """Extract up to max_products from a parsed search page or a
+        StructuredPage.
+
+        Returns None when the page has no product containers at all.
+        """
+        if isinstance(soup, StructuredPage):
+            return self._structured_page_products(soup, category, max_products)
+
+        product_containers = self.find_product_containers(soup, category)
+
+        if not product_containers:
+            logger.info("No products found on page %d for %s", page, category)
+            if logger.isEnabledFor(logging.DEBUG):
+                # Page structure, to help fix the selectors
+                logger.debug("Page title: %s", self.parser.title(soup) or 'No title')
+                logger.debug("Available div classes (first 10): %s",
+                             self.parser.div_classes(soup, 10))
+            return None
+
+        products = []
+        with self.metrics.timer('extract', category):
             for container in product_containers:
                 if len(products) >= max_products:
                     break
@@ -253,164 +652,131 @@ class CastoramaScraper:
                 product = self.extract_product_data(container, category)
                 if product:
                     products.append(product)
-                    page_products += 1
 
-            print(f"Extracted {page_products} products from page {page}")
-
-            if page_products == 0:
-                break
-
-            page += 1
-            self._random_delay()  # Random delay between pages
+        self.metrics.count('pages', category=category)
+        self.metrics.count('products', len(products), category)
+        return products
 
-            if page > 10:  # Safety limit
-                break
+    def _structured_page_products(self, page: StructuredPage, category: str,
+                                  max_products: int) -> List[Dict]:
+        products = []
+        with self.metrics.timer('extract', category):
+            for raw in page.products:
+                if len(products) >= max_products:
+                    break
+                product = self.parser.plan.build_product(raw, category)
+                if product:
+                    products.append(product)
 
+        self.metrics.count('pages', category=category)
+        self.metrics.count('structured_pages', category=category)
+        self.metrics.count('products', len(products), category)
         return products
 
     def extract_product_data(self, container, category_name: str) -> Optional[Dict]:
         try:
-            # Look for product name with data-testid first
-            name_elem = container.find('p', {'data-testid': 'product-name'})
-            if not name_elem:
-                # Fallback to other methods
-                name_elem = container.find(
-                    ['h3', 'h2', 'h4', 'span', 'a'], class_=re.compile(r'title|name|product', re.I))
-            if not name_elem:
-                name_elem = container.find('a')
-
-            if not name_elem or not name_elem.get_text(strip=True):
-                return None
-
-            # Clean up the name by removing nested font tags
-            name = name_elem.get_text(strip=True)
-
-            # Look for price with data-testid first
-            price_elem = container.find(
-                'span', {'data-testid': 'product-price'})
-            if not price_elem:
-                # Look in primary-price container
-                primary_price = container.find(
-                    'span', {'data-testid': 'primary-price'})
-                if primary_price:
-                    price_elem = primary_price.find(
-                        'span', {'data-testid': 'product-price'})
-
-            if not price_elem:
-                # Fallback to class-based search
-                price_elem = container.find(
-                    ['span', 'div'], class_=re.compile(r'price', re.I))
-            if not price_elem:
-                price_elem = container.find(text=re.compile(r'€'))
-                if price_elem:
-                    price_elem = price_elem.parent
-
-            price_text = price_elem.get_text(strip=True) if price_elem else ""
-            price = self.extract_price(price_text)
-
-            if not price:
-                return None
-
-            # Look for product URL
-            url_elem = container.find('a', {'data-testid': 'product-link'})
-            if not url_elem:
-                url_elem = name_elem if name_elem and name_elem.name == 'a' else container.find(
-                    'a')
-
-            product_url = ""
-            if url_elem and url_elem.get('href'):
-                product_url = urljoin(self.base_url, url_elem['href'])
-
-            # Look for brand/seller info - this might not be in the basic product card
-            brand_elem = container.find('p', {'data-testid': 'seller-info'})
-            if not brand_elem:
-                brand_elem = container.find(
-                    ['span', 'div', 'p'], class_=re.compile(r'brand|marque|seller', re.I))
-            brand = brand_elem.get_text(strip=True) if brand_elem else ""
-
-            # Look for image
-            img_elem = container.find('img', {'data-testid': 'product-image'})
-            if not img_elem:
-                img_elem = container.find('img')
-
-            image_url = ""
-            if img_elem:
-                if img_elem.get('src'):
-                    image_url = urljoin(self.base_url, img_elem['src'])
-                elif img_elem.get('data-src'):
-                    image_url = urljoin(self.base_url, img_elem['data-src'])
-                # Also check srcset for higher quality images
-                elif img_elem.get('srcset'):
-                    srcset = img_elem.get('srcset')
-                    # Extract the first URL from srcset
-                    first_url = srcset.split(',')[0].split(' ')[0]
-                    if first_url:
-                        image_url = urljoin(self.base_url, first_url)
-
-            # Look for unit information in the product text
-            unit_elem = container.find(text=re.compile(
-                r'(m²|m2|pièce|unité|l|kg|kit|lot)', re.I))
-            unit = ""
-            if unit_elem:
-                unit_match = re.search(
-                    r'(m²|m2|pièce|unité|l|kg|kit|lot)', unit_elem, re.I)
-                if unit_match:
-                    unit = unit_match.group(1)
-
-            # If no unit found, try to extract from product name
-            if not unit:
-                unit_match = re.search(r'(kit|lot|pack|set)', name.lower())
-                if unit_match:
-                    unit = unit_match.group(1)
-
-            return {
-                "name": name,
-                "category": category_name,
-                "price": price,
-                "currency": "EUR",
-                "product_url": product_url,
-                "brand": brand,
-                "unit": unit,
-                "image_url": image_url
-            }
-
+            return self.parser.extract(container, category_name)
         except Exception as e:
-            print(f"Error extracting product data: {e}")
+            logger.warning("Error extracting product data: %s", e)
             return None
 
-    def scrape_all_categories(self) -> List[Dict]:
+    def scrape_all_categories(self, concurrency: int = 1, parse_workers: int = 0,
+                              sink: Optional[Callable[[Dict], None]] = None,
+                              frontier: Optional[CrawlFrontier] = None,
+                              dedup: Optional[DedupIndex] = None,
+                              categories: Optional[List[str]] = None,
+                              max_products: int = 100, max_pages: int = 10) -> List[Dict]:
+        """Scrape every category.
+
+        Products go to sink (e.g. NDJSONSink.write) as they are extracted;
+        without a sink they are collected and returned. A frontier
+        checkpoints the crawl so an interrupted run can be resumed, and a
+        dedup index keeps one record per product across categories; both
+        are only supported on the sequential path. categories defaults to
+        config.categories; each is scraped up to max_products products over
+        at most max_pages pages.
+        """
         all_products = []
-        products_per_category = 100
+        categories = categories or config.categories
+
+        if (frontier or dedup) and (parse_workers > 0 or concurrency > 1):
+            raise ValueError(
+                "Checkpointing and dedup need concurrency=1 and parse_workers=0")
+
+        if parse_workers > 0:
+            from .pipeline import ScrapePipeline
+            pipeline = ScrapePipeline(self, parse_workers=parse_workers,
+                                      fetch_workers=max(concurrency, 1), max_pages=max_pages)
+            return pipeline.run(categories, max_products, sink=sink)
+
+        if concurrency > 1:
+            return self._scrape_all_categories_async(
+                categories, max_products, concurrency, sink, max_pages)
 
         for category in categories:
-            print(f"\nScraping category: {category}")
+            logger.info("Scraping category: %s", category)
             products = self.scrape_product_list(
-                category, products_per_category)
+                category, max_products, sink=sink, frontier=frontier,
+                dedup=dedup, max_pages=max_pages)
             all_products.extend(products)
-            print(f"Found {len(products)} products in {category}")
+            if not sink:
+                logger.info("Found %d products in %s", len(products), category)
+
+        return all_products
 
-            # Longer delay between categories to avoid being blocked
-            # Don't sleep after last category
-            if category != categories[-1]:
-                delay = random.uniform(10, 20)
-                print(
-                    f"Sleeping for {delay:.1f} seconds before next category...")
-                time.sleep(delay)
+    def _scrape_all_categories_async(self, categories: List[str], products_per_category: int,
+                                     concurrency: int,
+                                     sink: Optional[Callable[[Dict], None]] = None,
+                                     max_pages: int = 10) -> List[Dict]:
+        """Scrape every category through the asyncio fetch engine"""
+        from .async_fetcher import AsyncFetchEngine
+        if not hasattr(self, '_homepage_visited'):
+            self._get_homepage_first()
+            self._homepage_visited = True
 
+        engine = AsyncFetchEngine(self, max_concurrency=concurrency, max_pages=max_pages)
+        results = engine.run(categories, products_per_category, sink=sink)
+
+        all_products = []
+        for category, products in results.items():
+            if not sink:
+                logger.info("Found %d products in %s", len(products), category)
+            all_products.extend(products)
         return all_products
 
+    def scrape_incremental(self, state_file: str = "products_state.json",
+                           delta_file: str = "products_delta.json") -> Dict:
+        """Scrape all categories but only emit what changed since last run.
+
+        Pagination of a category stops at the first page whose products
+        are all unchanged.
+        """
+        tracker = IncrementalTracker(state_file)
+        products_per_category = 100
+
+        for category in config.categories:
+            logger.info("Scraping category: %s", category)
+            products = self.scrape_product_list(
+                category, products_per_category,
+                stop_condition=lambda page_products: tracker.page_unchanged(category, page_products))
+            tracker.observe(category, products,
+                            complete=self.last_stop_reason == 'exhausted')
+            logger.info("Found %d products in %s", len(products), category)
+
+        return tracker.save(delta_file)
+
     def scrape_search_terms(self) -> List[Dict]:
         """Scrape using search terms instead of category URLs"""
         all_products = []
-        products_per_term = 100 // len(categories)
+        products_per_term = 100 // len(config.categories)
 
-        for category_name, search_term in categories:
-            print(f"\nSearching for: {category_name} (term: {search_term})")
+        for category_name, search_term in config.categories:
+            logger.info("Searching for: %s (term: %s)", category_name, search_term)
             search_url = f"/search?term={search_term}"
             products = self.scrape_product_list(
                 search_url, category_name, products_per_term)
             all_products.extend(products)
-            print(f"Found {len(products)} products for {category_name}")
+            logger.info("Found %d products for %s", len(products), category_name)
             time.sleep(2)
 
         return all_products
@@ -421,10 +787,4 @@ class CastoramaScraper:
         return self.scrape_product_list(search_url, search_term.capitalize(), max_products)
 
     def save_to_json(self, products: List[Dict], filename: str = "castorama_products.json"):
-        with open(filename, 'w', encoding='utf-8') as f:
-            json.dump({
-                "scrape_timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
-                "total_products": len(products),
-                "products": products
-            }, f, ensure_ascii=False, indent=2)
-        print(f"Saved {len(products)} products to {filename}")
+        write_json(filename, products)
@@ -3,31 +3,73 @@ Alternative scraper using Selenium WebDriver for JavaScript-heavy sites
 """
 import time
 import random
-from typing import List, Dict, Optional
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Dict, Optional
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.chrome.service import Service
-from selenium.common.exceptions import TimeoutException, NoSuchElementException
-from webdriver_manager.chrome import ChromeDriverManager
-import json
-from bs4 import BeautifulSoup
-from . import CastoramaScraper
+from selenium.common.exceptions import TimeoutException, WebDriverException
+from .scraper import CastoramaScraper
+from .metrics import ScrapeMetrics, category_of
+from .driver_pool import DriverPool
+from .checkpoint import CrawlFrontier
+from .dedup import DedupIndex
+from .browser_extraction import extract_in_browser
+from .parsers import is_anti_bot_title
+from .rate_limiter import AdaptiveRateLimiter
 from .config import categories
+from .sinks import write_json
+
+logger = logging.getLogger(__name__)
 
 
 class CastoramaSeleniumScraper:
-    def __init__(self, headless: bool = True):
-        self.base_url = "https://www.castorama.fr"
+    def __init__(self, headless: bool = True, parser: str = 'bs4',
+                 base_url: str = "https://www.castorama.fr", pool_size: int = 1,
+                 extraction: str = 'python',
+                 rate_limiter: Optional[AdaptiveRateLimiter] = None,
+                 render_timeout: float = 10, metrics: Optional[ScrapeMetrics] = None):
+        if extraction not in ('python', 'browser'):
+            raise ValueError(
+                f"Unknown extraction mode '{extraction}', expected 'python' or 'browser'")
+
+        self.base_url = base_url
+        # 'python' parses driver.page_source, 'browser' extracts in the page
+        self.extraction = extraction
         self.headless = headless
         self.driver = None
+        self.pool_size = pool_size
+        self._driver_warmed = False
+        self._cookies = None
+        # Longest wait for product cards to render after a page load
+        self.render_timeout = render_timeout
+        # Shared by every pooled driver and the extractor
+        self.rate_limiter = rate_limiter or AdaptiveRateLimiter()
+
+        # One extractor for every page; parses driver.page_source
+        if parser == 'bs4':
+            self.extractor = CastoramaScraper(
+                base_url, parser='bs4', rate_limiter=self.rate_limiter,
+                metrics=metrics, features='html.parser')
+        else:
+            self.extractor = CastoramaScraper(
+                base_url, parser=parser, rate_limiter=self.rate_limiter, metrics=metrics)
+
+        # Stage timings and counters, shared with the extractor
+        self.metrics = self.extractor.metrics
 
         self.search_terms = categories
 
     def _setup_driver(self):
         """Setup Chrome WebDriver with anti-detection options"""
+        self.driver = self._create_driver()
+        return self.driver is not None
+
+    def _create_driver(self):
+        """Start a Chrome WebDriver with anti-detection options"""
         chrome_options = Options()
 
         if self.headless:
@@ -54,23 +96,66 @@ class CastoramaSeleniumScraper:
             "--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36")
 
         try:
-            self.driver = webdriver.Chrome(options=chrome_options)
+            driver = webdriver.Chrome(options=chrome_options)
 
             # Execute script to remove webdriver property
-            self.driver.execute_script(
+            driver.execute_script(
                 "Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
 
-            print("Chrome WebDriver setup successful")
-            return True
+            logger.info("Chrome WebDriver setup successful")
+            return driver
         except Exception as e:
-            print(f"Failed to setup Chrome WebDriver: {e}")
-            print("Make sure ChromeDriver is installed and in PATH")
-            return False
-
-    def _random_delay(self, min_delay: float = 2, max_delay: float = 5):
-        """Add random delay to mimic human behavior"""
-        delay = random.uniform(min_delay, max_delay)
-        time.sleep(delay)
+            logger.warning("Failed to setup Chrome WebDriver: %s", e)
+            logger.warning("Make sure ChromeDriver is installed and in PATH")
+            return None
+
+    def _warm_up(self, driver):
+        """Visit the homepage with a new driver, sharing the first session's cookies"""
+        logger.info("Visiting homepage...")
+        self._load(driver, self.base_url, wait_for_products=False)
+        if self._cookies is None:
+            self._cookies = driver.get_cookies()
+        else:
+            # Reuse the warmed-up session instead of looking like a new visitor
+            for cookie in self._cookies:
+                try:
+                    driver.add_cookie(cookie)
+                except WebDriverException:
+                    continue
+
+    def _load(self, driver, url: str, wait_for_products: bool = True):
+        """Navigate driver to url, paced and tuned by the rate limiter.
+
+        Waits until product cards are rendered rather than for a fixed
+        time; a page without any (e.g. past the last one) just times out
+        into an empty extraction.
+        """
+        category = category_of(url)
+        self.metrics.observe('wait', self.rate_limiter.acquire(url), category)
+        self.metrics.count('requests', 1, category)
+        start = time.monotonic()
+        try:
+            with self.metrics.timer('fetch', category):
+                driver.get(url)
+        except WebDriverException:
+            self.rate_limiter.record(url, 'error')
+            self.metrics.retry('error', category)
+            raise
+
+        if is_anti_bot_title(driver.title or ''):
+            logger.warning("Anti-bot page detected: %s", driver.title)
+            self.rate_limiter.record(url, 'blocked')
+            self.metrics.retry('anti-bot', category)
+            return
+        self.rate_limiter.record(url, 'ok', latency=time.monotonic() - start)
+
+        if wait_for_products:
+            try:
+                WebDriverWait(driver, self.render_timeout).until(
+                    EC.presence_of_element_located(
+                        (By.CSS_SELECTOR, '[data-testid="product"]')))
+            except TimeoutException:
+                logger.warning("No product cards rendered within %ss", self.render_timeout)
 
     def _human_like_scroll(self):
         """Simulate human-like scrolling"""
@@ -90,108 +175,293 @@ class CastoramaSeleniumScraper:
             total_height = self.driver.execute_script(
                 "return document.body.scrollHeight")
 
-    def scrape_search_page(self, search_term: str, max_pages: int = 3) -> List[Dict]:
-        """Scrape products from search results"""
-        if not self.driver:
-            if not self._setup_driver():
-                return []
+    def scrape_page(self, driver, search_term: str, page: int) -> List[Dict]:
+        """Load one search result page in driver and extract its products"""
+        url = f"{self.base_url}/search?term={search_term}"
+        if page > 1:
+            url = f"{url}&page={page}"
+        logger.info("Scraping %s page %d", search_term, page)
+        self._load(driver, url)
+
+        if self.extraction == 'browser':
+            with self.metrics.timer('extract', search_term):
+                products = extract_in_browser(
+                    driver, self.extractor.parser.plan, search_term)
+            logger.info("Extracted %d products from page %d", len(products), page)
+        else:
+            products = self._extract_page_source(driver, search_term, page)
+        self.metrics.count('pages', 1, search_term)
+        self.metrics.count('products', len(products), search_term)
+        return products
 
-        products = []
+    def load_page(self, search_term: str, page: int) -> Optional[List[Dict]]:
+        """Scrape one search result page with this scraper's driver,
+        starting and warming it up on first use.
 
+        Returns None when the driver can't be started or the page fails
+        to load, and an empty list when it renders no product cards.
+        """
+        if not self.driver and not self._setup_driver():
+            return None
         try:
-            # Visit homepage first
-            print("Visiting homepage...")
-            self.driver.get(self.base_url)
-            self._random_delay(3, 7)
+            if not self._driver_warmed:
+                self._warm_up(self.driver)
+                self._driver_warmed = True
+            return self.scrape_page(self.driver, search_term, page)
+        except (TimeoutException, WebDriverException) as e:
+            logger.warning("Browser failed on %s page %d: %s", search_term, page, e)
+            return None
+
+    def _extract_page_source(self, driver, search_term: str, page: int) -> List[Dict]:
+        parser = self.extractor.parser
+        with self.metrics.timer('parse', search_term):
+            soup = parser.parse(driver.page_source)
+        with self.metrics.timer('select', search_term):
+            product_containers = parser.find_by_testid(soup, "product")
+        logger.info("Found %d products on page %d", len(product_containers), page)
 
-            # Perform search
-            search_url = f"{self.base_url}/search?term={search_term}"
-            print(f"Searching for: {search_term}")
-            self.driver.get(search_url)
-            self._random_delay(3, 5)
+        products = []
+        with self.metrics.timer('extract', search_term):
+            for container in product_containers:
+                product = self.extractor.extract_product_data(
+                    container, search_term)
+                if product:
+                    products.append(product)
+
+        logger.info("Extracted %d products from page %d", len(products), page)
+        return products
 
-            scraper = CastoramaScraper()
+    def check_extraction_parity(self, search_term: str, page: int = 1) -> Dict:
+        """Run both extractors on the same loaded page and compare them"""
+        if not self.driver:
+            if not self._setup_driver():
+                return {}
+
+        url = f"{self.base_url}/search?term={search_term}"
+        if page > 1:
+            url = f"{url}&page={page}"
+        self._load(self.driver, url)
+
+        python_products = self._extract_page_source(
+            self.driver, search_term, page)
+        browser_products = extract_in_browser(
+            self.driver, self.extractor.parser.plan, search_term)
+
+        mismatches = [
+            (index, python_product, browser_product)
+            for index, (python_product, browser_product)
+            in enumerate(zip(python_products, browser_products))
+            if python_product != browser_product
+        ]
+        matches = not mismatches and len(python_products) == len(browser_products)
+        logger.info("Extraction parity for %s page %d: %s (%d python, %d browser)",
+                    search_term, page, 'OK' if matches else 'MISMATCH',
+                    len(python_products), len(browser_products))
+        return {
+            "matches": matches,
+            "python": len(python_products),
+            "browser": len(browser_products),
+            "mismatches": mismatches,
+        }
+
+    def scrape_search_page(self, search_term: str, max_pages: int = 3,
+                           sink: Optional[Callable[[Dict], None]] = None,
+                           frontier: Optional[CrawlFrontier] = None,
+                           dedup: Optional[DedupIndex] = None) -> List[Dict]:
+        """Scrape products from search results.
+
+        With a sink, products are passed to it page by page instead of
+        being collected. With a frontier, pages are checkpointed and those
+        done by an earlier run are replayed instead of loaded. With a
+        dedup index, products seen under an earlier term are dropped and
+        a page of mostly known products ends the pagination.
+        """
+        products = []
+        emit = sink or products.append
+        first_page = 1
+        if frontier:
+            replayed = []
+            progress = frontier.replay(search_term, replayed.append)
+            for product in self._new_products(search_term, replayed, dedup):
+                emit(product)
+            if progress.stop_reason:
+                return products
+            first_page = progress.next_page
 
-            for page in range(1, max_pages + 1):
-                print(f"Scraping page {page}")
+        if not self.driver:
+            if not self._setup_driver():
+                return products
 
-                # Wait for page to load
-                try:
-                    soup = BeautifulSoup(
-                        self.driver.page_source, 'html.parser')
-                    if not soup:
-                        print(
-                            f"Failed to get content for {search_term} page {page}")
-                        break
-
-                    product_containers = soup.find_all(
-                        attrs={"data-testid": "product"})
-
-                    print(
-                        f"Found {len(product_containers)} products on page {page}")
-
-                    # Process each product container
-                    for container in product_containers:
-                        product = scraper.extract_product_data(
-                            container, search_term)
-                        if product:
-                            products.append(product)
-
-                    print(
-                        f"Extracted {len([p for p in products if p])} products from page {page}")
-
-                    # Check if we should continue to next page
-                    if len(product_containers) == 0:
-                        print("No more products found, stopping pagination")
-                        break
-
-                    # Navigate to next page if not the last page
-                    if page < max_pages:
-                        next_page_url = f"{search_url}&page={page + 1}"
-                        print(f"Navigating to page {page + 1}")
-                        self.driver.get(next_page_url)
-                        self._random_delay(3, 5)
+        page = None
+        stop_reason = 'limit'
+        try:
+            if not self._driver_warmed:
+                self._warm_up(self.driver)
+                self._driver_warmed = True
 
+            for page in range(first_page, max_pages + 1):
+                if frontier:
+                    frontier.begin_page(search_term, page)
+                try:
+                    page_products = self.scrape_page(
+                        self.driver, search_term, page)
                 except TimeoutException:
-                    print(f"Page {page} load timeout")
+                    logger.warning("Page %d load timeout", page)
+                    stop_reason = 'failed'
+                    break
+                if frontier:
+                    frontier.complete_page(search_term, page, page_products)
+
+                # Check if we should continue to next page
+                if not page_products:
+                    logger.info("No more products found, stopping pagination")
+                    stop_reason = 'exhausted'
+                    break
+                new_products = self._new_products(search_term, page_products, dedup)
+                for product in new_products:
+                    emit(product)
+                if dedup and dedup.low_yield(len(new_products), len(page_products)):
+                    logger.info("Only %d new products, stopping pagination", len(new_products))
+                    stop_reason = 'stopped'
                     break
 
         except Exception as e:
-            print(f"Error scraping search page: {e}")
+            logger.warning("Error scraping search page: %s", e)
+            stop_reason = 'failed'
 
+        self._checkpoint_category(frontier, search_term, page, stop_reason)
+        return products
+
+    @staticmethod
+    def _new_products(search_term: str, page_products: List[Dict],
+                      dedup: Optional[DedupIndex]) -> List[Dict]:
+        return dedup.filter_page(search_term, page_products) if dedup else page_products
+
+    @staticmethod
+    def _checkpoint_category(frontier: Optional[CrawlFrontier], search_term: str,
+                             page: Optional[int], stop_reason: str):
+        if not frontier:
+            return
+        if stop_reason != 'failed':
+            frontier.finish_category(search_term, stop_reason)
+        elif page is not None:
+            frontier.release_page(search_term, page)
+
+    def _scrape_category_pooled(self, pool: DriverPool, search_term: str, max_pages: int,
+                                sink: Optional[Callable[[Dict], None]] = None,
+                                frontier: Optional[CrawlFrontier] = None,
+                                dedup: Optional[DedupIndex] = None) -> List[Dict]:
+        """Scrape a category page by page, leasing a pooled driver per page"""
+        products = []
+        emit = sink or products.append
+        first_page = 1
+        if frontier:
+            replayed = []
+            progress = frontier.replay(search_term, replayed.append)
+            for product in self._new_products(search_term, replayed, dedup):
+                emit(product)
+            if progress.stop_reason:
+                return products
+            first_page = progress.next_page
+
+        page = None
+        stop_reason = 'limit'
+        for page in range(first_page, max_pages + 1):
+            if frontier:
+                frontier.begin_page(search_term, page)
+            page_products = None
+            # One retry on a fresh driver if the leased one crashes
+            for attempt in range(2):
+                try:
+                    with pool.lease() as driver:
+                        page_products = self.scrape_page(
+                            driver, search_term, page)
+                    break
+                except TimeoutException:
+                    logger.warning("Page %d load timeout", page)
+                    break
+                except WebDriverException as e:
+                    logger.warning("Driver failed on %s page %d: %s", search_term, page, e)
+
+            if page_products is None:
+                stop_reason = 'failed'
+                break
+            if frontier:
+                frontier.complete_page(search_term, page, page_products)
+            if not page_products:
+                stop_reason = 'exhausted'
+                break
+            new_products = self._new_products(search_term, page_products, dedup)
+            for product in new_products:
+                emit(product)
+            if dedup and dedup.low_yield(len(new_products), len(page_products)):
+                stop_reason = 'stopped'
+                break
+
+        self._checkpoint_category(frontier, search_term, page, stop_reason)
         return products
 
-    def scrape_all_categories(self) -> List[Dict]:
-        """Scrape all categories"""
+    def scrape_all_categories(self, max_pages: int = 3,
+                              sink: Optional[Callable[[Dict], None]] = None,
+                              frontier: Optional[CrawlFrontier] = None,
+                              dedup: Optional[DedupIndex] = None,
+                              categories: Optional[List[str]] = None) -> List[Dict]:
+        """Scrape all categories (self.search_terms unless categories is given).
+
+        Products go to sink as they are extracted (it must be thread safe
+        with pool_size > 1); without a sink they are collected and returned.
+        A frontier checkpoints the crawl so an interrupted run can resume,
+        and a dedup index keeps one record per product across categories.
+        """
+        categories = categories or self.search_terms
+        if self.pool_size > 1:
+            return self._scrape_all_categories_pooled(
+                max_pages, sink, frontier, dedup, categories)
+
         all_products = []
 
-        for category in self.search_terms:
-            print(f"\nScraping category: {category}")
-            products = self.scrape_search_page(category, max_pages=3)
+        for category in categories:
+            logger.info("Scraping category: %s", category)
+            products = self.scrape_search_page(
+                category, max_pages=max_pages, sink=sink, frontier=frontier,
+                dedup=dedup)
             all_products.extend(products)
-            print(f"Found {len(products)} products in {category}")
+            if not sink:
+                logger.info("Found %d products in %s", len(products), category)
 
-            # Longer delay between categories
-            if category != self.search_terms[-1]:
-                delay = random.uniform(15, 30)
-                print(f"Waiting {delay:.1f} seconds before next category...")
-                time.sleep(delay)
+        return all_products
 
+    def _scrape_all_categories_pooled(self, max_pages: int,
+                                      sink: Optional[Callable[[Dict], None]] = None,
+                                      frontier: Optional[CrawlFrontier] = None,
+                                      dedup: Optional[DedupIndex] = None,
+                                      categories: Optional[List[str]] = None) -> List[Dict]:
+        """Spread categories over a pool of warm drivers"""
+        categories = categories or self.search_terms
+        pool = DriverPool(self._create_driver, size=self.pool_size,
+                          warm_up=self._warm_up)
+        try:
+            with ThreadPoolExecutor(max_workers=self.pool_size) as executor:
+                results = list(executor.map(
+                    lambda category: self._scrape_category_pooled(
+                        pool, category, max_pages, sink, frontier, dedup),
+                    categories))
+        finally:
+            pool.close()
+
+        all_products = []
+        for category, products in zip(categories, results):
+            if not sink:
+                logger.info("Found %d products in %s", len(products), category)
+            all_products.extend(products)
         return all_products
 
     def save_to_json(self, products: List[Dict], filename: str = "castorama_products_selenium.json"):
         """Save products to JSON file"""
-        with open(filename, 'w', encoding='utf-8') as f:
-            json.dump({
-                "scrape_timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
-                "total_products": len(products),
-                "scraper_type": "selenium",
-                "products": products
-            }, f, ensure_ascii=False, indent=2)
-        print(f"Saved {len(products)} products to {filename}")
+        write_json(filename, products, scraper_type="selenium")
 
     def close(self):
         """Close the WebDriver"""
         if self.driver:
             self.driver.quit()
-            print("WebDriver closed")
+            logger.info("WebDriver closed")
@@ -0,0 +1,199 @@
+"""
+Streaming NDJSON output: products are appended one JSON line at a time
+"""
+import gzip
+import json
+import logging
+import os
+import threading
+import time
+import zlib
+from collections.abc import Mapping
+from typing import Dict, Iterable, Iterator, List, Optional
+from .product import dumps_indented, dumps_line, loads
+
+logger = logging.getLogger(__name__)
+
+
+def _is_gzip(path: str) -> bool:
+    return path.endswith('.gz')
+
+
+def _trim_torn_line(path: str):
+    """Drop a partial last line left by a crash mid-write"""
+    with open(path, 'rb+') as f:
+        size = f.seek(0, os.SEEK_END)
+        if size == 0:
+            return
+        f.seek(size - 1)
+        if f.read(1) == b'\n':
+            return
+
+        # Walk back to the last complete line
+        position = size
+        while position > 0:
+            step = min(64 * 1024, position)
+            position -= step
+            f.seek(position)
+            newline = f.read(step).rfind(b'\n')
+            if newline != -1:
+                f.truncate(position + newline + 1)
+                return
+        f.truncate(0)
+
+
+def read_ndjson(path: str) -> Iterator[Dict]:
+    """Yield the products of an NDJSON file, gzipped or not.
+
+    A torn last line or truncated gzip tail (from a crash) is ignored.
+    """
+    opener = gzip.open if _is_gzip(path) else open
+    with opener(path, 'rb') as f:
+        try:
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break
+                yield loads(line)
+        except (EOFError, zlib.error, gzip.BadGzipFile):
+            return
+
+
+class NDJSONSink:
+    """Append products to an NDJSON file as soon as they are extracted.
+
+    Lines are buffered in memory up to ``buffer_size`` bytes and the file
+    is fsynced every ``fsync_every`` products or ``fsync_interval``
+    seconds, so a crash loses at most that much. An existing file is
+    appended to unless ``append`` is False. A path ending in ``.gz`` is
+    written gzip-compressed, one member per run. ``write`` is thread safe
+    and can be passed as the ``sink`` of the scrape methods.
+    """
+
+    def __init__(self, path: str, append: bool = True, fsync_every: int = 100,
+                 fsync_interval: float = 5.0, buffer_size: int = 64 * 1024,
+                 compresslevel: int = 6):
+        self.path = path
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self.buffer_size = buffer_size
+        self.count = 0
+
+        if append and os.path.exists(path) and not _is_gzip(path):
+            _trim_torn_line(path)
+        self._raw = open(path, 'ab' if append else 'wb')
+        self._file = (gzip.GzipFile(fileobj=self._raw, mode='ab', compresslevel=compresslevel)
+                      if _is_gzip(path) else self._raw)
+
+        self._buffer = []
+        self._buffered = 0
+        self._unsynced = 0
+        self._synced_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def write(self, product: Mapping):
+        data = dumps_line(product)
+        with self._lock:
+            self._buffer.append(data)
+            self._buffered += len(data)
+            self._unsynced += 1
+            self.count += 1
+
+            if (self._unsynced >= self.fsync_every
+                    or time.monotonic() - self._synced_at >= self.fsync_interval):
+                self._flush(sync=True)
+            elif self._buffered >= self.buffer_size:
+                self._flush(sync=False)
+
+    def _flush(self, sync: bool):
+        if self._buffer:
+            self._file.write(b''.join(self._buffer))
+            self._buffer = []
+            self._buffered = 0
+        if not sync:
+            return
+
+        if self._file is not self._raw:
+            # Make everything written so far decodable from the file alone
+            self._file.flush(zlib.Z_SYNC_FLUSH)
+        self._raw.flush()
+        os.fsync(self._raw.fileno())
+        self._unsynced = 0
+        self._synced_at = time.monotonic()
+
+    def flush(self):
+        """Write buffered lines and fsync them"""
+        with self._lock:
+            self._flush(sync=True)
+
+    def close(self):
+        with self._lock:
+            if self._raw.closed:
+                return
+            self._flush(sync=True)
+            if self._file is not self._raw:
+                self._file.close()
+            self._raw.close()
+
+    def finalize(self, filename: str, **fields) -> int:
+        """Close the sink and write the save_to_json envelope to filename.
+
+        Extra fields (e.g. scraper_type) go between total_products and
+        products, like the Selenium scraper's output.
+        """
+        self.close()
+        return write_envelope(self.path, filename, **fields)
+
+
+def _write_document(filename: str, header: Dict, products: Iterable[Mapping]):
+    """Write header fields and products as an indent=2 JSON document,
+    through a temporary file so a crash never leaves half of it"""
+    temp = f"{filename}.tmp"
+    with open(temp, 'w', encoding='utf-8') as f:
+        f.write('{\n')
+        for key, value in header.items():
+            f.write(f'  {json.dumps(key)}: '
+                    f'{json.dumps(value, ensure_ascii=False, indent=2)},\n')
+        empty = True
+        for product in products:
+            f.write(',\n' if not empty else '  "products": [\n')
+            empty = False
+            f.write('    ' + dumps_indented(product).replace('\n', '\n    '))
+        f.write('  "products": []\n}' if empty else '\n  ]\n}')
+    os.replace(temp, filename)
+
+
+def write_json(filename: str, products: List[Mapping], scrape_timestamp: Optional[str] = None,
+               **fields) -> int:
+    """Write products in the {scrape_timestamp, total_products, products}
+    envelope; extra fields go before products. Returns the product count."""
+    _write_document(filename, {
+        "scrape_timestamp": scrape_timestamp or time.strftime("%Y-%m-%d %H:%M:%S"),
+        "total_products": len(products),
+        **fields,
+    }, products)
+    logger.info("Saved %d products to %s", len(products), filename)
+    return len(products)
+
+
+def write_envelope(ndjson_path: str, filename: str, scrape_timestamp: Optional[str] = None,
+                   **fields) -> int:
+    """Convert an NDJSON file into the {scrape_timestamp, total_products,
+    products} JSON document, one product in memory at a time.
+
+    The output is identical to json.dump(..., indent=2) of the same data.
+    Returns the number of products written.
+    """
+    total = sum(1 for _ in read_ndjson(ndjson_path))
+    _write_document(filename, {
+        "scrape_timestamp": scrape_timestamp or time.strftime("%Y-%m-%d %H:%M:%S"),
+        "total_products": total,
+        **fields,
+    }, read_ndjson(ndjson_path))
+    logger.info("Saved %d products to %s", total, filename)
+    return total
@@ -0,0 +1,164 @@
+"""
+SQLite product store: current state plus append-only price history
+"""
+import logging
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+from .incremental import product_key
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS products (
+    product_id  TEXT PRIMARY KEY,
+    name        TEXT NOT NULL,
+    category    TEXT,
+    price       REAL,
+    currency    TEXT,
+    product_url TEXT,
+    brand       TEXT,
+    unit        TEXT,
+    image_url   TEXT,
+    first_seen  TEXT NOT NULL,
+    last_seen   TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_products_category_price ON products (category, price);
+CREATE INDEX IF NOT EXISTS idx_products_brand ON products (brand);
+CREATE INDEX IF NOT EXISTS idx_products_price ON products (price);
+
+CREATE TABLE IF NOT EXISTS price_history (
+    product_id  TEXT NOT NULL,
+    observed_at TEXT NOT NULL,
+    price       REAL,
+    currency    TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_price_history_product ON price_history (product_id, observed_at);
+"""
+
+# A history row is only added when the price differs from the stored one
+INSERT_HISTORY = """
+INSERT INTO price_history (product_id, observed_at, price, currency)
+SELECT :product_id, :observed_at, :price, :currency
+WHERE NOT EXISTS (
+    SELECT 1 FROM products WHERE product_id = :product_id AND price IS :price
+)
+"""
+
+UPSERT_PRODUCT = """
+INSERT INTO products (product_id, name, category, price, currency, product_url,
+                      brand, unit, image_url, first_seen, last_seen)
+VALUES (:product_id, :name, :category, :price, :currency, :product_url,
+        :brand, :unit, :image_url, :observed_at, :observed_at)
+ON CONFLICT (product_id) DO UPDATE SET
+    name = excluded.name,
+    category = excluded.category,
+    price = excluded.price,
+    currency = excluded.currency,
+    product_url = excluded.product_url,
+    brand = excluded.brand,
+    unit = excluded.unit,
+    image_url = excluded.image_url,
+    last_seen = excluded.last_seen
+"""
+
+PRODUCT_COLUMNS = ('name', 'category', 'price', 'currency', 'product_url',
+                   'brand', 'unit', 'image_url')
+
+
+class ProductStore:
+    """Upsert scraped products into SQLite and answer price queries.
+
+    Products are keyed by the id parsed from their product_url (see
+    incremental.product_key) and written in transactions of
+    ``batch_size`` rows. The database runs in WAL mode so readers can
+    query while a scrape is writing. ``upsert`` is thread safe and can be
+    passed as the ``sink`` of the scrape methods.
+    """
+
+    def __init__(self, path: str = "products.db", batch_size: int = 500,
+                 observed_at: Optional[str] = None):
+        self.path = path
+        self.batch_size = batch_size
+        # One timestamp per run, so history rows of a run line up
+        self.observed_at = observed_at or time.strftime("%Y-%m-%d %H:%M:%S")
+
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+        self._pending = []
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _row(self, product: Dict) -> Dict:
+        row = {column: product.get(column) for column in PRODUCT_COLUMNS}
+        row['product_id'] = product_key(product)
+        row['observed_at'] = self.observed_at
+        return row
+
+    def upsert(self, product: Dict):
+        with self._lock:
+            self._pending.append(self._row(product))
+            if len(self._pending) >= self.batch_size:
+                self._commit()
+
+    def save(self, products: Iterable[Dict]) -> int:
+        """Upsert products and commit; returns how many were written"""
+        count = 0
+        for product in products:
+            self.upsert(product)
+            count += 1
+        self.flush()
+        logger.info("Saved %d products to %s", count, self.path)
+        return count
+
+    def _commit(self):
+        if not self._pending:
+            return
+        with self.conn:
+            # Per row, so duplicates inside one batch see each other's price
+            for row in self._pending:
+                self.conn.execute(INSERT_HISTORY, row)
+                self.conn.execute(UPSERT_PRODUCT, row)
+        self._pending = []
+
+    def flush(self):
+        with self._lock:
+            self._commit()
+
+    def close(self):
+        self.flush()
+        self.conn.close()
+
+    def get(self, product_id: str) -> Optional[Dict]:
+        row = self.conn.execute(
+            "SELECT * FROM products WHERE product_id = ?", (product_id,)).fetchone()
+        return dict(row) if row else None
+
+    def price_history(self, product_id: str) -> List[Dict]:
+        """Every recorded price change of a product, oldest first"""
+        rows = self.conn.execute(
+            "SELECT observed_at, price, currency FROM price_history "
+            "WHERE product_id = ? ORDER BY observed_at", (product_id,))
+        return [dict(row) for row in rows]
+
+    def cheapest(self, category: str, limit: int = 10) -> List[Dict]:
+        """Lowest-priced products of a category"""
+        rows = self.conn.execute(
+            "SELECT * FROM products WHERE category = ? AND price IS NOT NULL "
+            "ORDER BY price LIMIT ?", (category, limit))
+        return [dict(row) for row in rows]
+
+    def by_brand(self, brand: str) -> List[Dict]:
+        rows = self.conn.execute(
+            "SELECT * FROM products WHERE brand = ? ORDER BY price", (brand,))
+        return [dict(row) for row in rows]
@@ -0,0 +1,96 @@
+"""
+Incremental HTML parsing that yields product cards as bytes arrive
+"""
+import re
+from typing import Dict, Iterator, Optional
+from lxml import etree
+from .extraction import LxmlExtractionPlan, lxml_strings
+from .parsers import CHARSET_RE, is_anti_bot_title
+
+CONTENT_TYPE_CHARSET_RE = re.compile(r'charset=["\']?([\w-]+)', re.I)
+
+
+def charset_from_content_type(content_type: str) -> Optional[str]:
+    """Return the charset parameter of a Content-Type header, if any"""
+    match = CONTENT_TYPE_CHARSET_RE.search(content_type or '')
+    return match.group(1) if match else None
+
+
+class AntiBotPageError(Exception):
+    """Raised when a streamed page turns out to be a bot detection page"""
+
+
+class StreamingProductParser:
+    """Feed raw page bytes in chunks and get product dicts back.
+
+    Cards (elements with data-testid="product") are extracted from their
+    closing tag and then cleared, as is every other element that has been
+    fully parsed outside a card, so memory stays flat however long the
+    page is.
+    """
+
+    def __init__(self, base_url: str, category: str, encoding: Optional[str] = None):
+        self.plan = LxmlExtractionPlan(base_url)
+        self.category = category
+        self.encoding = encoding
+        self.title = ""
+        self.cards_seen = 0
+
+        self._parser = None
+        self._card_depth = 0
+
+    def _start(self, first_chunk: bytes):
+        encoding = self.encoding
+        if not encoding:
+            declared = CHARSET_RE.search(first_chunk[:4096])
+            encoding = declared.group(1).decode(
+                'ascii') if declared else 'utf-8'
+        self._parser = etree.HTMLPullParser(
+            events=('start', 'end'), encoding=encoding)
+
+    def feed(self, chunk: bytes) -> Iterator[Dict]:
+        """Parse one chunk and yield the products it completed"""
+        if self._parser is None:
+            self._start(chunk)
+        self._parser.feed(chunk)
+        yield from self._drain()
+
+    def close(self) -> Iterator[Dict]:
+        """Flush the parser at end of stream"""
+        if self._parser is None:
+            return
+        self._parser.close()
+        yield from self._drain()
+
+    def _drain(self) -> Iterator[Dict]:
+        for event, element in self._parser.read_events():
+            is_card = element.get('data-testid') == 'product'
+
+            if event == 'start':
+                if is_card:
+                    self._card_depth += 1
+                continue
+
+            if is_card:
+                self._card_depth -= 1
+                self.cards_seen += 1
+                product = self.plan.extract(element, self.category)
+                self._discard(element)
+                if product:
+                    yield product
+
+            elif self._card_depth == 0:
+                if element.tag == 'title' and not self.title:
+                    self.title = ''.join(lxml_strings(element))
+                    if is_anti_bot_title(self.title):
+                        raise AntiBotPageError(self.title)
+                self._discard(element)
+
+    @staticmethod
+    def _discard(element):
+        """Free a finished subtree and the siblings parsed before it"""
+        element.clear(keep_tail=True)
+        parent = element.getparent()
+        if parent is not None:
+            while element.getprevious() is not None:
+                del parent[0]
@@ -0,0 +1,202 @@
+"""
+Fast path for search pages that embed their product list as JSON
+(schema.org JSON-LD or a framework hydration script)
+"""
+import json
+import re
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+SCRIPT_RE = re.compile(rb'<script\b([^>]*)>', re.I)
+SCRIPT_END = b'</script'
+# Inline state assignments such as window.__INITIAL_STATE__ = {...};
+ASSIGNMENT_RE = re.compile(rb'\s*(?:window\.|var\s+|self\.)?(__\w+__)\s*=\s*')
+
+# Keys of a product object in hydration JSON, by field, in priority order
+NAME_KEYS = ('name', 'title', 'productName', 'label')
+PRICE_KEYS = ('price', 'salePrice', 'currentPrice', 'finalPrice', 'lowPrice', 'offers')
+PRICE_VALUE_KEYS = ('value', 'amount', 'current', 'price', 'lowPrice', 'formatted')
+URL_KEYS = ('url', 'href', 'productUrl', 'link', 'canonicalUrl')
+IMAGE_KEYS = ('image', 'imageUrl', 'img', 'thumbnail', 'images', 'src')
+BRAND_KEYS = ('brand', 'brandName', 'manufacturer', 'seller')
+UNIT_KEYS = ('unit', 'priceUnit', 'unitOfMeasure')
+
+_decoder = json.JSONDecoder()
+
+
+class StructuredPage:
+    """Products read from a page's embedded JSON instead of its cards.
+
+    ``products`` holds raw field dicts in the shape of
+    ProductExtractionPlan.raw_fields, so they go through the same
+    build_product as DOM extracted cards.
+    """
+
+    __slots__ = ('source', 'products')
+
+    def __init__(self, source: str, products: List[Dict]):
+        self.source = source
+        self.products = products
+
+    def __len__(self) -> int:
+        return len(self.products)
+
+    def __repr__(self) -> str:
+        return f"StructuredPage({self.source!r}, {len(self.products)} products)"
+
+
+def json_scripts(content: bytes) -> Iterator[Tuple[str, Any]]:
+    """Yield (source, data) for every JSON script of a page.
+
+    Only <script> tags are looked at and only those holding JSON are
+    decoded; the rest of the page is never parsed. source is 'json-ld',
+    the script id (e.g. '__NEXT_DATA__') or the assigned global name.
+    """
+    for match in SCRIPT_RE.finditer(content):
+        start = match.end()
+        end = content.find(SCRIPT_END, start)
+        if end < 0:
+            return
+        attrs = match.group(1).lower()
+        body = content[start:end]
+
+        if b'ld+json' in attrs:
+            source = 'json-ld'
+        elif b'json' in attrs:
+            script_id = re.search(rb'id=["\']?([\w-]+)', match.group(1))
+            source = script_id.group(1).decode('ascii') if script_id else 'json'
+        else:
+            assignment = ASSIGNMENT_RE.match(body)
+            if not assignment:
+                continue
+            source = assignment.group(1).decode('ascii')
+            body = body[assignment.end():]
+
+        try:
+            # Assignments may go on after the object, e.g. with a ';'
+            data = _decoder.raw_decode(body.decode('utf-8').strip())[0]
+        except ValueError:
+            continue
+        yield source, data
+
+
+def _first(item: Dict, keys) -> Any:
+    for key in keys:
+        value = item.get(key)
+        if value is not None and value != '':
+            return value
+    return None
+
+
+def _text(value) -> Optional[str]:
+    """A string out of a value that may be nested in a list or a named object"""
+    if isinstance(value, list):
+        value = value[0] if value else None
+    if isinstance(value, dict):
+        value = _first(value, ('name', 'url', 'src', 'value', 'text', 'contentUrl'))
+    if value is None or isinstance(value, (dict, list)):
+        return None
+    return str(value)
+
+
+def _price_text(item: Dict) -> Optional[str]:
+    value = _first(item, PRICE_KEYS)
+    for _ in range(3):
+        if isinstance(value, list):
+            value = value[0] if value else None
+        if not isinstance(value, dict):
+            break
+        value = _first(value, PRICE_VALUE_KEYS)
+    if value is None or isinstance(value, (bool, dict, list)):
+        return None
+    return str(value)
+
+
+def raw_fields(item: Dict) -> Dict:
+    """Map a JSON product object to the raw fields of a product card"""
+    return {
+        'name': _text(_first(item, NAME_KEYS)),
+        'price_text': _price_text(item),
+        'href': _text(_first(item, URL_KEYS)),
+        'src': _text(_first(item, IMAGE_KEYS)),
+        'brand': _text(_first(item, BRAND_KEYS)) or "",
+        'unit': _text(_first(item, UNIT_KEYS)) or "",
+    }
+
+
+def _is_product(item) -> bool:
+    return (isinstance(item, dict) and _first(item, NAME_KEYS) is not None
+            and _first(item, PRICE_KEYS) is not None)
+
+
+def _json_ld_items(data) -> Optional[List[Dict]]:
+    """The products of a JSON-LD ItemList, or of a graph of Products"""
+    if isinstance(data, dict):
+        data = data.get('@graph', [data])
+    if not isinstance(data, list):
+        return None
+
+    for node in data:
+        if isinstance(node, dict) and 'ItemList' in str(node.get('@type')):
+            items = []
+            for element in node.get('itemListElement') or []:
+                if isinstance(element, dict) and isinstance(element.get('item'), dict):
+                    element = element['item']
+                items.append(element)
+            expected = node.get('numberOfItems')
+            if isinstance(expected, int) and expected > len(items):
+                # A truncated list; the cards have the rest
+                return None
+            return items
+
+    items = [node for node in data
+             if isinstance(node, dict) and 'Product' in str(node.get('@type'))]
+    return items or None
+
+
+def _product_lists(data, depth: int = 0) -> Iterator[List]:
+    """Lists of product-like objects anywhere in a hydration state"""
+    if depth > 12:
+        return
+    if isinstance(data, dict):
+        for value in data.values():
+            yield from _product_lists(value, depth + 1)
+    elif isinstance(data, list) and data:
+        if _is_product(data[0]):
+            yield data
+        else:
+            for value in data:
+                if isinstance(value, (dict, list)):
+                    yield from _product_lists(value, depth + 1)
+
+
+def find_structured_products(content: bytes) -> Optional[StructuredPage]:
+    """Products of a search page's embedded JSON, None when it has none.
+
+    JSON-LD wins over hydration state; in hydration state the longest
+    list of product-like objects is taken. A list is only used when every
+    product in it has a name, a price and a URL, so a page whose blob is
+    missing or incomplete is left to the DOM extraction.
+    """
+    candidates = []
+    for source, data in json_scripts(content):
+        if source == 'json-ld':
+            items = _json_ld_items(data)
+            if items:
+                candidates.append((1, len(items), source, items))
+        else:
+            for items in _product_lists(data):
+                candidates.append((0, len(items), source, items))
+
+    if not candidates:
+        return None
+
+    _, _, source, items = max(candidates, key=lambda candidate: candidate[:2])
+    products = []
+    for item in items:
+        if not isinstance(item, dict):
+            return None
+        raw = raw_fields(item)
+        if not (raw['name'] and raw['price_text'] and raw['href']):
+            return None
+        products.append(raw)
+    return StructuredPage(source, products)
@@ -0,0 +1,74 @@
+"""
+Content-Encoding negotiation and wire/decoded byte accounting
+"""
+import gzip
+import zlib
+from typing import List, Optional
+import requests
+from requests.utils import DEFAULT_ACCEPT_ENCODING
+
+# What urllib3 can decode in this environment: gzip and deflate, plus br
+# and zstd when brotli / zstandard are installed. Advertising anything
+# else gets bodies back that are left encoded.
+ACCEPT_ENCODING = DEFAULT_ACCEPT_ENCODING
+DECODABLE_ENCODINGS = frozenset(
+    [coding.strip() for coding in ACCEPT_ENCODING.split(',')] + ['identity'])
+
+
+def content_codings(response: requests.Response) -> List[str]:
+    """The Content-Encoding codings of a response, in the order applied"""
+    header = response.headers.get('Content-Encoding', '')
+    return [coding.strip().lower() for coding in header.split(',') if coding.strip()]
+
+
+def undecodable_coding(response: requests.Response) -> Optional[str]:
+    """The first coding of a response that urllib3 left undecoded, if any"""
+    for coding in content_codings(response):
+        if coding not in DECODABLE_ENCODINGS:
+            return coding
+    return None
+
+
+def wire_bytes(response: requests.Response) -> Optional[int]:
+    """Bytes of a fully read response body as received, before decoding.
+
+    None for responses that didn't come off a socket, e.g. cache hits.
+    """
+    raw = getattr(response, 'raw', None)
+    if raw is None or getattr(response, 'from_cache', False):
+        return None
+    try:
+        return raw.tell()
+    except (AttributeError, OSError):
+        return None
+
+
+def is_gzip(head: bytes) -> bool:
+    return head[:2] == b'\x1f\x8b'
+
+
+def is_zlib(head: bytes) -> bool:
+    return len(head) > 1 and head[0] & 0x0f == 8 and int.from_bytes(head[:2], 'big') % 31 == 0
+
+
+def decompress_body(body: bytes) -> Optional[bytes]:
+    """A gzip or zlib body served without (or beyond) its Content-Encoding,
+    decompressed; None when body isn't one"""
+    try:
+        if is_gzip(body):
+            return gzip.decompress(body)
+        if is_zlib(body):
+            return zlib.decompress(body)
+    except (OSError, EOFError, zlib.error):
+        return None
+    return None
+
+
+def stream_decompressor(head: bytes):
+    """A zlib decompressobj for a streamed body whose first chunk is head,
+    when it starts like a gzip or zlib stream; None otherwise"""
+    if is_gzip(head):
+        return zlib.decompressobj(wbits=zlib.MAX_WBITS | 16)
+    if is_zlib(head):
+        return zlib.decompressobj()
+    return None
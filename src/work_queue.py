@@ -0,0 +1,391 @@
+"""
+Lease-based work queue for crawling with several worker processes
+"""
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional
+from .dedup import DedupIndex
+from .product import dumps, loads
+from .rate_limiter import AdaptiveRateLimiter, _HostState
+from .scraper import CastoramaScraper
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    category    TEXT NOT NULL,
+    page        INTEGER NOT NULL,
+    status      TEXT NOT NULL,
+    worker      TEXT,
+    lease_until REAL,
+    attempts    INTEGER NOT NULL DEFAULT 0,
+    products    TEXT,
+    PRIMARY KEY (category, page)
+);
+CREATE INDEX IF NOT EXISTS idx_tasks_status ON tasks (status, page);
+CREATE TABLE IF NOT EXISTS categories (
+    category    TEXT PRIMARY KEY,
+    position    INTEGER NOT NULL,
+    products    INTEGER NOT NULL DEFAULT 0,
+    stop_reason TEXT
+);
+CREATE TABLE IF NOT EXISTS settings (
+    key   TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS rate_budget (
+    host             TEXT PRIMARY KEY,
+    rate             REAL NOT NULL,
+    tokens           REAL NOT NULL,
+    updated          REAL NOT NULL,
+    paused_until     REAL NOT NULL,
+    latency          REAL,
+    baseline_latency REAL
+);
+"""
+
+PENDING = 'pending'
+LEASED = 'leased'
+DONE = 'done'
+FAILED = 'failed'
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    # Autocommit mode; writes use explicit BEGIN IMMEDIATE transactions
+    conn = sqlite3.connect(path, timeout=30, isolation_level=None,
+                           check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+class _Database:
+    def __init__(self, path: str):
+        self.path = path
+        self.conn = _connect(path)
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        """Write transaction that excludes every other process"""
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self.conn
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+            self.conn.execute("COMMIT")
+
+    def close(self):
+        self.conn.close()
+
+
+class Task:
+    def __init__(self, category: str, page: int, attempt: int, worker: str):
+        self.category = category
+        self.page = page
+        # 1 for the first lease of the page
+        self.attempt = attempt
+        self.worker = worker
+
+    def __repr__(self):
+        return f"Task({self.category!r}, page={self.page}, attempt={self.attempt})"
+
+
+class WorkQueue(_Database):
+    """(category, page) tasks shared by worker processes through SQLite.
+
+    The coordinator seeds page 1 of every category. A worker claims a
+    task with a lease of ``lease_seconds`` and completes it with the
+    page's products, which queues the category's next page unless the
+    page was empty or the category reached ``max_products`` or
+    ``max_pages``. A lease that runs out (its worker died or hung) makes
+    the task claimable again; a completion from the worker that lost the
+    lease is ignored. After ``max_attempts`` leases a page is failed and
+    ends its category.
+
+    Any number of processes can open the same file. Settings are stored
+    by ``seed``, so workers that join later follow the coordinator's.
+    """
+
+    def __init__(self, path: str = "work_queue.db", lease_seconds: float = 120.0):
+        super().__init__(path)
+        self.lease_seconds = lease_seconds
+
+    def seed(self, categories: List[str], max_products: int = 100, max_pages: int = 10,
+             max_attempts: int = 3):
+        """Clear the queue and rate budget and add page 1 of every category"""
+        settings = {'max_products': max_products, 'max_pages': max_pages,
+                    'max_attempts': max_attempts}
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM tasks")
+            conn.execute("DELETE FROM categories")
+            conn.execute("DELETE FROM rate_budget")
+            conn.executemany("INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)",
+                             [(key, str(value)) for key, value in settings.items()])
+            for position, category in enumerate(categories):
+                conn.execute("INSERT INTO categories (category, position) VALUES (?, ?)",
+                             (category, position))
+                conn.execute("INSERT INTO tasks (category, page, status) VALUES (?, 1, ?)",
+                             (category, PENDING))
+
+    def setting(self, key: str) -> int:
+        row = self.conn.execute("SELECT value FROM settings WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            raise RuntimeError(f"Work queue {self.path} has not been seeded")
+        return int(row[0])
+
+    def claim(self, worker: str) -> Optional[Task]:
+        """Lease the next pending (or abandoned) task; None when there is none"""
+        max_attempts = self.setting('max_attempts')
+        while True:
+            now = time.time()
+            with self._transaction() as conn:
+                # Lowest page first, so every category progresses in parallel
+                row = conn.execute(
+                    "SELECT t.category, t.page, t.attempts FROM tasks t "
+                    "JOIN categories c ON c.category = t.category "
+                    "WHERE t.status = ? OR (t.status = ? AND t.lease_until < ?) "
+                    "ORDER BY t.page, c.position LIMIT 1",
+                    (PENDING, LEASED, now)).fetchone()
+                if row is None:
+                    return None
+
+                category, page, attempts = row
+                if attempts >= max_attempts:
+                    logger.error("Giving up on %s page %d after %d attempts",
+                                 category, page, attempts)
+                    self._fail(conn, category, page)
+                    continue
+
+                conn.execute(
+                    "UPDATE tasks SET status = ?, worker = ?, lease_until = ?, "
+                    "attempts = attempts + 1 WHERE category = ? AND page = ?",
+                    (LEASED, worker, now + self.lease_seconds, category, page))
+                return Task(category, page, attempts + 1, worker)
+
+    def _owned(self, conn: sqlite3.Connection, task: Task) -> bool:
+        row = conn.execute(
+            "SELECT status, worker FROM tasks WHERE category = ? AND page = ?",
+            (task.category, task.page)).fetchone()
+        return row is not None and row[0] == LEASED and row[1] == task.worker
+
+    def complete(self, task: Task, products: List[Dict]) -> bool:
+        """Store a page's products and queue the next page; False if the lease was lost"""
+        with self._transaction() as conn:
+            if not self._owned(conn, task):
+                logger.warning("Lease on %s page %d was lost, dropping result",
+                               task.category, task.page)
+                return False
+
+            conn.execute(
+                "UPDATE tasks SET status = ?, lease_until = NULL, products = ? "
+                "WHERE category = ? AND page = ?",
+                (DONE, dumps(products), task.category, task.page))
+            conn.execute("UPDATE categories SET products = products + ? WHERE category = ?",
+                         (len(products), task.category))
+            total = conn.execute("SELECT products FROM categories WHERE category = ?",
+                                 (task.category,)).fetchone()[0]
+
+            if not products:
+                stop_reason = 'exhausted'
+            elif total >= self.setting('max_products') or task.page >= self.setting('max_pages'):
+                stop_reason = 'limit'
+            else:
+                stop_reason = None
+                conn.execute(
+                    "INSERT OR IGNORE INTO tasks (category, page, status) VALUES (?, ?, ?)",
+                    (task.category, task.page + 1, PENDING))
+
+            if stop_reason:
+                conn.execute("UPDATE categories SET stop_reason = ? WHERE category = ?",
+                             (stop_reason, task.category))
+        return True
+
+    def release(self, task: Task):
+        """Give a task that could not be scraped back to the queue"""
+        with self._transaction() as conn:
+            if not self._owned(conn, task):
+                return
+            if task.attempt >= self.setting('max_attempts'):
+                logger.error("Giving up on %s page %d after %d attempts",
+                             task.category, task.page, task.attempt)
+                self._fail(conn, task.category, task.page)
+            else:
+                conn.execute(
+                    "UPDATE tasks SET status = ?, worker = NULL, lease_until = NULL "
+                    "WHERE category = ? AND page = ?",
+                    (PENDING, task.category, task.page))
+
+    @staticmethod
+    def _fail(conn: sqlite3.Connection, category: str, page: int):
+        conn.execute("UPDATE tasks SET status = ?, lease_until = NULL "
+                     "WHERE category = ? AND page = ?", (FAILED, category, page))
+        conn.execute("UPDATE categories SET stop_reason = 'failed' WHERE category = ?",
+                     (category,))
+
+    def renew(self, task: Task) -> bool:
+        """Extend a lease for a task that is taking long; False if it was lost"""
+        with self._transaction() as conn:
+            if not self._owned(conn, task):
+                return False
+            conn.execute("UPDATE tasks SET lease_until = ? WHERE category = ? AND page = ?",
+                         (time.time() + self.lease_seconds, task.category, task.page))
+        return True
+
+    def finished(self) -> bool:
+        """True once no task is pending or leased"""
+        row = self.conn.execute(
+            "SELECT COUNT(*) FROM tasks WHERE status IN (?, ?)", (PENDING, LEASED)).fetchone()
+        return row[0] == 0
+
+    def categories(self) -> List[str]:
+        rows = self.conn.execute("SELECT category FROM categories ORDER BY position")
+        return [row[0] for row in rows]
+
+    def products(self, category: str) -> List[Dict]:
+        """A category's products in page order, cut at max_products"""
+        rows = self.conn.execute(
+            "SELECT products FROM tasks WHERE category = ? AND status = ? ORDER BY page",
+            (category, DONE))
+        products = []
+        for (encoded,) in rows:
+            products.extend(loads(encoded))
+        return products[:self.setting('max_products')]
+
+    def stop_reasons(self) -> Dict[str, Optional[str]]:
+        rows = self.conn.execute("SELECT category, stop_reason FROM categories ORDER BY position")
+        return dict(rows.fetchall())
+
+    def summary(self) -> Dict[str, int]:
+        rows = self.conn.execute("SELECT status, COUNT(*) FROM tasks GROUP BY status")
+        return dict(rows.fetchall())
+
+
+class SharedRateLimiter(AdaptiveRateLimiter):
+    """AdaptiveRateLimiter whose per-host buckets live in a SQLite file.
+
+    Every process opening the same file draws from the same budget and
+    backs off together, so adding workers adds throughput only while the
+    site keeps answering. Buckets use wall-clock time, as they are
+    compared across processes.
+    """
+
+    clock = staticmethod(time.time)
+
+    def __init__(self, path: str = "work_queue.db", **kwargs):
+        super().__init__(**kwargs)
+        self.db = _Database(path)
+
+    @contextmanager
+    def _host(self, host: str) -> Iterator[_HostState]:
+        with self.db._transaction() as conn:
+            row = conn.execute(
+                "SELECT rate, tokens, updated, paused_until, latency, baseline_latency "
+                "FROM rate_budget WHERE host = ?", (host,)).fetchone()
+            state = _HostState(self.initial_rate, self.burst, self.clock())
+            if row:
+                (state.rate, state.tokens, state.updated, state.paused_until,
+                 state.latency, state.baseline_latency) = row
+
+            yield state
+
+            conn.execute(
+                "INSERT OR REPLACE INTO rate_budget (host, rate, tokens, updated, paused_until, "
+                "latency, baseline_latency) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (host, state.rate, state.tokens, state.updated, state.paused_until,
+                 state.latency, state.baseline_latency))
+
+    def snapshot(self) -> Dict[str, Dict]:
+        rows = self.db.conn.execute(
+            "SELECT host, rate, latency, paused_until FROM rate_budget").fetchall()
+        return {
+            host: {
+                'rate': rate,
+                'latency': latency,
+                'paused_for': max(0.0, paused_until - self.clock()),
+            }
+            for host, rate, latency, paused_until in rows
+        }
+
+    def close(self):
+        self.db.close()
+
+
+def run_worker(scraper: CastoramaScraper, queue: WorkQueue, worker: Optional[str] = None,
+               poll_interval: float = 1.0) -> int:
+    """Claim and scrape tasks until the queue is finished; return pages done.
+
+    While other workers still hold leases the worker keeps polling, since
+    their pages may queue more work or come back when a lease runs out.
+    """
+    worker = worker or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+    max_products = queue.setting('max_products')
+    pages = 0
+
+    if not hasattr(scraper, '_homepage_visited'):
+        scraper._get_homepage_first()
+        scraper._homepage_visited = True
+
+    while True:
+        task = queue.claim(worker)
+        if task is None:
+            if queue.finished():
+                break
+            time.sleep(poll_interval)
+            continue
+
+        url = f"{scraper.base_url}/search?term={task.category}&page={task.page}"
+        logger.info("%s scraping %s page %d: %s", worker, task.category, task.page, url)
+        soup = scraper.get_search_page(url)
+        if soup is None:
+            queue.release(task)
+            continue
+
+        products = scraper.extract_page_products(
+            soup, task.category, max_products, task.page) or []
+        if queue.complete(task, products):
+            pages += 1
+
+    logger.info("%s done after %d pages", worker, pages)
+    return pages
+
+
+def worker_main(path: str = "work_queue.db", base_url: str = "https://www.castorama.fr",
+                parser: str = 'bs4', worker: Optional[str] = None) -> int:
+    """Entry point of a worker process: scrape the queue at path within
+    the rate budget stored next to it"""
+    queue = WorkQueue(path)
+    rate_limiter = SharedRateLimiter(path)
+    scraper = CastoramaScraper(base_url, parser=parser, rate_limiter=rate_limiter)
+    try:
+        return run_worker(scraper, queue, worker)
+    finally:
+        rate_limiter.close()
+        queue.close()
+
+
+def merge_results(queue: WorkQueue, emit: Callable[[Dict], None],
+                  dedup: Optional[DedupIndex] = None) -> int:
+    """Pass every category's products to emit in seed and page order.
+
+    With a dedup index, products already emitted under an earlier
+    category are dropped. Returns the number of products emitted.
+    """
+    count = 0
+    for category in queue.categories():
+        products = queue.products(category)
+        if dedup:
+            products = dedup.filter_page(category, products)
+        for product in products:
+            emit(product)
+        count += len(products)
+    return count